@@ -13,6 +13,15 @@
 # 			Outputs a spreadsheet TSV file "output_spreadsheet.tsv" from JSON
 # 			text files
 #
+# 		python hvf_bulk_processing -p <directory_of_text_files>
+# 			Outputs a corpus directory "hvf_corpus" (metadata table plus
+# 			memory-mappable plot array - see Hvf_Corpus) from JSON text files
+#
+# 		python hvf_bulk_processing -m <corpus_directory>
+# 			Outputs a metrics TSV file "output_metrics.tsv" (VFI, CIGTS, AGIS
+# 			and regional metrics per exam - see Hvf_Metric_Calculator) from a
+# 			corpus directory
+#
 # 		python hvf_bulk_processing -s <directory_of_images>
 # 			Outputs a directory of JSON text files into directory
 # 			"serialized_hvf"; makes directory if does not exist
@@ -25,6 +34,19 @@
 # 			Outputs a directory of JSON text files into directory
 # 			"serialized_hvf"; makes directory if does not exist
 #
+# 		Image and DICOM options (-i, -s and -d) also accept:
+# 			-w <number_of_workers>
+# 				Extracts files in parallel with a pool of worker processes.
+# 				Output is identical to (and in the same order as) a serial run
+#
+# 			-c <cache_directory> [--cache_size_mb <size>]
+# 				Caches extraction results on disk keyed by image content, so
+# 				duplicate images are not re-extracted (the size cap is shared by
+# 				all worker processes)
+#
+# 		Runs with -s keep a manifest ("manifest.jsonl") in the output directory;
+# 		rerunning skips images already serialized whose content is unchanged
+#
 ###############################################################################
 
 # Import necessary packages
@@ -35,217 +57,237 @@ import os
 # Import the HVF_Object class
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
 
+# Import bulk extraction class:
+from hvf_extraction_script.hvf_manager.hvf_bulk_extractor import Hvf_Bulk_Extractor
+
+# Import bulk loader class for text files:
+from hvf_extraction_script.hvf_manager.hvf_bulk_loader import Hvf_Bulk_Loader
+
 # Import tester class:
 from hvf_extraction_script.hvf_manager.hvf_export import Hvf_Export
 
+# Import corpus class for columnar output:
+from hvf_extraction_script.hvf_manager.hvf_corpus import Hvf_Corpus
+
+# Import metric calculator for metrics output:
+from hvf_extraction_script.hvf_manager.hvf_metric_calculator import Hvf_Metric_Calculator
+
+# Import manifest class for resumable runs:
+from hvf_extraction_script.hvf_manager.hvf_manifest import Hvf_Manifest
+
 # Import file utilities
 from hvf_extraction_script.utilities.file_utils import File_Utils
 
 # Import logger class to handle any messages:
 from hvf_extraction_script.utilities.logger import Logger
 
-# Construct the argument parse and parse the arguments
-ap = argparse.ArgumentParser()
-ap.add_argument("-i", "--image_directory", required=False, help="path to directory of images to convert to spreadsheet")
-ap.add_argument(
-    "-t", "--text_directory", required=False, help="path to directory of text files to convert to spreadsheet"
-)
-ap.add_argument(
-    "-s", "--save_images", required=False, help="path to directory of image files to read and save as text documents"
-)
-ap.add_argument("-f", "--import_file", required=False, help="path to TSV file to import and save as text documents")
-ap.add_argument(
-    "-d", "--dicom_file", required=False, help="path to directory of DICOM files to convert to text documents"
-)
-args = vars(ap.parse_args())
-
-
-###############################################################################
-# HELPER METHODS ##############################################################
 ###############################################################################
-
+# BULK PROCESSING #############################################################
 ###############################################################################
-# From a directory of images, returns a dictionary of HVF objects:
-
-
-def get_dict_of_hvf_objs_from_imgs(directory):
-
-    # Read in images from directory:
-    list_of_image_file_extensions = [".bmp", ".jpg", ".jpeg", ".png"]
-    list_of_img_paths = File_Utils.get_files_within_dir(directory, list_of_image_file_extensions)
-
-    dict_of_hvf_objs = {}
-
-    for hvf_img_path in list_of_img_paths:
 
-        path, filename = os.path.split(hvf_img_path)
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF image " + filename)
-        hvf_img = File_Utils.read_image_from_file(hvf_img_path)
+# Guard so that worker processes importing this module do not rerun it
+if __name__ == "__main__":
 
-        hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_img)
-        hvf_obj.release_saved_image()
-        dict_of_hvf_objs[filename] = hvf_obj
+    # Construct the argument parse and parse the arguments
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "-i", "--image_directory", required=False, help="path to directory of images to convert to spreadsheet"
+    )
+    ap.add_argument(
+        "-t", "--text_directory", required=False, help="path to directory of text files to convert to spreadsheet"
+    )
+    ap.add_argument(
+        "-p", "--pack_corpus", required=False, help="path to directory of text files to convert to a corpus directory"
+    )
+    ap.add_argument(
+        "-m", "--metrics", required=False, help="path to corpus directory to compute metrics spreadsheet for"
+    )
+    ap.add_argument(
+        "-s",
+        "--save_images",
+        required=False,
+        help="path to directory of image files to read and save as text documents",
+    )
+    ap.add_argument("-f", "--import_file", required=False, help="path to TSV file to import and save as text documents")
+    ap.add_argument(
+        "-d", "--dicom_file", required=False, help="path to directory of DICOM files to convert to text documents"
+    )
+    ap.add_argument(
+        "-w", "--workers", required=False, type=int, default=1, help="number of worker processes for file extraction"
+    )
+    ap.add_argument("-c", "--cache_dir", required=False, help="path to directory for caching image extraction results")
+    ap.add_argument(
+        "--cache_size_mb", required=False, type=int, default=1024, help="size cap of extraction cache in megabytes"
+    )
+    args = vars(ap.parse_args())
 
-    return dict_of_hvf_objs
+    Logger.set_logger_level(Logger.DEBUG_FLAG_SYSTEM)
 
+    if args["cache_dir"]:
+        Hvf_Object.set_extraction_cache(args["cache_dir"], args["cache_size_mb"] * 1024 * 1024)
 
-###############################################################################
-# From a directory of text files, returns a dictionary of HVF objects:
-
-
-def get_dict_of_hvf_objs_from_text(directory):
+    # If flag, then do unit tests:
+    if args["image_directory"]:
 
-    # Read in text files from directory:
-    list_of_file_extensions = [".txt"]
-    list_of_txt_paths = File_Utils.get_files_within_dir(directory, list_of_file_extensions)
+        # Grab the argument directory for readability
+        directory = args["image_directory"]
 
-    dict_of_hvf_objs = {}
+        # Rows are written as each image is extracted, so partial output survives
+        # (the file is closed even if extraction fails partway through)
+        with File_Utils.get_writing_fh("output_spreadsheet.tsv") as fh:
+            Hvf_Export.export_hvf_list_to_file_handle(
+                Hvf_Bulk_Extractor.get_hvf_objs_from_image_dir(directory, args["workers"]), fh
+            )
 
-    for hvf_txt_path in list_of_txt_paths:
+    elif args["text_directory"]:
 
-        path, filename = os.path.split(hvf_txt_path)
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF text file " + filename)
+        # Grab the argument directory for readability
+        directory = args["text_directory"]
 
-        hvf_txt = File_Utils.read_text_from_file(hvf_txt_path)
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== START EXPORT ==========")
 
-        hvf_obj = Hvf_Object.get_hvf_object_from_text(hvf_txt)
+        # Text files are read ahead by a thread pool, and exported one at a time
+        with File_Utils.get_writing_fh("output_spreadsheet.tsv") as fh:
+            Hvf_Export.export_hvf_list_to_file_handle(Hvf_Bulk_Loader.get_hvf_objs_from_text_dir(directory), fh)
 
-        dict_of_hvf_objs[filename] = hvf_obj
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== FINISHED EXPORT ==========")
 
-    return dict_of_hvf_objs
+    elif args["pack_corpus"]:
 
+        # Grab the argument directory for readability
+        directory = args["pack_corpus"]
 
-###############################################################################
-# BULK PROCESSING #############################################################
-###############################################################################
-
-Logger.set_logger_level(Logger.DEBUG_FLAG_SYSTEM)
+        corpus_dir = "hvf_corpus"
 
-# If flag, then do unit tests:
-if args["image_directory"]:
+        # Text files are read ahead by a thread pool, and written to the corpus one
+        # at a time
+        Hvf_Corpus.write_corpus(corpus_dir, Hvf_Bulk_Loader.get_hvf_objs_from_text_dir(directory))
 
-    # Grab the argument directory for readability
-    directory = args["image_directory"]
+    elif args["metrics"]:
 
-    dict_of_hvf_objs = get_dict_of_hvf_objs_from_imgs(directory)
+        hvf_corpus = Hvf_Corpus(args["metrics"])
 
-    return_string = Hvf_Export.export_hvf_list_to_spreadsheet(dict_of_hvf_objs)
+        list_of_file_names = [hvf_corpus.get_file_name(ii) for ii in range(len(hvf_corpus))]
+        list_of_metadata = [hvf_corpus.get_metadata(ii) for ii in range(len(hvf_corpus))]
 
-    File_Utils.write_string_to_file(return_string, "output_spreadsheet.tsv")
+        # Metrics are computed for all exams at once, straight from the plot tensor
+        metrics_table = Hvf_Metric_Calculator.get_metrics_table(hvf_corpus.get_plot_tensor(), list_of_metadata)
 
-elif args["text_directory"]:
+        with File_Utils.get_writing_fh("output_metrics.tsv") as fh:
+            for line in Hvf_Metric_Calculator.get_metrics_table_lines(list_of_file_names, metrics_table, "\t"):
+                fh.write(line + "\n")
 
-    # Grab the argument directory for readability
-    directory = args["text_directory"]
+    elif args["save_images"]:
 
-    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== START READING ALL TEXT FILES ==========")
-    dict_of_hvf_objs = get_dict_of_hvf_objs_from_text(directory)
+        directory = args["save_images"]
 
-    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== FINISHED READING ALL TEXT FILES ==========")
+        save_dir = "serialized_hvfs"
 
-    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== START EXPORT ==========")
+        if not os.path.isdir(save_dir):
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
 
-    return_string = Hvf_Export.export_hvf_list_to_spreadsheet(dict_of_hvf_objs)
+            os.mkdir(save_dir)
 
-    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "========== WRITING EXPORT SPREADSHEET ==========")
+        # Manifest of previously processed files, so interrupted runs can resume
+        manifest = Hvf_Manifest(save_dir)
 
-    File_Utils.write_string_to_file(return_string, "output_spreadsheet.tsv")
+        list_of_img_paths = File_Utils.get_files_within_dir(directory, Hvf_Bulk_Extractor.IMAGE_FILE_EXTENSIONS)
 
-elif args["save_images"]:
+        # Skip files already serialized with unchanged content:
+        list_of_pending_paths = []
+        dict_of_file_records = {}
 
-    directory = args["save_images"]
+        for hvf_img_path in list_of_img_paths:
 
-    save_dir = "serialized_hvfs"
+            path, filename = os.path.split(hvf_img_path)
+            file_record = manifest.get_file_record(hvf_img_path)
 
-    if not os.path.isdir(save_dir):
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
+            if manifest.is_completed(file_record, os.path.join(save_dir, str(filename) + ".txt")):
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Skipping already serialized " + filename)
+                continue
 
-        os.mkdir(save_dir)
+            list_of_pending_paths.append(hvf_img_path)
+            dict_of_file_records[filename] = file_record
 
-    list_of_image_file_extensions = [".bmp", ".jpg", ".jpeg", ".png"]
-    list_of_img_paths = File_Utils.get_files_within_dir(directory, list_of_image_file_extensions)
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Serializing {len(list_of_pending_paths)} of {len(list_of_img_paths)} images",
+        )
 
-    for hvf_img_path in list_of_img_paths:
+        for filename, hvf_serialized, time_elapsed in Hvf_Bulk_Extractor.get_serializations_from_image_paths(
+            list_of_pending_paths, args["workers"]
+        ):
 
-        path, filename = os.path.split(hvf_img_path)
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF image " + filename)
-        hvf_img = File_Utils.read_image_from_file(hvf_img_path)
+            file_record = dict_of_file_records[filename]
 
-        try:
-            hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_img)
+            if hvf_serialized is None:
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename
+                )
+                manifest.add_record(file_record, Hvf_Manifest.STATUS_FAILURE, time_elapsed)
+                continue
 
             file_path = os.path.join(save_dir, str(filename) + ".txt")
 
             Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Writing text serialization file " + filename)
-            File_Utils.write_string_to_file(hvf_obj.serialize_to_json(), file_path)
-
-        except:
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename)
-
-elif args["import_file"]:
-
-    path_to_tsv_file = args["import_file"]
-
-    save_dir = "serialized_hvfs"
-
-    if not os.path.isdir(save_dir):
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
-
-        os.mkdir(save_dir)
-
-    tsv_file_string = File_Utils.read_text_from_file(path_to_tsv_file)
-    dict_of_hvf_objs = Hvf_Export.import_hvf_list_from_spreadsheet(tsv_file_string)
-
-    for filename in dict_of_hvf_objs.keys():
-        hvf_obj = dict_of_hvf_objs.get(filename)
-        hvf_serialized = hvf_obj.serialize_to_json()
+            File_Utils.write_string_to_file(hvf_serialized, file_path)
 
-        try:
-            filename_root, ext = os.path.splitext(filename)
+            manifest.add_record(file_record, Hvf_Manifest.STATUS_SUCCESS, time_elapsed)
 
-            if not (ext == "txt"):
-                filename = filename + ".txt"
+    elif args["import_file"]:
 
-            file_path = os.path.join(save_dir, str(filename))
+        path_to_tsv_file = args["import_file"]
 
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Writing text serialization file " + filename)
-            File_Utils.write_string_to_file(hvf_serialized, file_path)
+        save_dir = "serialized_hvfs"
 
-        except:
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename)
+        if not os.path.isdir(save_dir):
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
 
-elif args["dicom_file"]:
+            os.mkdir(save_dir)
 
-    directory = args["dicom_file"]
+        # Rows are read and written one chunk at a time, so large files are
+        # imported in bounded memory
+        with File_Utils.get_reading_fh(path_to_tsv_file) as fh:
+            for filename, hvf_obj in Hvf_Export.import_hvf_list_from_file_handle(fh):
+                hvf_serialized = hvf_obj.serialize_to_json()
 
-    save_dir = "serialized_hvfs"
+                try:
+                    filename_root, ext = os.path.splitext(filename)
 
-    if not os.path.isdir(save_dir):
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
+                    if not (ext == "txt"):
+                        filename = filename + ".txt"
 
-        os.mkdir(save_dir)
+                    file_path = os.path.join(save_dir, str(filename))
 
-    list_of_file_extensions = [".dcm"]
-    list_of_paths = File_Utils.get_files_within_dir(directory, list_of_file_extensions)
+                    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Writing text serialization file " + filename)
+                    File_Utils.write_string_to_file(hvf_serialized, file_path)
 
-    for hvf_dcm_path in list_of_paths:
+                except:
+                    Logger.get_logger().log_msg(
+                        Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename
+                    )
 
-        path, filename = os.path.split(hvf_dcm_path)
-        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF DICOM " + filename)
-        hvf_dicom_ds = File_Utils.read_dicom_from_file(hvf_dcm_path)
+    elif args["dicom_file"]:
 
-        try:
-            hvf_obj = Hvf_Object.get_hvf_object_from_dicom(hvf_dicom_ds)
+        directory = args["dicom_file"]
 
-            file_path = os.path.join(save_dir, str(filename) + ".txt")
+        save_dir = "serialized_hvfs"
 
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Writing text serialization file " + filename)
+        if not os.path.isdir(save_dir):
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Making new save directory: " + save_dir)
 
-            File_Utils.write_string_to_file(hvf_obj.serialize_to_json(), file_path)
+            os.mkdir(save_dir)
 
-        except:
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename)
+        # DICOM files are read without pixel data or large values, and are
+        # serialized (and written) by the workers
+        for filename, is_successful, time_elapsed in Hvf_Bulk_Extractor.save_serializations_from_dicom_dir(
+            directory, save_dir, args["workers"]
+        ):
 
+            if not is_successful:
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_SYSTEM, "============= FAILURE on serializing " + filename
+                )
 
-else:
-    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_ERROR, "No input directory given")
+    else:
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_ERROR, "No input directory given")
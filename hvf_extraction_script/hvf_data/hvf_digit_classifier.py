@@ -0,0 +1,251 @@
+###############################################################################
+# hvf_digit_classifier.py
+#
+# Description:
+# 	Class definition for a lightweight digit classifier, used as an alternative
+# 	to template matching for value plot digits (see Hvf_Value.RECOGNIZER).
+#
+# 	Each digit image (glyph) is cropped, scaled to a fixed height (keeping its
+# 	aspect ratio), centred on a fixed size canvas and flattened into a
+# 	normalized row. Glyphs are classified by their nearest neighbour amongst
+# 	the training glyphs of each digit, scored by normalized correlation. All
+# 	glyphs of a plot are classified with a single matrix product.
+#
+# 	Training glyphs are generated from the value icon templates, augmented
+# 	over a range of heights, widths and stroke thicknesses. Labelled glyphs
+# 	from other sources (eg, harvested from the unit test corpus) can be added
+# 	with add_training_glyphs.
+#
+# Main usage:
+# 	Call init method with the value icon templates (as loaded by Hvf_Value)
+#
+# 	Call classify_glyphs with a list of digit images
+#
+###############################################################################
+
+# Import necessary packages
+import cv2
+import numpy as np
+
+# For fingerprinting the trained model:
+from hvf_extraction_script.utilities.disk_cache import Disk_Cache
+
+# General purpose image functions:
+from hvf_extraction_script.utilities.image_utils import Image_Utils
+
+# For error/debug logging:
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Digit_Classifier:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    # Size of the normalized glyph canvas (glyphs are scaled to the full height):
+    GLYPH_HEIGHT = 24
+    GLYPH_WIDTH = 18
+
+    # Augmentations for generating training glyphs from each template:
+    # Heights (in pixels) to render the template at
+    TRAINING_HEIGHTS = [12, 15, 18, 22, 28, 36, 48]
+
+    # Relative widths (ie, horizontal stretch) to render the template at
+    TRAINING_WIDTH_FACTORS = [0.85, 1.0, 1.15]
+
+    # Binarization thresholds - lower thresholds thin strokes, higher thicken them
+    TRAINING_THRESHOLDS = [96, 127, 160]
+
+    NUM_DIGITS = 10
+
+    # Class variables:
+    # Normalized training glyphs (one per row) and their digit labels, sorted by
+    # label:
+    training_glyph_matrix = None
+    training_labels = None
+
+    # Start row of each digit's training glyphs in training_glyph_matrix:
+    training_label_starts = None
+
+    # Fingerprint of the training glyphs, so cached extractions are invalidated
+    # when the model changes
+    model_stamp = "untrained"
+
+    # Initialization flag
+    is_initialized = False
+
+    ###############################################################################
+    # INITIALIZATION METHODS ######################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Variable Initialization method - generates training glyphs from the value
+    # icon templates (dictionary of digit -> {version dir -> grayscale template},
+    # as in Hvf_Value.value_icon_templates)
+    @classmethod
+    def initialize_class_vars(cls, value_icon_templates):
+
+        list_of_glyphs = []
+        list_of_labels = []
+
+        for digit, icons in sorted(value_icon_templates.items()):
+            for dir in sorted(icons):
+                for glyph in Hvf_Digit_Classifier.get_augmented_glyphs(icons[dir]):
+                    list_of_glyphs.append(glyph)
+                    list_of_labels.append(digit)
+
+        cls.training_glyph_matrix = np.zeros((0, cls.GLYPH_HEIGHT * cls.GLYPH_WIDTH), dtype=np.float32)
+        cls.training_labels = np.zeros(0, dtype=np.int64)
+
+        cls.add_training_glyphs(list_of_glyphs, list_of_labels)
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_INFO, "Digit classifier trained on " + str(len(list_of_labels)) + " glyphs"
+        )
+
+        # Lastly, flip the flag to indicate initialization has been done
+        cls.is_initialized = True
+
+        return None
+
+    ###############################################################################
+    # Adds labelled glyphs (binarized digit images, black on white) to the training
+    # set. Used for training from glyphs harvested from other sources, eg the unit
+    # test corpus
+    @classmethod
+    def add_training_glyphs(cls, list_of_glyphs, list_of_labels):
+
+        if len(list_of_glyphs) == 0:
+            return None
+
+        glyph_rows = np.stack([Hvf_Digit_Classifier.get_normalized_glyph(glyph) for glyph in list_of_glyphs])
+
+        glyph_matrix = np.concatenate(
+            [cls.training_glyph_matrix, Hvf_Digit_Classifier.normalize_glyph_rows(glyph_rows)]
+        )
+        labels = np.concatenate([cls.training_labels, np.asarray(list_of_labels, dtype=np.int64)])
+
+        # Keep sorted by label, so per-digit scores can be reduced by slices:
+        sort_order = np.argsort(labels, kind="stable")
+
+        cls.training_glyph_matrix = glyph_matrix[sort_order]
+        cls.training_labels = labels[sort_order]
+        cls.training_label_starts = np.searchsorted(cls.training_labels, np.arange(cls.NUM_DIGITS))
+
+        cls.model_stamp = Disk_Cache.get_hash_key(
+            [np.ascontiguousarray(cls.training_glyph_matrix), np.ascontiguousarray(cls.training_labels)]
+        )
+
+        return None
+
+    ###############################################################################
+    # Given a grayscale template, returns list of binarized glyphs rendered from it
+    # over the training augmentations
+    @staticmethod
+    def get_augmented_glyphs(template):
+
+        list_of_glyphs = []
+
+        template_h = np.size(template, 0)
+        template_w = np.size(template, 1)
+
+        for height in Hvf_Digit_Classifier.TRAINING_HEIGHTS:
+            for width_factor in Hvf_Digit_Classifier.TRAINING_WIDTH_FACTORS:
+
+                width = max(round(template_w * width_factor * height / template_h), 1)
+                glyph = cv2.resize(template, (width, height), interpolation=cv2.INTER_AREA)
+
+                for threshold in Hvf_Digit_Classifier.TRAINING_THRESHOLDS:
+                    list_of_glyphs.append(cv2.threshold(glyph, threshold, 255, cv2.THRESH_BINARY)[1])
+
+        return list_of_glyphs
+
+    ###############################################################################
+    # HELPER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a glyph (digit image, black on white), returns it as a flattened row of
+    # ink values (0 = white, 1 = black): cropped, scaled to the canvas height and
+    # centred horizontally on the canvas
+    @staticmethod
+    def get_normalized_glyph(glyph):
+
+        canvas_h = Hvf_Digit_Classifier.GLYPH_HEIGHT
+        canvas_w = Hvf_Digit_Classifier.GLYPH_WIDTH
+
+        canvas = np.zeros((canvas_h, canvas_w), dtype=np.float32)
+
+        x0, x1, y0, y1 = Image_Utils.crop_white_border(glyph)
+
+        # Blank glyph - leave canvas empty
+        if x1 < x0 or y1 < y0:
+            return canvas.reshape(-1)
+
+        glyph = glyph[y0 : 1 + y1, x0 : 1 + x1]
+
+        # Scale to canvas height, keeping aspect ratio (narrow digits like 1 stay
+        # narrow) unless that would overflow the canvas:
+        width = min(max(round(np.size(glyph, 1) * canvas_h / np.size(glyph, 0)), 1), canvas_w)
+        glyph = cv2.resize(glyph, (width, canvas_h), interpolation=cv2.INTER_AREA)
+
+        x_offset = (canvas_w - width) // 2
+        canvas[:, x_offset : x_offset + width] = 1 - (glyph.astype(np.float32) / 255)
+
+        return canvas.reshape(-1)
+
+    ###############################################################################
+    # Given a stack of flattened glyphs (one per row), returns them with zero mean
+    # and unit length, so that a dot product between two rows is their normalized
+    # correlation
+    @staticmethod
+    def normalize_glyph_rows(glyph_rows):
+
+        glyph_rows = glyph_rows - glyph_rows.mean(axis=1, keepdims=True)
+
+        row_norms = np.linalg.norm(glyph_rows, axis=1, keepdims=True)
+        row_norms[row_norms == 0] = 1
+
+        return (glyph_rows / row_norms).astype(np.float32)
+
+    ###############################################################################
+    # CLASSIFICATION METHODS ######################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a list of glyphs (binarized digit images, black on white), returns the
+    # per-digit scores as an array (one row per glyph, one column per digit). Each
+    # score is the normalized correlation (-1 to 1) with the closest training glyph
+    # of that digit
+    @staticmethod
+    def get_digit_scores(list_of_glyphs):
+
+        glyph_rows = np.stack([Hvf_Digit_Classifier.get_normalized_glyph(glyph) for glyph in list_of_glyphs])
+        glyph_matrix = Hvf_Digit_Classifier.normalize_glyph_rows(glyph_rows)
+
+        # Correlation of every glyph with every training glyph:
+        similarity_matrix = glyph_matrix @ Hvf_Digit_Classifier.training_glyph_matrix.T
+
+        # Reduce to best match within each digit's (contiguous) training glyphs:
+        return np.maximum.reduceat(similarity_matrix, Hvf_Digit_Classifier.training_label_starts, axis=1)
+
+    ###############################################################################
+    # Given a list of glyphs and (optionally) a list of flags for whether each glyph
+    # may be a 0, returns list of (digit, score) tuples - one per glyph
+    @staticmethod
+    def classify_glyphs(list_of_glyphs, list_of_allow_zero=None):
+
+        if len(list_of_glyphs) == 0:
+            return []
+
+        digit_scores = Hvf_Digit_Classifier.get_digit_scores(list_of_glyphs)
+
+        # Exclude 0 for glyphs known not to be one (eg, leading digits):
+        if list_of_allow_zero is not None:
+            digit_scores[~np.asarray(list_of_allow_zero, dtype=bool), 0] = -np.inf
+
+        best_digits = np.argmax(digit_scores, axis=1)
+        best_scores = digit_scores[np.arange(len(best_digits)), best_digits]
+
+        return [(int(digit), float(score)) for digit, score in zip(best_digits, best_scores)]
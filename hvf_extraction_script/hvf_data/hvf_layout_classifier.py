@@ -0,0 +1,274 @@
+###############################################################################
+# hvf_layout_classifier.py
+#
+# Description:
+# 	Class definition for a lightweight printout layout classifier, used to
+# 	decide an image's layout version (see Hvf_Object.find_image_layout_version)
+# 	without OCR.
+#
+# 	Each page is reduced to a signature of cheap image features: a downsampled
+# 	grayscale thumbnail, plus row and column ink projection profiles of the
+# 	binarized thumbnail. Signatures are normalized so that a dot product is
+# 	their normalized correlation, and pages are classified by their nearest
+# 	layout centroid (mean training signature of each layout). Classifications
+# 	are only confident if the best centroid is similar enough, and clearly more
+# 	similar than the next best - otherwise callers fall back to OCR.
+#
+# 	Centroids are trained from labelled printout images (eg, the unit test
+# 	corpus - see Hvf_Test.train_layout_classifier) and saved as a model file
+# 	in the package. Without a model file, the classifier is untrained and all
+# 	classifications are not confident.
+#
+# Main usage:
+# 	Call init method to load the model file (if any)
+#
+# 	Call classify_image with a grayscale printout image; returns (layout
+# 	version, is_confident)
+#
+###############################################################################
+
+# Import necessary packages
+import os
+import pkgutil
+
+import cv2
+import numpy as np
+
+# On-disk cache utilities (for model fingerprint):
+from hvf_extraction_script.utilities.disk_cache import Disk_Cache
+
+# For error/debug logging:
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Layout_Classifier:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    # Size of the downsampled page thumbnail (width, height):
+    THUMBNAIL_SIZE = (48, 64)
+
+    # Size of the thumbnail the projection profiles are taken from (width,
+    # height), and number of bins each profile is resampled to:
+    PROFILE_IMAGE_SIZE = (256, 320)
+    PROFILE_BINS = 64
+
+    # Weight of the projection profiles relative to the thumbnail in signatures:
+    PROFILE_WEIGHT = 1.0
+
+    # Confidence thresholds - similarity of the best centroid, and margin over the
+    # next best centroid:
+    MIN_SIMILARITY = 0.6
+    MIN_MARGIN = 0.05
+
+    # Model file, in the other_icons resource directory:
+    MODEL_FILE_NAME = "layout_model.npz"
+
+    # Class variables:
+    # Normalized centroid signatures (one per row), and their layout versions
+    centroid_matrix = None
+    centroid_layouts = []
+
+    # Fingerprint of the loaded model (for tagging cached extraction results)
+    model_stamp = "untrained"
+
+    # Initialization flag
+    is_initialized = False
+
+    ###############################################################################
+    # INITIALIZATION METHODS ######################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Variable Initialization method - loads the model file, if present
+    @classmethod
+    def initialize_class_vars(cls):
+
+        model_path = Hvf_Layout_Classifier.get_model_path()
+
+        if os.path.isfile(model_path):
+            model = np.load(model_path)
+            cls.set_centroids(model["centroid_matrix"], [str(layout) for layout in model["centroid_layouts"]])
+
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_INFO, "Layout classifier loaded with " + str(len(cls.centroid_layouts)) + " layouts"
+            )
+
+        else:
+            cls.set_centroids(None, [])
+
+        # Lastly, flip the flag to indicate initialization has been done
+        cls.is_initialized = True
+
+        return None
+
+    ###############################################################################
+    # Returns path of the model file
+    @staticmethod
+    def get_model_path():
+
+        # Get resource directory - get loader, then cleave off __init__.py
+        resource_module_dir, _ = os.path.split(
+            pkgutil.get_loader("hvf_extraction_script.hvf_data.other_icons").get_filename()
+        )
+
+        return os.path.join(resource_module_dir, Hvf_Layout_Classifier.MODEL_FILE_NAME)
+
+    ###############################################################################
+    # Sets the centroids (None for untrained), and updates the model fingerprint
+    @classmethod
+    def set_centroids(cls, centroid_matrix, centroid_layouts):
+
+        cls.centroid_matrix = centroid_matrix
+        cls.centroid_layouts = list(centroid_layouts)
+
+        if centroid_matrix is None:
+            cls.model_stamp = "untrained"
+        else:
+            cls.model_stamp = Disk_Cache.get_hash_key(
+                [np.ascontiguousarray(centroid_matrix, dtype=np.float32), "|".join(cls.centroid_layouts).encode()]
+            )
+
+        return None
+
+    ###############################################################################
+    # Trains centroids from lists of grayscale printout images and their layout
+    # versions (replacing any loaded model). Returns None
+    @classmethod
+    def train_from_images(cls, list_of_images, list_of_layouts):
+
+        signature_matrix = np.stack([Hvf_Layout_Classifier.get_signature(image) for image in list_of_images])
+
+        cls.train_from_signatures(signature_matrix, list_of_layouts)
+
+        return None
+
+    ###############################################################################
+    # Trains centroids from a matrix of signatures (one per row, see get_signature)
+    # and their layout versions
+    @classmethod
+    def train_from_signatures(cls, signature_matrix, list_of_layouts):
+
+        list_of_layouts = np.asarray(list_of_layouts)
+        centroid_layouts = sorted(set(list_of_layouts.tolist()))
+
+        centroid_matrix = np.stack(
+            [signature_matrix[list_of_layouts == layout].mean(axis=0) for layout in centroid_layouts]
+        )
+
+        cls.set_centroids(Hvf_Layout_Classifier.normalize_rows(centroid_matrix), centroid_layouts)
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_INFO,
+            "Layout classifier trained on " + str(len(list_of_layouts)) + " images, layouts " + str(centroid_layouts),
+        )
+
+        return None
+
+    ###############################################################################
+    # Saves the current centroids to the model file (or the given path)
+    @staticmethod
+    def save_model(model_path=None):
+
+        if model_path is None:
+            model_path = Hvf_Layout_Classifier.get_model_path()
+
+        np.savez(
+            model_path,
+            centroid_matrix=Hvf_Layout_Classifier.centroid_matrix,
+            centroid_layouts=np.array(Hvf_Layout_Classifier.centroid_layouts),
+        )
+
+        return None
+
+    ###############################################################################
+    # HELPER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a grayscale printout image, returns its normalized signature - the
+    # downsampled thumbnail, followed by the row and column ink profiles of the
+    # binarized profile image (each resampled to PROFILE_BINS bins)
+    @staticmethod
+    def get_signature(image):
+
+        thumbnail = cv2.resize(image, Hvf_Layout_Classifier.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        thumbnail_row = Hvf_Layout_Classifier.normalize_rows((1 - thumbnail.astype(np.float32) / 255).reshape(1, -1))
+
+        profile_image = cv2.resize(image, Hvf_Layout_Classifier.PROFILE_IMAGE_SIZE, interpolation=cv2.INTER_AREA)
+        ink = cv2.threshold(profile_image, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1].astype(np.float32)
+
+        profile_bins = Hvf_Layout_Classifier.PROFILE_BINS
+        row_profile = cv2.resize(ink.mean(axis=1).reshape(-1, 1), (1, profile_bins), interpolation=cv2.INTER_AREA)
+        col_profile = cv2.resize(ink.mean(axis=0).reshape(1, -1), (profile_bins, 1), interpolation=cv2.INTER_AREA)
+
+        profile_row = Hvf_Layout_Classifier.normalize_rows(
+            np.concatenate([row_profile.reshape(-1), col_profile.reshape(-1)]).reshape(1, -1)
+        )
+
+        signature = np.concatenate([thumbnail_row, Hvf_Layout_Classifier.PROFILE_WEIGHT * profile_row], axis=1)
+
+        return Hvf_Layout_Classifier.normalize_rows(signature)[0]
+
+    ###############################################################################
+    # Given a stack of rows, returns them with zero mean and unit length, so that a
+    # dot product between two rows is their normalized correlation
+    @staticmethod
+    def normalize_rows(rows):
+
+        rows = rows - rows.mean(axis=1, keepdims=True)
+
+        row_norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        row_norms[row_norms == 0] = 1
+
+        return (rows / row_norms).astype(np.float32)
+
+    ###############################################################################
+    # CLASSIFICATION METHODS ######################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a signature, returns list of (layout version, similarity) for each
+    # centroid, best first
+    @staticmethod
+    def get_layout_scores(signature):
+
+        if Hvf_Layout_Classifier.centroid_matrix is None:
+            return []
+
+        similarities = Hvf_Layout_Classifier.centroid_matrix @ signature
+
+        return sorted(
+            zip(Hvf_Layout_Classifier.centroid_layouts, similarities.tolist()), key=lambda score: score[1], reverse=True
+        )
+
+    ###############################################################################
+    # Given a grayscale printout image, returns (layout version, is_confident).
+    # Layout version is None if the classifier is untrained
+    @staticmethod
+    def classify_image(image):
+
+        return Hvf_Layout_Classifier.classify_signature(Hvf_Layout_Classifier.get_signature(image))
+
+    ###############################################################################
+    # Given a signature (see get_signature), returns (layout version, is_confident)
+    @staticmethod
+    def classify_signature(signature):
+
+        list_of_scores = Hvf_Layout_Classifier.get_layout_scores(signature)
+
+        if len(list_of_scores) == 0:
+            return None, False
+
+        best_layout, best_similarity = list_of_scores[0]
+
+        # Margin over next best (a single trained layout has no competition):
+        margin = best_similarity - list_of_scores[1][1] if len(list_of_scores) > 1 else best_similarity
+
+        is_confident = (best_similarity >= Hvf_Layout_Classifier.MIN_SIMILARITY) and (
+            margin >= Hvf_Layout_Classifier.MIN_MARGIN
+        )
+
+        return best_layout, is_confident
@@ -37,6 +37,7 @@
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import ClassVar
 
 import cv2
@@ -44,6 +45,9 @@ import numpy as np
 import regex
 from fuzzywuzzy import fuzz, process
 
+# For layout detection without OCR:
+from hvf_extraction_script.hvf_data.hvf_layout_classifier import Hvf_Layout_Classifier
+
 # For percentile icon detection:
 from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
 
@@ -53,6 +57,12 @@ from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
 # For number value detection:
 from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
 
+# On-disk cache for extraction results:
+from hvf_extraction_script.utilities.disk_cache import Disk_Cache
+
+# Per-image shared preprocessing:
+from hvf_extraction_script.utilities.image_context import Image_Context
+
 # General purpose image functions:
 from hvf_extraction_script.utilities.image_utils import Image_Utils
 
@@ -74,6 +84,19 @@ class Hvf_Object:
     # Initialization flag
     is_initialized = False
 
+    # On-disk cache of image extraction results (see set_extraction_cache). None if
+    # caching is disabled
+    extraction_cache = None
+
+    # Thread pool for concurrent extraction within a single image (see
+    # run_extraction_tasks). Created on first use
+    extraction_thread_pool = None
+    extraction_thread_pool_size = 0
+
+    # Version of the image extraction logic. Bump when a change to extraction would
+    # alter its output, so previously cached results are not reused
+    EXTRACTION_VERSION = "1"
+
     ###############################################################################
     # Metadata/field labels/enums
 
@@ -199,6 +222,23 @@ class Hvf_Object:
     HVF_LAYOUT_V3 = "v3"
     HVF_LAYOUT_UNK = "UNKNOWN"
 
+    ###############################################################################
+    # Header slice parameters (y_ratio, y_size, x_ratio, x_size) - see
+    # get_header_metadata_from_hvf_image for contents of each
+    HEADER_SLICE_1 = (0, 0.27, 0, 0.33)
+    HEADER_SLICE_2 = (0, 0.27, 0.31, (0.547 - 0.31))
+    HEADER_SLICE_3 = (0, 0.27, 0.547, (0.83 - 0.547))
+    HEADER_SLICE_MIDDLE = (0, 0.25, 0.403, (0.75 - 0.403))
+    HEADER_SLICE_4 = (0, 0.27, 0.705, (1.0 - 0.705))
+
+    # Header band slice parameters - covers all header slices, for single pass
+    # and composite header OCR
+    HEADER_BAND_SLICE = (0, 0.27, 0, 1.0)
+
+    # Key of the metric slice text, amongst header slice texts read by composite
+    # OCR (see get_composite_slice_texts)
+    METRIC_SLICE_KEY = "metric"
+
     ###############################################################################
     # CONSTRUCTOR AND FACTORY METHODS #############################################
     ###############################################################################
@@ -234,8 +274,32 @@ class Hvf_Object:
     # Factory method - get new object from HVF image
     # This is the method to call to generate a new HVF object
     # Takes in an OpenCV image object
+    # With num_threads > 1, plot extractions and header OCR for the image run
+    # concurrently on a thread pool (lowers latency for a single image)
+    # With roi_upscale, low resolution images are not upscaled as a whole; only the
+    # header, plot and metric regions that are read get upscaled (faster, results
+    # may differ very slightly from full upscaling)
+    # With line_ocr, header slices are not OCRed whole; only their detected text
+    # lines are, each as a single line (see Ocr_Utils.perform_line_ocr)
+    # With single_pass_ocr, the header band is OCRed once for word boxes, and each
+    # word routed to the header slices by position (takes precedence over
+    # line_ocr); the metric slice is likewise read as words
+    # With composite_ocr (Rekognition only), the header band and the metric slice
+    # are tiled into one image and read together, usually in a single request, with
+    # words routed to header slices by position as in single_pass_ocr (takes
+    # precedence over line_ocr and single_pass_ocr)
     @classmethod
-    def get_hvf_object_from_image(cls, hvf_image, debug_dir="", rekognition=False):
+    def get_hvf_object_from_image(
+        cls,
+        hvf_image,
+        debug_dir="",
+        rekognition=False,
+        num_threads=1,
+        roi_upscale=False,
+        line_ocr=False,
+        single_pass_ocr=False,
+        composite_ocr=False,
+    ):
         if debug_dir:
             try:
                 shutil.rmtree(debug_dir)
@@ -245,12 +309,34 @@ class Hvf_Object:
 
         cls.debug_dir = debug_dir
         cls.rekognition = rekognition
+        cls.roi_upscale = roi_upscale
+        cls.line_ocr = line_ocr
+        cls.single_pass_ocr = single_pass_ocr
+        cls.composite_ocr = composite_ocr
 
         # Initialize any templates/variables if this is first time we are running:
         if cls.is_initialized is False:
             # Not initialized - initialize now
             cls.initialize_class_vars()
 
+        # If we have seen this exact image with the same templates/settings before,
+        # return the cached result without any OCR or template matching:
+        cache_key = None
+        if cls.extraction_cache is not None and not debug_dir:
+            cache_key = cls.get_extraction_cache_key(hvf_image)
+            hvf_serialized = cls.extraction_cache.get(cache_key)
+
+            if hvf_serialized is not None:
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_INFO, "Extraction cache hit " + cache_key)
+                hvf_obj = cls.get_hvf_object_from_text(hvf_serialized)
+                hvf_obj.image = hvf_image
+
+                return hvf_obj
+
+        # Engines are reused across printouts; start each printout from a clean state
+        if not rekognition:
+            Ocr_Utils.reset_tesseract_engine()
+
         # First, need to upscale image if its too low resolution (important for older HVF
         # images). Min width is a bit arbitrary but is close to ~300ppi
         width = np.size(hvf_image, 1)
@@ -260,52 +346,79 @@ class Hvf_Object:
         # if (width < WARNING_HVF_WIDTH):
         # Logger.get_logger().log_msg(Logger.DEBUG_FLAG_WARNING, "Resolution low, high risk for detection errors")
 
+        scale_factor = 1.0
         if width < MIN_HVF_WIDTH:
             scale_factor = MIN_HVF_WIDTH / width
+
+        # In ROI upscaling mode, the image context upscales each region as it is
+        # sliced instead:
+        if not roi_upscale and scale_factor > 1.0:
             hvf_image = cv2.resize(hvf_image, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
+            scale_factor = 1.0
 
         # preprocess image:
         # Grab greyscale:
         hvf_image_gray = cv2.cvtColor(hvf_image, cv2.COLOR_BGR2GRAY)
 
-        layout_version = cls.find_image_layout_version(cls, hvf_image_gray, width)
+        # All extractors share one context, so each full-page binarization is only
+        # computed once per image:
+        image_context = Image_Context(hvf_image_gray, scale_factor)
+
+        layout_version = cls.find_image_layout_version(cls, image_context, width)
         if debug_dir:
             print(f">>> layout_version {layout_version}, width {width}")
 
+        # With composite OCR, the header task reads all text slices at once, for
+        # both header and metric extraction:
+        slice_text_dict = None
+
+        # Plot extractions and header OCR are independent of each other, so run
+        # them as a set of tasks (concurrently, if num_threads > 1):
+        def get_header_metadata():
+            nonlocal slice_text_dict
+
+            # Header OCR may run in a pool thread with its own engine
+            if not rekognition:
+                Ocr_Utils.reset_tesseract_engine()
+
+            elif composite_ocr:
+                slice_text_dict = cls.get_composite_slice_texts(image_context, layout_version)
+
+            return cls.get_header_metadata_from_hvf_image(cls, image_context, layout_version, slice_text_dict)
+
+        list_of_tasks = [
+            lambda: cls.get_abs_raw_val_plot(image_context, layout_version),
+            lambda: cls.get_abs_deviation_val_plot(image_context),
+            lambda: cls.get_pattern_deviation_val_plot(image_context),
+            lambda: cls.get_abs_deviation_perc_plot(image_context),
+            lambda: cls.get_pattern_deviation_perc_plot(image_context),
+            get_header_metadata,
+        ]
+
+        list_of_results = cls.run_extraction_tasks(list_of_tasks, num_threads)
+
+        # Plots that failed extraction are left as None:
         tag_failed = False
-        # Get absolute raw value plot:
-        try:
-            raw_value_array = cls.get_abs_raw_val_plot(hvf_image_gray, layout_version)
-        except Exception:
-            raw_value_array = None
-            tag_failed = True
+        list_of_plots = []
+        for result, exception in list_of_results[0:5]:
+            if exception is not None:
+                result = None
+                tag_failed = True
 
-        # Get deviation value plots (both absolute and pattern):
-        try:
-            abs_dev_value_array = cls.get_abs_deviation_val_plot(hvf_image_gray)
-        except Exception:
-            abs_dev_value_array = None
-            tag_failed = True
-        try:
-            pat_dev_value_array = cls.get_pattern_deviation_val_plot(hvf_image_gray)
-        except Exception:
-            pat_dev_value_array = None
-            tag_failed = True
+            list_of_plots.append(result)
 
-        # Now, get the deviation percentile plots (both absolute and pattern):
-        try:
-            abs_dev_percentile_array = cls.get_abs_deviation_perc_plot(hvf_image_gray)
-        except Exception:
-            abs_dev_percentile_array = None
-            tag_failed = True
-        try:
-            pat_dev_percentile_array = cls.get_pattern_deviation_perc_plot(hvf_image_gray)
-        except Exception:
-            pat_dev_percentile_array = None
-            tag_failed = True
+        (
+            raw_value_array,
+            abs_dev_value_array,
+            pat_dev_value_array,
+            abs_dev_percentile_array,
+            pat_dev_percentile_array,
+        ) = list_of_plots
 
         # Get header metadata:
-        metadata = cls.get_header_metadata_from_hvf_image(cls, hvf_image_gray, layout_version)
+        metadata, exception = list_of_results[5]
+        if exception is not None:
+            raise exception
 
         # Then validate the field size/laterality based on layout of field:
         if not tag_failed and abs_dev_value_array.plot_array is not None:
@@ -313,7 +426,7 @@ class Hvf_Object:
             metadata.update(field_size_laterality_dict)
             # Then, get the metric metadata (need to know field size):
             metric_metadata = cls.get_metric_metadata_from_hvf_image(
-                cls, hvf_image_gray, layout_version, metadata[Hvf_Object.KEYLABEL_FIELD_SIZE]
+                cls, image_context, layout_version, metadata[Hvf_Object.KEYLABEL_FIELD_SIZE], slice_text_dict
             )
             metadata.update(metric_metadata)
 
@@ -335,6 +448,11 @@ class Hvf_Object:
             hvf_image,
         )
 
+        # Cache result for next time. Failed extractions are not cached (their
+        # serializations have no plots, so could not be read back)
+        if cache_key is not None and not (layout_version == Hvf_Object.HVF_LAYOUT_UNK):
+            cls.extraction_cache.put(cache_key, hvf_obj.serialize_to_json())
+
         return hvf_obj
 
     ###############################################################################
@@ -701,25 +819,22 @@ class Hvf_Object:
             else:
                 raw_array[r, c] = Hvf_Value.get_value_from_display_string(str(raw_val))
 
-            tdv_val = int(datapoint.VisualFieldTestPointNormalsSequence[0].AgeCorrectedSensitivityDeviationValue)
+            # Look up the normals item once (each DICOM attribute access is a lookup):
+            normals = datapoint.VisualFieldTestPointNormalsSequence[0]
+
+            tdv_val = int(normals.AgeCorrectedSensitivityDeviationValue)
             tdv_array[r, c] = Hvf_Value.get_value_from_display_string(str(tdv_val))
 
-            tdp_perc = datapoint.VisualFieldTestPointNormalsSequence[0].AgeCorrectedSensitivityDeviationProbabilityValue
+            tdp_perc = normals.AgeCorrectedSensitivityDeviationProbabilityValue
             tdp_array[r, c] = Hvf_Perc_Icon.get_perc_icon_from_char(perc_icon_dict[tdp_perc])
 
-            is_pattern_generated = datapoint.VisualFieldTestPointNormalsSequence[
-                0
-            ].GeneralizedDefectCorrectedSensitivityDeviationFlag
+            is_pattern_generated = normals.GeneralizedDefectCorrectedSensitivityDeviationFlag
 
             if is_pattern_generated == "YES":
-                pdv_val = int(
-                    datapoint.VisualFieldTestPointNormalsSequence[0].GeneralizedDefectCorrectedSensitivityDeviationValue
-                )
+                pdv_val = int(normals.GeneralizedDefectCorrectedSensitivityDeviationValue)
                 pdv_array[r, c] = Hvf_Value.get_value_from_display_string(str(pdv_val))
 
-                pdp_perc = datapoint.VisualFieldTestPointNormalsSequence[
-                    0
-                ].GeneralizedDefectCorrectedSensitivityDeviationProbabilityValue
+                pdp_perc = normals.GeneralizedDefectCorrectedSensitivityDeviationProbabilityValue
                 pdp_array[r, c] = Hvf_Perc_Icon.get_perc_icon_from_char(perc_icon_dict[pdp_perc])
 
         for r in range(NUM_CELLS_ROW):
@@ -801,12 +916,99 @@ class Hvf_Object:
         Hvf_Plot_Array.initialize_class_vars()
         Hvf_Perc_Icon.initialize_class_vars()
         Hvf_Value.initialize_class_vars()
+        Hvf_Layout_Classifier.initialize_class_vars()
+
+        # Fingerprint the loaded templates, for tagging cached extraction results:
+        list_of_templates = (
+            [Hvf_Plot_Array.triangle_icon_template_v1, Hvf_Plot_Array.triangle_icon_template_v2]
+            + Hvf_Perc_Icon.template_perc_list
+            + [icons[dir] for ii, icons in sorted(Hvf_Value.value_icon_templates.items()) for dir in sorted(icons)]
+            + [Hvf_Value.minus_icon_templates[dir] for dir in sorted(Hvf_Value.minus_icon_templates)]
+            + [Hvf_Value.less_than_icon_templates[dir] for dir in sorted(Hvf_Value.less_than_icon_templates)]
+        )
+        cls.template_version_stamp = Disk_Cache.get_hash_key(
+            [str(template.shape).encode() + np.ascontiguousarray(template).tobytes() for template in list_of_templates]
+        )
 
         # Lastly, flip the flag to indicate initialization has been done
         cls.is_initialized = True
 
         return None
 
+    ###############################################################################
+    # Given a list of functions taking no arguments, runs each and returns a list of
+    # (result, exception) tuples in the same order. Exception is None if the task
+    # succeeded. With num_threads > 1 tasks run concurrently on a thread pool; the
+    # pool is kept between calls so its threads (and their OCR engines) are reused
+    @classmethod
+    def run_extraction_tasks(cls, list_of_tasks, num_threads=1):
+        list_of_results = []
+
+        if num_threads <= 1:
+            for task in list_of_tasks:
+                try:
+                    list_of_results.append((task(), None))
+                except Exception as e:
+                    list_of_results.append((None, e))
+
+            return list_of_results
+
+        if cls.extraction_thread_pool is None or not (cls.extraction_thread_pool_size == num_threads):
+            if cls.extraction_thread_pool is not None:
+                cls.extraction_thread_pool.shutdown()
+
+            cls.extraction_thread_pool = ThreadPoolExecutor(max_workers=num_threads)
+            cls.extraction_thread_pool_size = num_threads
+
+        list_of_futures = [cls.extraction_thread_pool.submit(task) for task in list_of_tasks]
+
+        for future in list_of_futures:
+            exception = future.exception()
+            if exception is None:
+                list_of_results.append((future.result(), None))
+            else:
+                list_of_results.append((None, exception))
+
+        return list_of_results
+
+    ###############################################################################
+    # Enables the on-disk extraction cache, stored in cache_dir and capped at
+    # max_size bytes (least recently used entries evicted first). Passing an empty
+    # cache_dir disables the cache
+    @classmethod
+    def set_extraction_cache(cls, cache_dir, max_size=Disk_Cache.DEFAULT_MAX_SIZE):
+        if cache_dir:
+            cls.extraction_cache = Disk_Cache(cache_dir, max_size)
+        else:
+            cls.extraction_cache = None
+
+        return None
+
+    ###############################################################################
+    # Given an image, returns the extraction cache key for it. Key covers the
+    # decoded pixels, the icon templates, the extraction version, upscaling mode
+    # and OCR settings, so a change to any of these is a cache miss
+    @classmethod
+    def get_extraction_cache_key(cls, hvf_image):
+        settings_string = "|".join(
+            [
+                Hvf_Object.EXTRACTION_VERSION,
+                cls.template_version_stamp,
+                Ocr_Utils.get_ocr_settings_string(cls.rekognition),
+                "roi_upscale" if cls.roi_upscale else "full_upscale",
+                "line_ocr" if cls.line_ocr else "slice_ocr",
+                "single_pass_ocr" if cls.single_pass_ocr else "per_slice_ocr",
+                "composite_ocr" if cls.composite_ocr else "per_crop_ocr",
+                "value_recognizer:" + Hvf_Value.get_recognizer_stamp(),
+                "perc_recognizer:" + Hvf_Perc_Icon.RECOGNIZER,
+                Hvf_Layout_Classifier.model_stamp,
+                str(hvf_image.shape),
+                str(hvf_image.dtype),
+            ]
+        )
+
+        return Disk_Cache.get_hash_key([settings_string.encode(), np.ascontiguousarray(hvf_image)])
+
     @classmethod
     def get_best_match(cls, alist: list, field: str) -> str:
         best_match = Regex_Utils.REGEX_FAILURE
@@ -989,22 +1191,28 @@ class Hvf_Object:
     # Likely will need to be improved in future
     def find_image_layout_version(self, hvf_image, width):
         # Perform some pre-processing:
+        image_context = Image_Context.get_image_context(hvf_image)
 
-        # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-        header_slice = Image_Utils.slice_image(hvf_image, 0, 0.15, 0, 0.31)
+        # First, try classifying the page without OCR (from the source resolution
+        # image - signatures are downsampled anyway):
+        layout_version = Hvf_Object.get_classified_layout_version(image_context.image_gray, width)
 
-        if self.rekognition:
-            header_text = Ocr_Utils.perform_ocr(
-                header_slice, proc_img=True, debug_dir=Hvf_Object.debug_dir, column=False, rekognition=self.rekognition
-            )
-        else:
-            from tesserocr import PSM, PyTessBaseAPI  # type: ignore
+        if layout_version is not None:
+            return layout_version
 
-            Ocr_Utils.OCR_API_HANDLE = PyTessBaseAPI(psm=PSM.SPARSE_TEXT_OSD)
-            header_text = Ocr_Utils.perform_ocr(
-                header_slice, proc_img=True, debug_dir=Hvf_Object.debug_dir, column=False, rekognition=self.rekognition
-            )
-            Ocr_Utils.OCR_API_HANDLE = None
+        # Otherwise, OCR the header (and maybe GPA slice) to decide:
+
+        # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
+        header_slice = image_context.get_slice(Image_Context.VARIANT_GRAY, 0, 0.15, 0, 0.31)
+
+        header_text = Ocr_Utils.perform_ocr(
+            header_slice,
+            proc_img=True,
+            debug_dir=Hvf_Object.debug_dir,
+            column=False,
+            rekognition=self.rekognition,
+            page_seg_mode=Ocr_Utils.PSM_SPARSE_TEXT_OSD,
+        )
 
         # partial_fuzz_score = fuzz.partial_ratio("Date of Birth", header_text);
         partial_fuzz_score = fuzz.partial_ratio("Fixation", header_text)
@@ -1016,7 +1224,7 @@ class Hvf_Object:
         else:
             # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
 
-            gpa_slice = Image_Utils.slice_image(hvf_image, 0.28, 0.45, 0.60, 0.40)
+            gpa_slice = image_context.get_slice(Image_Context.VARIANT_GRAY, 0.28, 0.45, 0.60, 0.40)
             gpa_text = Ocr_Utils.perform_ocr(gpa_slice, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition)
 
             partial_fuzz_score = fuzz.partial_ratio("See GPA printout", gpa_text)
@@ -1028,6 +1236,48 @@ class Hvf_Object:
 
         return return_version
 
+    ###############################################################################
+    # Given a grayscale printout image and its (source) width, returns its layout
+    # version as classified by Hvf_Layout_Classifier, or None if the classification
+    # is not confident (or is inconsistent with the width rule for V1 layouts)
+    @staticmethod
+    def get_classified_layout_version(hvf_image_gray, width):
+
+        layout_version, is_confident = Hvf_Layout_Classifier.classify_image(hvf_image_gray)
+
+        if not is_confident:
+            return None
+
+        # As with OCR layout detection, non-V3 layouts at low resolution are V1:
+        if layout_version == Hvf_Object.HVF_LAYOUT_V3:
+            return layout_version
+
+        elif width < 1400:
+            return Hvf_Object.HVF_LAYOUT_V1
+
+        elif layout_version == Hvf_Object.HVF_LAYOUT_V1:
+            return None
+
+        return layout_version
+
+    ###############################################################################
+    # Given layout version, returns list of the header slices (see HEADER_SLICE_*)
+    # read for it, in the order get_header_metadata_from_hvf_image reads them
+    @staticmethod
+    def get_header_slice_list(layout_version):
+
+        list_of_header_slices = [Hvf_Object.HEADER_SLICE_1]
+
+        if layout_version in [Hvf_Object.HVF_LAYOUT_V1, Hvf_Object.HVF_LAYOUT_V2, Hvf_Object.HVF_LAYOUT_V2_GPA]:
+            list_of_header_slices.extend([Hvf_Object.HEADER_SLICE_2, Hvf_Object.HEADER_SLICE_3])
+
+        if layout_version == Hvf_Object.HVF_LAYOUT_V3:
+            list_of_header_slices.append(Hvf_Object.HEADER_SLICE_MIDDLE)
+
+        list_of_header_slices.append(Hvf_Object.HEADER_SLICE_4)
+
+        return list_of_header_slices
+
     ###############################################################################
     # DESERIALIZATION HELPER METHODS ##############################################
     ###############################################################################
@@ -1075,14 +1325,70 @@ class Hvf_Object:
     ###############################################################################
 
     ###############################################################################
-    # Reads header metadata from HVF image:
-    def get_header_metadata_from_hvf_image(self, hvf_image_gray, layout_version):
+    # Reads header metadata from HVF image (grayscale image or Image_Context):
+    # With slice_text_dict (see get_composite_slice_texts), header slice texts are
+    # taken from it rather than OCRed
+    def get_header_metadata_from_hvf_image(self, hvf_image_gray, layout_version, slice_text_dict=None):
         # hvf_image_gray = Image_Utils.preprocess_image(hvf_image_gray);
 
-        # First, convert grayscale -> black and white, to optimize text detection
-        hvf_image_gray = cv2.bitwise_not(
-            cv2.adaptiveThreshold(hvf_image_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 5)
-        )
+        # Slices are taken from the grayscale -> black and white image, to optimize text
+        # detection (shared with other extractors through the image context)
+        image_context = Image_Context.get_image_context(hvf_image_gray)
+
+        # Header slices are OCRed whole, or just their detected text lines:
+        if self.line_ocr:
+            perform_header_ocr = Ocr_Utils.perform_line_ocr
+        else:
+            perform_header_ocr = Ocr_Utils.perform_ocr
+
+        # In single pass mode, the whole header band is OCRed once up front; each
+        # header slice's text is then built from the words positioned within it
+        is_single_pass = self.single_pass_ocr and slice_text_dict is None
+
+        list_of_header_words = []
+        if is_single_pass:
+            header_band_image = image_context.get_slice(Image_Context.VARIANT_TEXT, *Hvf_Object.HEADER_BAND_SLICE)
+
+            list_of_header_words = Hvf_Object.get_page_words(
+                image_context,
+                Hvf_Object.HEADER_BAND_SLICE,
+                Ocr_Utils.perform_word_ocr(
+                    header_band_image,
+                    debug_dir=Hvf_Object.debug_dir,
+                    rekognition=self.rekognition,
+                    page_seg_mode=Ocr_Utils.PSM_AUTO,
+                ),
+            )
+
+        # With Rekognition, all header slices for the layout are requested up front
+        # as one concurrent batch, rather than one round trip after another
+        header_text_dict = {}
+        if slice_text_dict is not None:
+            header_text_dict = slice_text_dict
+
+        elif self.rekognition and not self.single_pass_ocr:
+            list_of_header_slices = Hvf_Object.get_header_slice_list(layout_version)
+            list_of_header_texts = Ocr_Utils.perform_ocr_batch(
+                [
+                    image_context.get_slice(Image_Context.VARIANT_TEXT, *header_slice)
+                    for header_slice in list_of_header_slices
+                ],
+                debug_dir=Hvf_Object.debug_dir,
+                rekognition=self.rekognition,
+            )
+            header_text_dict = dict(zip(list_of_header_slices, list_of_header_texts))
+
+        # Given slice parameters, returns the OCR text of that header slice:
+        def get_header_text(header_slice):
+            if header_slice in header_text_dict:
+                return header_text_dict[header_slice]
+
+            if is_single_pass:
+                slice_box = image_context.get_slice_box(*header_slice)
+                return Ocr_Utils.get_text_from_words(list_of_header_words, slice_box)
+
+            header_slice_image = image_context.get_slice(Image_Context.VARIANT_TEXT, *header_slice)
+            return perform_header_ocr(header_slice_image, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition)
 
         # We get the metadata by:
         # 1. Slicing image (as finely as possible, to optimize OCR)
@@ -1104,11 +1410,7 @@ class Hvf_Object:
         # Width: 0.0 -> 0.31
         # Contains: Name, ID, HVF size, reliability data, fovea, etc
 
-        # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-        header_slice_image1 = Image_Utils.slice_image(hvf_image_gray, 0, 0.27, 0, 0.33)
-        header_text1 = Ocr_Utils.perform_ocr(
-            header_slice_image1, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-        )
+        header_text1 = get_header_text(Hvf_Object.HEADER_SLICE_1)
         metadata_text = metadata_text + "\n" + header_text1
 
         # The middle header layout depends on layout type:
@@ -1129,21 +1431,13 @@ class Hvf_Object:
             # Height: 0.0 -> 0.17
             # Width: 0.31 -> 0.547
             # Contains: Stimulus, background, and strategy
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            header_slice_image2 = Image_Utils.slice_image(hvf_image_gray, 0, 0.27, 0.31, (0.547 - 0.31))
-            header_text2 = Ocr_Utils.perform_ocr(
-                header_slice_image2, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-            )
+            header_text2 = get_header_text(Hvf_Object.HEADER_SLICE_2)
 
             # Header 3 slice:
             # Height: 0.0 -> 0.17
             # Width: 0.52 -> 0.758 (vs 0.83 to overshoot a little given different layout low/high resolution)
             # Contains: pupil diameter, visual acuity, Rx
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            header_slice_image3 = Image_Utils.slice_image(hvf_image_gray, 0, 0.27, 0.547, (0.83 - 0.547))
-            header_text3 = Ocr_Utils.perform_ocr(
-                header_slice_image3, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-            )
+            header_text3 = get_header_text(Hvf_Object.HEADER_SLICE_3)
 
             # print(header_text3);
             # cv2.imshow("rx", header_slice_image3);
@@ -1156,22 +1450,13 @@ class Hvf_Object:
             # Height: 0.0 -> 0.27
             # Width: 0.403 -> 0.75
             # Contains: Stimulus, background, and strategy
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            header_slice_image_middle = Image_Utils.slice_image(hvf_image_gray, 0, 0.25, 0.403, (0.75 - 0.403))
-            header_text_middle = Ocr_Utils.perform_ocr(
-                header_slice_image_middle, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-            )
+            header_text_middle = get_header_text(Hvf_Object.HEADER_SLICE_MIDDLE)
 
         # Header 4 slice:
         # Height: 0.0 -> 0.17
         # Width: 0.71 -> 1.0
         # Contains: laterality, DOB, date of test, time and age
-
-        # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-        header_slice_image4 = Image_Utils.slice_image(hvf_image_gray, 0, 0.27, 0.705, (1.0 - 0.705))
-        header_text4 = Ocr_Utils.perform_ocr(
-            header_slice_image4, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-        )
+        header_text4 = get_header_text(Hvf_Object.HEADER_SLICE_4)
         metadata_text = metadata_text + "\n" + header_text4
 
         hvf_metadata = {}
@@ -1531,42 +1816,33 @@ class Hvf_Object:
         return hvf_metadata
 
     ###############################################################################
-    # Reads MD/PSD/VFI metadata from HVF image:
-    def get_metric_metadata_from_hvf_image(self, hvf_image_gray, layout_version, field_size):
+    # Reads MD/PSD/VFI metadata from HVF image (grayscale image or Image_Context):
+    # With slice_text_dict (see get_composite_slice_texts), the metric slice text is
+    # taken from it rather than OCRed
+    def get_metric_metadata_from_hvf_image(self, hvf_image_gray, layout_version, field_size, slice_text_dict=None):
         # Image processing for optimization:
-        # First, convert grayscale -> black and white, to optimize text detection
-        hvf_image_gray = cv2.bitwise_not(
-            cv2.adaptiveThreshold(hvf_image_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 5)
-        )
+        # Slices are taken from the grayscale -> black and white image, to optimize text
+        # detection (shared with other extractors through the image context)
+        image_context = Image_Context.get_image_context(hvf_image_gray)
 
-        # Slice+OCR bottom right
+        # Slice+OCR bottom right (see get_metric_slice_image)
         # Contains: MD, PSD, VFI
-        # These ratio values are all found empirically - edit to be as narrow as possible while
-        # still retaining flexibility; specific to each layout
-
-        if layout_version == Hvf_Object.HVF_LAYOUT_V1:
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            dev_val_slice_image = Image_Utils.slice_image(hvf_image_gray, 0.5, 0.15, 0.70, 0.35)
-
-        # if layout_version in [Hvf_Object.HVF_LAYOUT_V2, Hvf_Object.HVF_LAYOUT_V3]:
-        if layout_version == Hvf_Object.HVF_LAYOUT_V2:
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            dev_val_slice_image = Image_Utils.slice_image(hvf_image_gray, 0.45, 0.2, 0.65, 0.35)
-
-        if layout_version == Hvf_Object.HVF_LAYOUT_V2_GPA:
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            dev_val_slice_image = Image_Utils.slice_image(hvf_image_gray, 0.19, 0.1, 0.60, 0.40)
-
-        if layout_version == Hvf_Object.HVF_LAYOUT_V3:
-            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
-            dev_val_slice_image = Image_Utils.slice_image(hvf_image_gray, 0.5, 0.15, 0.65, 0.35)
+        # With composite OCR, the slice has already been read with the header
+        if slice_text_dict is not None and Hvf_Object.METRIC_SLICE_KEY in slice_text_dict:
+            dev_val_slice_text = slice_text_dict[Hvf_Object.METRIC_SLICE_KEY]
+
+        elif self.single_pass_ocr:
+            dev_val_slice_image = Hvf_Object.get_metric_slice_image(image_context, layout_version)
+            dev_val_slice_words = Ocr_Utils.perform_word_ocr(
+                dev_val_slice_image, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
+            )
+            dev_val_slice_text = Ocr_Utils.get_text_from_words(dev_val_slice_words)
 
-        global_threshold = 0.00001
-        relative_threshold = 0.000005
-        dev_val_slice_image = Image_Utils.delete_stray_marks(dev_val_slice_image, global_threshold, relative_threshold)
-        dev_val_slice_text = Ocr_Utils.perform_ocr(
-            dev_val_slice_image, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
-        )
+        else:
+            dev_val_slice_image = Hvf_Object.get_metric_slice_image(image_context, layout_version)
+            dev_val_slice_text = Ocr_Utils.perform_ocr(
+                dev_val_slice_image, debug_dir=Hvf_Object.debug_dir, rekognition=self.rekognition
+            )
 
         # print(dev_val_slice_text);
         # cv2.imshow("dev", dev_val_slice_image);
@@ -1656,6 +1932,81 @@ class Hvf_Object:
 
         return metric_metadata
 
+    ###############################################################################
+    # Given image context and layout version, returns the metric (MD/PSD/VFI) text
+    # slice, with stray marks removed
+    @staticmethod
+    def get_metric_slice_image(image_context, layout_version):
+
+        # These ratio values are all found empirically - edit to be as narrow as possible while
+        # still retaining flexibility; specific to each layout
+
+        if layout_version == Hvf_Object.HVF_LAYOUT_V1:
+            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
+            dev_val_slice_image = image_context.get_slice(Image_Context.VARIANT_TEXT, 0.5, 0.15, 0.70, 0.35)
+
+        # if layout_version in [Hvf_Object.HVF_LAYOUT_V2, Hvf_Object.HVF_LAYOUT_V3]:
+        if layout_version == Hvf_Object.HVF_LAYOUT_V2:
+            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
+            dev_val_slice_image = image_context.get_slice(Image_Context.VARIANT_TEXT, 0.45, 0.2, 0.65, 0.35)
+
+        if layout_version == Hvf_Object.HVF_LAYOUT_V2_GPA:
+            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
+            dev_val_slice_image = image_context.get_slice(Image_Context.VARIANT_TEXT, 0.19, 0.1, 0.60, 0.40)
+
+        if layout_version == Hvf_Object.HVF_LAYOUT_V3:
+            # Recall arguments: (image, y_ratio, y_size, x_ratio, x_size)
+            dev_val_slice_image = image_context.get_slice(Image_Context.VARIANT_TEXT, 0.5, 0.15, 0.65, 0.35)
+
+        global_threshold = 0.00001
+        relative_threshold = 0.000005
+        dev_val_slice_image = Image_Utils.delete_stray_marks(dev_val_slice_image, global_threshold, relative_threshold)
+
+        return dev_val_slice_image
+
+    ###############################################################################
+    # Given image context and layout version, reads all text the page needs as one
+    # composite Rekognition image of the header band and the metric slice (see
+    # Ocr_Utils.perform_composite_word_ocr - one request, unless the composite hits
+    # the word limit). Header slice texts (see get_header_slice_list) are built from
+    # the header band words positioned within each slice. Returns dictionary of
+    # texts, keyed by header slice parameters and METRIC_SLICE_KEY
+    @staticmethod
+    def get_composite_slice_texts(image_context, layout_version):
+
+        header_band_image = image_context.get_slice(Image_Context.VARIANT_TEXT, *Hvf_Object.HEADER_BAND_SLICE)
+        metric_slice_image = Hvf_Object.get_metric_slice_image(image_context, layout_version)
+
+        list_of_band_words, list_of_metric_words = Ocr_Utils.perform_composite_word_ocr(
+            [header_band_image, metric_slice_image], debug_dir=Hvf_Object.debug_dir
+        )
+
+        list_of_header_words = Hvf_Object.get_page_words(
+            image_context, Hvf_Object.HEADER_BAND_SLICE, list_of_band_words
+        )
+
+        slice_text_dict = {
+            header_slice: Ocr_Utils.get_text_from_words(
+                list_of_header_words, image_context.get_slice_box(*header_slice)
+            )
+            for header_slice in Hvf_Object.get_header_slice_list(layout_version)
+        }
+        slice_text_dict[Hvf_Object.METRIC_SLICE_KEY] = Ocr_Utils.get_text_from_words(list_of_metric_words)
+
+        return slice_text_dict
+
+    ###############################################################################
+    # Given image context, slice parameters and words read from that slice (see
+    # Ocr_Utils.perform_word_ocr), returns the words with boxes in page pixels
+    @staticmethod
+    def get_page_words(image_context, slice_params, list_of_words):
+
+        slice_x1, slice_y1, slice_x2, slice_y2 = image_context.get_slice_box(*slice_params)
+
+        return [
+            (word, x0 + slice_x1, y0 + slice_y1, x1 + slice_x1, y1 + slice_y1) for word, x0, y0, x1, y1 in list_of_words
+        ]
+
     ###############################################################################
     # Validates field size/laterality from argument plot:
     def get_field_size_laterality_from_plot(val_plot):
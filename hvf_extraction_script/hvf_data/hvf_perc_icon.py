@@ -16,6 +16,10 @@
 # 		1. Icon detection/cropping
 # 		2. Icon recognition
 #
+# 	Alternatively, call batch factory with all cell images of a plot. With the
+# 	batched recognizer (see RECOGNIZER), all cells are normalized to one size and
+# 	scored against the templates in a single correlation
+#
 # 	To Do:
 # 		- Get display string
 #
@@ -88,6 +92,23 @@ class Hvf_Perc_Icon:
 
     template_perc_list = None
 
+    # Recognizer backends for batch recognition (see get_perc_icons_from_images):
+    # Template matching of each cell in turn (reference implementation)
+    RECOGNIZER_TEMPLATE = "template"
+
+    # Normalized correlation of all cells against all templates at once
+    RECOGNIZER_BATCHED = "batched"
+
+    # Recognizer to use
+    RECOGNIZER = RECOGNIZER_TEMPLATE
+
+    # Side length that cropped icons/templates are normalized to for the batched
+    # recognizer:
+    NORMALIZED_ICON_SIZE = 24
+
+    # Normalized templates (one row per template in template_perc_list)
+    normalized_template_matrix = None
+
     # Initialization flag
     is_initialized = False
 
@@ -116,6 +137,33 @@ class Hvf_Perc_Icon:
 
         return Hvf_Perc_Icon(perc_enum, slice)
 
+    ###############################################################################
+    # Factory method - given a list of image slices (eg, all cells of a plot),
+    # returns a list of corresponding icons, using the configured RECOGNIZER. Cells
+    # that cannot be recognized are returned as failure icons
+    @staticmethod
+    def get_perc_icons_from_images(list_of_slices):
+
+        if Hvf_Perc_Icon.RECOGNIZER == Hvf_Perc_Icon.RECOGNIZER_BATCHED:
+            list_of_enums = Hvf_Perc_Icon.get_perc_plot_elements_batched(list_of_slices)
+
+        else:
+            list_of_enums = []
+            for slice in list_of_slices:
+                try:
+                    list_of_enums.append(Hvf_Perc_Icon.get_perc_plot_element(slice))
+                except Exception:
+                    list_of_enums.append(Hvf_Perc_Icon.PERC_FAILURE)
+
+        list_of_icons = []
+        for perc_enum, slice in zip(list_of_enums, list_of_slices):
+            if perc_enum == Hvf_Perc_Icon.PERC_FAILURE:
+                list_of_icons.append(Hvf_Perc_Icon.get_perc_icon_from_char(Hvf_Perc_Icon.PERC_FAILURE_CHAR))
+            else:
+                list_of_icons.append(Hvf_Perc_Icon(perc_enum, slice))
+
+        return list_of_icons
+
     ###############################################################################
     # Factory method - given an char, returns an enum corresponding to the
     # icon (used for deserialization)
@@ -166,6 +214,17 @@ class Hvf_Perc_Icon:
         # Load them into lists for ease of use:
         cls.template_perc_list = [cls.perc_5_template, cls.perc_2_template, cls.perc_1_template, cls.perc_half_template]
 
+        # Prepare templates for the batched recognizer - binarize, crop and normalize
+        # each the same way as cells are:
+        list_of_normalized_templates = []
+        for perc_icon in cls.template_perc_list:
+            perc_icon = cv2.threshold(perc_icon, 127, 255, cv2.THRESH_BINARY)[1]
+            x0, x1, y0, y1 = Image_Utils.crop_white_border(perc_icon)
+
+            list_of_normalized_templates.append(Hvf_Perc_Icon.get_normalized_icon(perc_icon[y0 : 1 + y1, x0 : 1 + x1]))
+
+        cls.normalized_template_matrix = Hvf_Perc_Icon.normalize_icon_rows(np.stack(list_of_normalized_templates))
+
         # Lastly, flip the flag to indicate initialization has been done
         cls.is_initialized = True
 
@@ -234,6 +293,153 @@ class Hvf_Perc_Icon:
 
         return min_val, max_val, min_loc, max_loc
 
+    ###############################################################################
+    # Helper function for rechecking a matched 5-percentile icon: given the (stray
+    # mark deleted) plot element and cropped icon width/height, returns True if it
+    # is actually a half-percentile icon
+    @staticmethod
+    def is_half_percentile(plot_element, w, h):
+
+        # Check for contours here - we know that the 5 percentile has multiple small contours
+        plot_element = cv2.bitwise_not(plot_element)
+
+        # Find contours. Note we are using RETR_EXTERNAL, meaning no children contours (ie
+        # contours within contours)
+        contours, hierarchy = cv2.findContours(plot_element, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Now add up all the contour area
+        total_cnt_area = 0
+        for cnt in contours:
+            total_cnt_area = total_cnt_area + cv2.contourArea(cnt)
+
+        # Now compare to our cropped area
+        # In optimal scenario, 5-percentile takes up 25% of area; half-percentile essentially 100%
+        # Delineate on 50%
+        AREA_PERCENTAGE_CUTOFF = 0.5
+        area_percentage = total_cnt_area / (w * h)
+
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "Recheck matching betwen 5-percentile and half-percentile")
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "Total contour area percentage: " + str(area_percentage))
+
+        # Check to see which is better. Because we are inverting, check max value
+        if area_percentage > AREA_PERCENTAGE_CUTOFF:
+
+            # Declare as such:
+            debug_string = "Correction: switching from 5-percentile to half-percentile"
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, debug_string)
+
+            return True
+
+        return False
+
+    ###############################################################################
+    # Helper function for batched recognizer: given a cropped icon, returns it
+    # resized to the normalized size, flattened to a single row
+    @staticmethod
+    def get_normalized_icon(icon_cropped):
+
+        size = Hvf_Perc_Icon.NORMALIZED_ICON_SIZE
+
+        return cv2.resize(icon_cropped, (size, size), interpolation=cv2.INTER_AREA).reshape(-1)
+
+    ###############################################################################
+    # Helper function for batched recognizer: given a stack of flattened icons (one
+    # per row), returns them as float rows with zero mean and unit length, so that
+    # a dot product between two rows is their normalized correlation
+    @staticmethod
+    def normalize_icon_rows(icon_rows):
+
+        icon_rows = icon_rows.astype(np.float32)
+        icon_rows = icon_rows - icon_rows.mean(axis=1, keepdims=True)
+
+        row_norms = np.linalg.norm(icon_rows, axis=1, keepdims=True)
+        row_norms[row_norms == 0] = 1
+
+        return icon_rows / row_norms
+
+    ###############################################################################
+    # Batched recognizer: given a list of cell images, returns a list of the
+    # corresponding percentile enums
+    # All cells are stacked into one array, so blank cells, icon bounding boxes and
+    # empty/normal cells (detected as in get_perc_plot_element) are found with array
+    # operations over the whole plot. The remaining cells are normalized into one
+    # stacked array and scored against all templates with a single matrix product.
+    # Per cell work is left where it does not vectorize: stray mark deletion (contour
+    # based, run on non-blank cells only), resizing each cropped icon to the
+    # normalized size, and the (contour based) recheck of cells matched as
+    # 5-percentile
+    @staticmethod
+    def get_perc_plot_elements_batched(list_of_plot_elements):
+
+        list_of_enums = [Hvf_Perc_Icon.PERC_NO_VALUE] * len(list_of_plot_elements)
+
+        if not list_of_plot_elements:
+            return list_of_enums
+
+        cell_stack, cell_heights, cell_widths = Image_Utils.stack_images(list_of_plot_elements)
+
+        # Stray mark deletion only ever whitens pixels, so cells without black pixels
+        # are empty either way, and are not cleaned up (zero sized cells still are,
+        # so they fail as in single cell recognition):
+        is_pending = np.any(cell_stack == 0, axis=(1, 2)) | (cell_heights == 0) | (cell_widths == 0)
+
+        for index in np.flatnonzero(is_pending):
+
+            try:
+                # Same cleanup as single cell recognition:
+                cell_stack[index, : cell_heights[index], : cell_widths[index]] = Image_Utils.delete_stray_marks(
+                    list_of_plot_elements[index], 0.005, 0.005
+                )
+
+            except Exception:
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_WARNING, "Cell " + str(index) + ": Percentile icon detection failure"
+                )
+                list_of_enums[index] = Hvf_Perc_Icon.PERC_FAILURE
+                is_pending[index] = False
+
+        x0, x1, y0, y1 = Image_Utils.crop_white_borders(cell_stack, cell_heights, cell_widths)
+
+        h = y1 - y0
+        w = x1 - x0
+
+        # Empty cells stay PERC_NO_VALUE:
+        is_pending &= w >= 0
+
+        is_normal = is_pending & (h / np.maximum(cell_heights, 1) < 0.20)
+        for index in np.flatnonzero(is_normal):
+            list_of_enums[index] = Hvf_Perc_Icon.PERC_NORMAL
+
+        list_of_pending = np.flatnonzero(is_pending & ~is_normal)
+
+        if len(list_of_pending) == 0:
+            return list_of_enums
+
+        list_of_normalized_icons = [
+            Hvf_Perc_Icon.get_normalized_icon(cell_stack[index, y0[index] : 1 + y1[index], x0[index] : 1 + x1[index]])
+            for index in list_of_pending
+        ]
+
+        # Score every pending cell against every template at once:
+        icon_matrix = Hvf_Perc_Icon.normalize_icon_rows(np.stack(list_of_normalized_icons))
+        score_matrix = icon_matrix @ Hvf_Perc_Icon.normalized_template_matrix.T
+
+        best_template_indices = np.argmax(score_matrix, axis=1)
+
+        for index, template_index in zip(list_of_pending, best_template_indices):
+
+            perc_enum = Hvf_Perc_Icon.enum_perc_list[template_index]
+
+            # 5-percentile and half-percentile icons are often mixed up; recheck:
+            if perc_enum == Hvf_Perc_Icon.PERC_5_PERCENTILE and Hvf_Perc_Icon.is_half_percentile(
+                cell_stack[index, : cell_heights[index], : cell_widths[index]], w[index], h[index]
+            ):
+                perc_enum = Hvf_Perc_Icon.PERC_HALF_PERCENTILE
+
+            list_of_enums[index] = perc_enum
+
+        return list_of_enums
+
     ###############################################################################
     # Get the corresponding percentile element from the image cell:
     @staticmethod
@@ -308,42 +514,10 @@ class Hvf_Perc_Icon:
             # Now we need to ensure that all declared 5-percentile icons are true, because
             # this program often mixes up between 5-percentile and half-percentile
 
-            if ret_val == Hvf_Perc_Icon.PERC_5_PERCENTILE:
-
-                # Check for contours here - we know that the 5 percentile has multiple small contours
-                plot_element = cv2.bitwise_not(plot_element)
-
-                # Find contours. Note we are using RETR_EXTERNAL, meaning no children contours (ie
-                # contours within contours)
-                contours, hierarchy = cv2.findContours(plot_element, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-                # Now add up all the contour area
-                total_cnt_area = 0
-                for cnt in contours:
-                    total_cnt_area = total_cnt_area + cv2.contourArea(cnt)
-
-                # Now compare to our cropped area
-                # In optimal scenario, 5-percentile takes up 25% of area; half-percentile essentially 100%
-                # Delineate on 50%
-                AREA_PERCENTAGE_CUTOFF = 0.5
-                area_percentage = total_cnt_area / (w * h)
-
-                Logger.get_logger().log_msg(
-                    Logger.DEBUG_FLAG_DEBUG, "Recheck matching betwen 5-percentile and half-percentile"
-                )
-                Logger.get_logger().log_msg(
-                    Logger.DEBUG_FLAG_DEBUG, "Total contour area percentage: " + str(area_percentage)
-                )
-
-                # Check to see which is better. Because we are inverting, check max value
-                if area_percentage > AREA_PERCENTAGE_CUTOFF:
-
-                    # Half percentile is a better fit - switch our match
-                    ret_val = Hvf_Perc_Icon.PERC_HALF_PERCENTILE
+            if ret_val == Hvf_Perc_Icon.PERC_5_PERCENTILE and Hvf_Perc_Icon.is_half_percentile(plot_element, w, h):
 
-                    # Declare as such:
-                    debug_string = "Correction: switching from 5-percentile to half-percentile"
-                    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, debug_string)
+                # Half percentile is a better fit - switch our match
+                ret_val = Hvf_Perc_Icon.PERC_HALF_PERCENTILE
 
             # Debug strings for bounding box:
             debug_bound_box_string = "Bounding box: " + str(x0) + "," + str(y0) + " ; " + str(x1) + "," + str(y1)
@@ -14,6 +14,10 @@
 # 		- By passing in image slice of a plot
 # 		- TODO: Via a serialized text string - uses format from this objects serialization
 #
+# 	Cells are stored compactly (see Hvf_Plot_Cells); plot_array gives access to
+# 	them as cell objects, and get_numeric_grid returns them as a single NumPy
+# 	grid.
+#
 # 	To Do:
 #
 ###############################################################################
@@ -25,8 +29,10 @@ import cv2
 import numpy as np
 
 from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
+from hvf_extraction_script.hvf_data.hvf_plot_cells import Hvf_Plot_Cells
 from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
 from hvf_extraction_script.utilities.file_utils import File_Utils
+from hvf_extraction_script.utilities.image_context import Image_Context
 from hvf_extraction_script.utilities.image_utils import Image_Utils
 from hvf_extraction_script.utilities.logger import Logger
 
@@ -135,11 +141,15 @@ class Hvf_Plot_Array:
 
     ###############################################################################
     # Factory method - get a plot from image
+    # Takes either a grayscale image or an Image_Context for it; pass a context to
+    # share full-page preprocessing between plots of the same image
     @staticmethod
     def get_plot_from_image(hvf_image_gray, plot_type, icon_type, y_ratio, y_size, x_ratio, x_size):
         plot_array = None
         plot_img = None
 
+        hvf_image_gray = Image_Context.get_image_context(hvf_image_gray)
+
         # If this is a pattern plot, make sure to check if pattern was generated:
         if plot_type == Hvf_Plot_Array.PLOT_PATTERN_DEV and Hvf_Plot_Array.is_pattern_not_shown(
             hvf_image_gray, y_ratio, y_size, x_ratio, x_size
@@ -162,6 +172,14 @@ class Hvf_Plot_Array:
     def get_plot_from_array(plot_type, icon_type, plot_array):
         return Hvf_Plot_Array(plot_type, icon_type, plot_array, None)
 
+    ###############################################################################
+    # Factory method - get a plot from a numeric grid (see get_numeric_grid)
+    @staticmethod
+    def get_plot_from_numeric_grid(plot_type, icon_type, numeric_grid):
+        plot_cells = Hvf_Plot_Cells.get_plot_cells_from_numeric_grid(icon_type, numeric_grid)
+
+        return Hvf_Plot_Array(plot_type, icon_type, plot_cells, None)
+
     ###############################################################################
     # Variable Initialization method
     @classmethod
@@ -206,11 +224,37 @@ class Hvf_Plot_Array:
     def get_icon_type(self):
         return self.icon_type
 
+    ###############################################################################
+    # Plot array property - the plot cells (Hvf_Plot_Cells, indexed [x, y] like an
+    # array of cell objects), or NO_PATTERN_DETECT, or None if plot extraction
+    # failed. Object arrays of cell objects assigned to it are converted to plot
+    # cells
+    @property
+    def plot_array(self):
+        return self.plot_cells
+
+    @plot_array.setter
+    def plot_array(self, plot_array):
+        if isinstance(plot_array, np.ndarray):
+            plot_array = Hvf_Plot_Cells.get_plot_cells_from_object_array(self.icon_type, plot_array)
+
+        self.plot_cells = plot_array
+
     ###############################################################################
     # Simple accessor for plot array
     def get_plot_array(self):
         return self.plot_array
 
+    ###############################################################################
+    # Returns the plot as a numeric grid, indexed [x, y] (see
+    # Hvf_Plot_Cells.get_numeric_grid). Returns None if there are no plot cells
+    # (eg, pattern not generated)
+    def get_numeric_grid(self):
+        if not isinstance(self.plot_cells, Hvf_Plot_Cells):
+            return None
+
+        return self.plot_cells.get_numeric_grid()
+
     ###############################################################################
     # Simple accessor for plot array
     def get_source_image(self):
@@ -251,11 +295,9 @@ class Hvf_Plot_Array:
     def release_saved_image(self):
         self.plot_image = None
 
-        # Check if pattern plot/no pattern generated
-        if not self.is_pattern_not_generated():
-            for r in range(0, np.size(self.plot_array, 0)):
-                for c in range(0, np.size(self.plot_array, 1)):
-                    self.plot_array[r][c].release_saved_image()
+        # Check if pattern plot/no pattern generated (cell images are in the plot cells)
+        if isinstance(self.plot_cells, Hvf_Plot_Cells):
+            self.plot_cells.release_saved_image()
 
         return
 
@@ -272,14 +314,16 @@ class Hvf_Plot_Array:
     ###############################################################################
     # Searches for specific text stating that pattern is not performed. If the text
     # matches with high enough score, returns true
+    # Takes either a grayscale image or an Image_Context for it
     def is_pattern_not_shown(hvf_image_gray, y_ratio, y_size, x_ratio, x_size):
+        image_context = Image_Context.get_image_context(hvf_image_gray)
+
         # Calculate height/width for calculation later:
-        height = np.size(hvf_image_gray, 0)
-        width = np.size(hvf_image_gray, 1)
+        height = image_context.get_height()
+        width = image_context.get_width()
 
         # Slice image:
-        hvf_image_gray = Image_Utils.preprocess_image(hvf_image_gray)
-        sliced_img = Image_Utils.slice_image(hvf_image_gray, y_ratio, y_size, x_ratio, x_size)
+        sliced_img = image_context.get_slice(Image_Context.VARIANT_PREPROCESSED, y_ratio, y_size, x_ratio, x_size)
 
         # Try to detect a bounding box:
         top_left, w, h = Hvf_Plot_Array.get_bounding_box(sliced_img)
@@ -302,12 +346,17 @@ class Hvf_Plot_Array:
     # Get the plot within the image passed in, bounded by slice parameters
     # Plot_type is either "perc" or "value" - this will determine how to match/identify
     # each cell (used in a downstream function)
+    # Takes either a grayscale image or an Image_Context for it
     @staticmethod
     def get_plot(hvf_image_gray, y_ratio, y_size, x_ratio, x_size, plot_type, icon_type):
-        plot_image = Image_Utils.slice_image(hvf_image_gray, y_ratio, y_size, x_ratio, x_size)
+        image_context = Image_Context.get_image_context(hvf_image_gray)
+
+        plot_image = image_context.get_slice(Image_Context.VARIANT_GRAY, y_ratio, y_size, x_ratio, x_size)
 
-        hvf_image_gray_process = Image_Utils.preprocess_image(hvf_image_gray.copy())
-        plot_image_process = Image_Utils.slice_image(hvf_image_gray_process, y_ratio, y_size, x_ratio, x_size)
+        # Processed image is shared, and we draw on this slice below, so copy it:
+        plot_image_process = image_context.get_slice(
+            Image_Context.VARIANT_PREPROCESSED, y_ratio, y_size, x_ratio, x_size
+        ).copy()
 
         # Get bounding box from processed image:
         top_left, w, h = Hvf_Plot_Array.get_bounding_box(plot_image_process)
@@ -787,15 +836,9 @@ class Hvf_Plot_Array:
         corner_mask = Hvf_Plot_Array.generate_corner_mask(plot_width, plot_height)
         plot_image = cv2.bitwise_or(plot_image, cv2.bitwise_not(corner_mask))
 
-        # First, declare our return value array, no need to really initialize bc we'll
-        # iterate through it
-        plot_values_array = 0
-
-        if icon_type == Hvf_Plot_Array.PLOT_PERC:
-            plot_values_array = np.zeros((NUM_CELLS_COL, NUM_CELLS_ROW), dtype=Hvf_Perc_Icon)
-
-        elif icon_type == Hvf_Plot_Array.PLOT_VALUE:
-            plot_values_array = np.zeros((NUM_CELLS_COL, NUM_CELLS_ROW), dtype=Hvf_Value)
+        # First, declare our return value plot cells, no need to really initialize bc
+        # we'll iterate through it
+        plot_values_array = Hvf_Plot_Cells(icon_type)
 
         plot_image = Hvf_Plot_Array.delete_plot_axes(plot_image)
 
@@ -820,6 +863,14 @@ class Hvf_Plot_Array:
         # cv2.imwrite(f"plot_{icon_type}.jpg", plot_image_debug_copy)
         # cv2.waitKey();
 
+        # With a batched recognizer (percentile or value), cells to detect are only
+        # collected in the loop below (as (x, y, cell_slice, cell_slice_backup)), then
+        # recognized all at once
+        is_batched = (
+            (icon_type == Hvf_Plot_Array.PLOT_PERC) and (Hvf_Perc_Icon.RECOGNIZER == Hvf_Perc_Icon.RECOGNIZER_BATCHED)
+        ) or ((icon_type == Hvf_Plot_Array.PLOT_VALUE) and (Hvf_Value.RECOGNIZER == Hvf_Value.RECOGNIZER_KNN))
+        list_of_batched_cells = []
+
         # We iterate through our array, then slice out the appropriate cell from the plot
         for x in range(0, NUM_CELLS_COL):
             for y in range(0, NUM_CELLS_ROW):
@@ -851,7 +902,12 @@ class Hvf_Plot_Array:
                 # Then, need to analyze to figure out what element is in this position
                 # What we look for depends on type of plot - perc vs value
                 if icon_type == Hvf_Plot_Array.PLOT_PERC:
-                    if Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x]:
+                    if Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x] and is_batched:
+                        # Detected after the loop, together with the rest of the plot
+                        list_of_batched_cells.append((x, y, cell_slice, cell_slice_backup))
+                        continue
+
+                    elif Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x]:
                         # This element needs to be detected
 
                         # Because this step relies on many things going right, possible that our
@@ -882,7 +938,12 @@ class Hvf_Plot_Array:
                         )
 
                 elif icon_type == Hvf_Plot_Array.PLOT_VALUE:
-                    if Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x]:
+                    if Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x] and is_batched:
+                        # Detected after the loop, together with the rest of the plot
+                        list_of_batched_cells.append((x, y, cell_slice, cell_slice_backup))
+                        continue
+
+                    elif Hvf_Plot_Array.PLOT_ELEMENT_BOOLEAN_MASK[y][x]:
                         # This element needs to be detected
 
                         # Because this step relies on many things going right, possible that our
@@ -915,6 +976,27 @@ class Hvf_Plot_Array:
                 # Lastly, store into array:
                 plot_values_array[x, y] = cell_object
 
+        # Recognize all collected cells in a single batch:
+        if list_of_batched_cells:
+            list_of_slices = [cell[2] for cell in list_of_batched_cells]
+
+            if icon_type == Hvf_Plot_Array.PLOT_PERC:
+                list_of_cell_objects = Hvf_Perc_Icon.get_perc_icons_from_images(list_of_slices)
+
+            else:
+                list_of_slice_backups = [cell[3] for cell in list_of_batched_cells]
+                list_of_cell_objects = Hvf_Value.get_values_from_images(
+                    list_of_slices, list_of_slice_backups, plot_type
+                )
+
+            for cell, cell_object in zip(list_of_batched_cells, list_of_cell_objects):
+                x, y = cell[0], cell[1]
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_INFO,
+                    "Cell " + str(x) + "," + str(y) + ": Detected: " + cell_object.get_display_string(),
+                )
+                plot_values_array[x, y] = cell_object
+
         wait_func = lambda: cv2.waitKey(0)  # noqa: E731
         Logger.get_logger().log_function(Logger.DEBUG_FLAG_DEBUG, wait_func)
         destroy_windows_func = lambda: cv2.destroyAllWindows()  # noqa: E731
@@ -949,7 +1031,7 @@ class Hvf_Plot_Array:
     # First index is x-axis (column), second index is y-axis (row)
     # Because we want human-readable string, we index to pull out an entire row (ie, fixed y)
     def get_array_string_by_line(plot_array, icon_type, delimiter, y_index):
-        row_array = plot_array[:, y_index]
+        row_array = [plot_array[x, y_index] for x in range(0, np.size(plot_array, 0))]
 
         if icon_type == Hvf_Plot_Array.PLOT_VALUE:
             row_array = map((lambda x: x.get_standard_size_display_string()), row_array)
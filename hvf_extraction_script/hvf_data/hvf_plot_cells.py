@@ -0,0 +1,348 @@
+###############################################################################
+# hvf_plot_cells.py
+#
+# Description:
+# 	Class definition for the compact cell storage behind an HVF plot array.
+# 	Rather than an array of Python cell objects, a plot is stored as small
+# 	fixed-type grids:
+# 		Value plots: int16 value grid, plus uint8 status grid (value, no value,
+# 		failure, below threshold)
+# 		Percentile plots: uint8 grid of percentile icon enums
+# 	Optional cell images (source image slices) are kept in a single side
+# 	buffer, so releasing them does not need to visit every cell.
+#
+# 	Indexing works like the object arrays plots used to be stored as - indexing
+# 	a single cell ([x, y]) returns an Hvf_Value/Hvf_Perc_Icon for it, and
+# 	assigning a cell object to a single cell stores it. Indexing a single column
+# 	([x]) returns a column view (Hvf_Plot_Cells_Column), so chained indexing
+# 	([x][y]) reads and assigns cells the same way. Other indexing (slices)
+# 	returns a read only object array copy, so assignments to it raise rather
+# 	than being lost.
+#
+# Main usage:
+# 	plot_cells = Hvf_Plot_Cells(Hvf_Plot_Cells.ICON_VALUE)
+# 	plot_cells[x, y] = Hvf_Value.get_value_from_display_string("12")
+# 	plot_cells[x, y].get_value()
+# 	plot_cells[x][y] = Hvf_Value.get_value_from_display_string("12")
+#
+###############################################################################
+
+# Import necessary packages
+import numpy as np
+
+from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
+from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
+
+
+class Hvf_Plot_Cells:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    # Icon types (same values as Hvf_Plot_Array.PLOT_VALUE/PLOT_PERC):
+    ICON_VALUE = "value"
+    ICON_PERC = "perc"
+
+    NUM_OF_PLOT_COLS = 10
+    NUM_OF_PLOT_ROWS = 10
+
+    # Value cell status enums:
+    STATUS_VALUE = 0
+    STATUS_NO_VALUE = 1
+    STATUS_FAILURE = 2
+    STATUS_BELOW_THRESHOLD = 3
+
+    # Sentinel values (as used by Hvf_Value) for each non-value status:
+    STATUS_SENTINELS = {
+        STATUS_NO_VALUE: Hvf_Value.VALUE_NO_VALUE,
+        STATUS_FAILURE: Hvf_Value.VALUE_FAILURE,
+        STATUS_BELOW_THRESHOLD: Hvf_Value.VALUE_BELOW_THRESHOLD,
+    }
+
+    ###############################################################################
+    # CONSTRUCTOR AND FACTORY METHODS #############################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer method
+    # Takes in icon type; all cells start empty (no value)
+    def __init__(self, icon_type):
+
+        self.icon_type = icon_type
+
+        shape = (Hvf_Plot_Cells.NUM_OF_PLOT_COLS, Hvf_Plot_Cells.NUM_OF_PLOT_ROWS)
+
+        if icon_type == Hvf_Plot_Cells.ICON_PERC:
+            self.value_grid = None
+            self.status_grid = None
+            self.perc_grid = np.full(shape, Hvf_Perc_Icon.PERC_NO_VALUE, dtype=np.uint8)
+
+        else:
+            self.value_grid = np.zeros(shape, dtype=np.int16)
+            self.status_grid = np.full(shape, Hvf_Plot_Cells.STATUS_NO_VALUE, dtype=np.uint8)
+            self.perc_grid = None
+
+        # Cell images, by (x, y):
+        self.cell_images = {}
+
+    ###############################################################################
+    # Factory method - given icon type and an object array of cell objects (as
+    # plots used to be stored), returns the corresponding plot cells. Entries that
+    # are not cell objects are left empty
+    @staticmethod
+    def get_plot_cells_from_object_array(icon_type, object_array):
+
+        plot_cells = Hvf_Plot_Cells(icon_type)
+
+        for x in range(np.size(object_array, 0)):
+            for y in range(np.size(object_array, 1)):
+                if isinstance(object_array[x, y], (Hvf_Value, Hvf_Perc_Icon)):
+                    plot_cells[x, y] = object_array[x, y]
+
+        return plot_cells
+
+    ###############################################################################
+    # Factory method - given icon type and a numeric grid (see get_numeric_grid),
+    # returns the corresponding plot cells
+    @staticmethod
+    def get_plot_cells_from_numeric_grid(icon_type, numeric_grid):
+
+        plot_cells = Hvf_Plot_Cells(icon_type)
+        numeric_grid = np.asarray(numeric_grid)
+
+        if icon_type == Hvf_Plot_Cells.ICON_PERC:
+            plot_cells.perc_grid[:, :] = numeric_grid
+
+        else:
+            plot_cells.status_grid[:, :] = Hvf_Plot_Cells.STATUS_VALUE
+            plot_cells.value_grid[:, :] = numeric_grid
+
+            for status, sentinel in Hvf_Plot_Cells.STATUS_SENTINELS.items():
+                is_sentinel = numeric_grid == sentinel
+
+                plot_cells.status_grid[is_sentinel] = status
+                plot_cells.value_grid[is_sentinel] = 0
+
+        return plot_cells
+
+    ###############################################################################
+    # OBJECT METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Shape of the plot (columns, rows), as for a NumPy array
+    @property
+    def shape(self):
+        return (Hvf_Plot_Cells.NUM_OF_PLOT_COLS, Hvf_Plot_Cells.NUM_OF_PLOT_ROWS)
+
+    def __len__(self):
+        return Hvf_Plot_Cells.NUM_OF_PLOT_COLS
+
+    ###############################################################################
+    # Indexing a single cell returns its cell object, and a single column returns a
+    # view of that column (see Hvf_Plot_Cells_Column); any other index is applied
+    # to a read only object array copy (see get_object_array)
+    def __getitem__(self, key):
+
+        if Hvf_Plot_Cells.is_cell_index(key):
+            return self.get_cell(key[0], key[1])
+
+        if isinstance(key, (int, np.integer)):
+            return Hvf_Plot_Cells_Column(self, range(Hvf_Plot_Cells.NUM_OF_PLOT_COLS)[key])
+
+        object_array = self.get_object_array()[key]
+
+        if isinstance(object_array, np.ndarray):
+            object_array.flags.writeable = False
+
+        return object_array
+
+    ###############################################################################
+    # Stores a cell object into a single cell
+    def __setitem__(self, key, cell_object):
+
+        if not Hvf_Plot_Cells.is_cell_index(key):
+            raise IndexError("Plot cells can only be assigned one cell at a time")
+
+        self.set_cell(key[0], key[1], cell_object)
+
+    ###############################################################################
+    # Iterates over column views (see Hvf_Plot_Cells_Column)
+    def __iter__(self):
+        return (self[x] for x in range(Hvf_Plot_Cells.NUM_OF_PLOT_COLS))
+
+    ###############################################################################
+    # Allows np.asarray (and other NumPy functions) to treat plot cells as an object
+    # array of cell objects
+    def __array__(self, dtype=None, copy=None):
+        return self.get_object_array()
+
+    ###############################################################################
+    # Returns a copy of the plot cells (like ndarray.copy)
+    def copy(self):
+
+        plot_cells = Hvf_Plot_Cells(self.icon_type)
+
+        plot_cells.value_grid = None if self.value_grid is None else self.value_grid.copy()
+        plot_cells.status_grid = None if self.status_grid is None else self.status_grid.copy()
+        plot_cells.perc_grid = None if self.perc_grid is None else self.perc_grid.copy()
+        plot_cells.cell_images = dict(self.cell_images)
+
+        return plot_cells
+
+    ###############################################################################
+    # Given cell coordinates, returns the cell object
+    def get_cell(self, x, y):
+
+        cell_image = self.cell_images.get((x, y))
+
+        if self.icon_type == Hvf_Plot_Cells.ICON_PERC:
+            return Hvf_Perc_Icon(int(self.perc_grid[x, y]), cell_image)
+
+        status = int(self.status_grid[x, y])
+
+        if status == Hvf_Plot_Cells.STATUS_VALUE:
+            return Hvf_Value(int(self.value_grid[x, y]), cell_image)
+
+        return Hvf_Value(Hvf_Plot_Cells.STATUS_SENTINELS[status], cell_image)
+
+    ###############################################################################
+    # Given cell coordinates and a cell object, stores it
+    def set_cell(self, x, y, cell_object):
+
+        if self.icon_type == Hvf_Plot_Cells.ICON_PERC:
+            self.perc_grid[x, y] = cell_object.get_enum()
+
+        else:
+            value = cell_object.get_value()
+
+            self.status_grid[x, y] = Hvf_Plot_Cells.STATUS_VALUE
+            self.value_grid[x, y] = 0
+
+            for status, sentinel in Hvf_Plot_Cells.STATUS_SENTINELS.items():
+                if value == sentinel:
+                    self.status_grid[x, y] = status
+                    break
+            else:
+                self.value_grid[x, y] = value
+
+        cell_image = cell_object.get_source_image()
+
+        if cell_image is None:
+            self.cell_images.pop((x, y), None)
+        else:
+            self.cell_images[(x, y)] = cell_image
+
+    ###############################################################################
+    # Returns an object array of cell objects (a copy - changes to it are not stored)
+    def get_object_array(self):
+
+        object_array = np.empty(self.shape, dtype=object)
+
+        for x in range(Hvf_Plot_Cells.NUM_OF_PLOT_COLS):
+            for y in range(Hvf_Plot_Cells.NUM_OF_PLOT_ROWS):
+                object_array[x, y] = self.get_cell(x, y)
+
+        return object_array
+
+    ###############################################################################
+    # Returns the plot as a single numeric grid (a copy):
+    # Value plots: int16 values, with the Hvf_Value sentinels (VALUE_NO_VALUE,
+    # VALUE_FAILURE, VALUE_BELOW_THRESHOLD) for other cells
+    # Percentile plots: uint8 percentile icon enums
+    def get_numeric_grid(self):
+
+        if self.icon_type == Hvf_Plot_Cells.ICON_PERC:
+            return self.perc_grid.copy()
+
+        numeric_grid = self.value_grid.copy()
+
+        for status, sentinel in Hvf_Plot_Cells.STATUS_SENTINELS.items():
+            numeric_grid[self.status_grid == status] = sentinel
+
+        return numeric_grid
+
+    ###############################################################################
+    # Releases saved cell images (to help save memory)
+    def release_saved_image(self):
+
+        self.cell_images = {}
+
+        return
+
+    ###############################################################################
+    # HELPER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Returns True if key indexes a single cell (ie, is a pair of integers)
+    @staticmethod
+    def is_cell_index(key):
+
+        return (
+            isinstance(key, tuple)
+            and len(key) == 2
+            and isinstance(key[0], (int, np.integer))
+            and isinstance(key[1], (int, np.integer))
+        )
+
+
+class Hvf_Plot_Cells_Column:
+
+    ###############################################################################
+    # Column view of plot cells (plot_cells[x]) - indexing a single cell ([y]) reads
+    # or assigns that cell of the plot cells; any other index is applied to a read
+    # only object array copy of the column
+
+    ###############################################################################
+    # Initializer method
+    # Takes in plot cells and column (x) index
+    def __init__(self, plot_cells, x):
+
+        self.plot_cells = plot_cells
+        self.x = x
+
+    @property
+    def shape(self):
+        return (Hvf_Plot_Cells.NUM_OF_PLOT_ROWS,)
+
+    def __len__(self):
+        return Hvf_Plot_Cells.NUM_OF_PLOT_ROWS
+
+    def __getitem__(self, key):
+
+        if isinstance(key, (int, np.integer)):
+            return self.plot_cells.get_cell(self.x, range(Hvf_Plot_Cells.NUM_OF_PLOT_ROWS)[key])
+
+        object_array = self.get_object_array()[key]
+
+        if isinstance(object_array, np.ndarray):
+            object_array.flags.writeable = False
+
+        return object_array
+
+    def __setitem__(self, key, cell_object):
+
+        if not isinstance(key, (int, np.integer)):
+            raise IndexError("Plot cells can only be assigned one cell at a time")
+
+        self.plot_cells.set_cell(self.x, range(Hvf_Plot_Cells.NUM_OF_PLOT_ROWS)[key], cell_object)
+
+    def __iter__(self):
+        return (self[y] for y in range(Hvf_Plot_Cells.NUM_OF_PLOT_ROWS))
+
+    def __array__(self, dtype=None, copy=None):
+        return self.get_object_array()
+
+    ###############################################################################
+    # Returns an object array of the column's cell objects (a copy - changes to it
+    # are not stored)
+    def get_object_array(self):
+
+        object_array = np.empty(self.shape, dtype=object)
+
+        for y in range(Hvf_Plot_Cells.NUM_OF_PLOT_ROWS):
+            object_array[y] = self.plot_cells.get_cell(self.x, y)
+
+        return object_array
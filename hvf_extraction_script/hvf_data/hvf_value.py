@@ -16,6 +16,10 @@
 # 		1. Icon detection/cropping
 # 		2. Icon recognition
 #
+# 	Alternatively, call batch factory with all cell images of a plot. With the
+# 	k-NN recognizer (see RECOGNIZER), digits of all cells are classified in a
+# 	single call to Hvf_Digit_Classifier
+#
 # 	To Do:
 # 		- Get display string
 #
@@ -31,6 +35,9 @@ import cv2
 # Import some helper packages:
 import numpy as np
 
+# Learned digit classifier (alternative digit recognizer):
+from hvf_extraction_script.hvf_data.hvf_digit_classifier import Hvf_Digit_Classifier
+
 # For reading files:
 from hvf_extraction_script.utilities.file_utils import File_Utils
 
@@ -83,6 +90,27 @@ class Hvf_Value:
 
     template_value_list = None
 
+    # Template bank - icon templates already resized to a given height, keyed by
+    # (template key, height) (see get_resized_template). Filled in on first use of
+    # each height, so the classification loop only needs to template match
+    resized_icon_templates = {}
+
+    # Template key kinds (template keys are (kind, ...) tuples):
+    TEMPLATE_KIND_VALUE = "value"
+    TEMPLATE_KIND_MINUS = "minus"
+    TEMPLATE_KIND_LESS_THAN = "less_than"
+
+    # Digit recognizer backends:
+    # Template matching of each digit in turn (reference implementation)
+    RECOGNIZER_TEMPLATE = "template"
+
+    # Nearest neighbour classification of all digits of a plot at once (see
+    # Hvf_Digit_Classifier)
+    RECOGNIZER_KNN = "knn"
+
+    # Recognizer to use
+    RECOGNIZER = RECOGNIZER_TEMPLATE
+
     # Initialization flag
     is_initialized = False
 
@@ -108,22 +136,42 @@ class Hvf_Value:
 
         value = Hvf_Value.get_value_plot_element(slice, slice_backup, plot_type)
 
-        exception_list = [Hvf_Value.VALUE_FAILURE, Hvf_Value.VALUE_NO_VALUE, Hvf_Value.VALUE_BELOW_THRESHOLD]
+        return Hvf_Value(Hvf_Value.get_value_within_limits(value, plot_type), slice)
 
-        # In case value generated is incorrect, bring within normal limits:
-        if value not in exception_list:
-            if value > Hvf_Value.VALUE_MAX_VALUE:
-                value = Hvf_Value.VALUE_MAX_VALUE
+    ###############################################################################
+    # Factory method - given lists of image slices and backup slices (eg, all cells
+    # of a plot), returns a list of corresponding values, using the configured
+    # RECOGNIZER
+    @staticmethod
+    def get_values_from_images(list_of_slices, list_of_slice_backups, plot_type):
 
-            elif (plot_type == "raw") and (value < Hvf_Value.VALUE_MIN_VALUE_RAW):
+        if Hvf_Value.RECOGNIZER == Hvf_Value.RECOGNIZER_KNN:
+            list_of_values = Hvf_Value.get_value_plot_elements_batched(list_of_slices, list_of_slice_backups, plot_type)
 
-                value = Hvf_Value.VALUE_MIN_VALUE_RAW
+        else:
+            list_of_values = [
+                Hvf_Value.get_value_plot_element(slice, slice_backup, plot_type)
+                for slice, slice_backup in zip(list_of_slices, list_of_slice_backups)
+            ]
+
+        return [
+            Hvf_Value(Hvf_Value.get_value_within_limits(value, plot_type), slice)
+            for value, slice in zip(list_of_values, list_of_slices)
+        ]
 
-            elif not (plot_type == "raw") and (value < Hvf_Value.VALUE_MIN_VALUE_DEV):
+    ###############################################################################
+    # Returns a string identifying the configured RECOGNIZER (and, for k-NN, the
+    # trained model), for keying cached extractions
+    @staticmethod
+    def get_recognizer_stamp():
 
-                value = Hvf_Value.VALUE_MIN_VALUE_DEV
+        if Hvf_Value.RECOGNIZER == Hvf_Value.RECOGNIZER_KNN:
+            if not Hvf_Digit_Classifier.is_initialized:
+                Hvf_Digit_Classifier.initialize_class_vars(Hvf_Value.value_icon_templates)
 
-        return Hvf_Value(value, slice)
+            return Hvf_Value.RECOGNIZER + ":" + Hvf_Digit_Classifier.model_stamp
+
+        return Hvf_Value.RECOGNIZER
 
     ###############################################################################
     # Factory method - given an number, returns a value corresponding to the
@@ -162,6 +210,9 @@ class Hvf_Value:
         cls.minus_icon_templates = {}
         cls.less_than_icon_templates = {}
 
+        # Templates are being (re)loaded, so any resized versions are stale:
+        cls.resized_icon_templates = {}
+
         # Iterate through the icon folders:
 
         module_list = [
@@ -278,6 +329,28 @@ class Hvf_Value:
 
         return x
 
+    ###############################################################################
+    # Helper method - given a detected value, brings it within normal limits for the
+    # plot type (in case value generated is incorrect)
+    @staticmethod
+    def get_value_within_limits(value, plot_type):
+
+        exception_list = [Hvf_Value.VALUE_FAILURE, Hvf_Value.VALUE_NO_VALUE, Hvf_Value.VALUE_BELOW_THRESHOLD]
+
+        if value not in exception_list:
+            if value > Hvf_Value.VALUE_MAX_VALUE:
+                value = Hvf_Value.VALUE_MAX_VALUE
+
+            elif (plot_type == "raw") and (value < Hvf_Value.VALUE_MIN_VALUE_RAW):
+
+                value = Hvf_Value.VALUE_MIN_VALUE_RAW
+
+            elif not (plot_type == "raw") and (value < Hvf_Value.VALUE_MIN_VALUE_DEV):
+
+                value = Hvf_Value.VALUE_MIN_VALUE_DEV
+
+        return value
+
     def contour_bound_box_area(x):
         x, y, w, h = cv2.boundingRect(x)
         return w * h
@@ -375,19 +448,43 @@ class Hvf_Value:
             Logger.get_logger().log_function(Logger.DEBUG_FLAG_DEBUG, show_element_func)
         return ret_list
 
+    ###############################################################################
+    # Given a template key (eg, (TEMPLATE_KIND_VALUE, digit, dir)), the template it
+    # refers to and a height, returns the template scaled to that height. Each
+    # template/height pair is only resized once; later requests are looked up in the
+    # template bank
+    @staticmethod
+    def get_resized_template(template_key, template, height):
+
+        bank_key = (template_key, height)
+        resized_template = Hvf_Value.resized_icon_templates.get(bank_key)
+
+        if resized_template is None:
+            scale_factor = height / np.size(template, 0)
+            resized_template = cv2.resize(template, (0, 0), fx=scale_factor, fy=scale_factor)
+
+            Hvf_Value.resized_icon_templates[bank_key] = resized_template
+
+        return resized_template
+
     ###############################################################################
     # Given an image and a icon template, scales the icon to the height of the image
     # and copyBorders the image to match the sizes. Then, performs template matching
     # and returns the result
+    # If template_key is given, the scaled icon is taken from the template bank
     @staticmethod
-    def resize_and_template_match(image, icon):
+    def resize_and_template_match(image, icon, template_key=None):
 
         h = np.size(image, 0)
 
         # Scale the value icon:
-        scale_factor = h / np.size(icon, 0)
+        if template_key is None:
+            scale_factor = h / np.size(icon, 0)
 
-        icon = cv2.resize(icon, (0, 0), fx=scale_factor, fy=scale_factor)
+            icon = cv2.resize(icon, (0, 0), fx=scale_factor, fy=scale_factor)
+
+        else:
+            icon = Hvf_Value.get_resized_template(template_key, icon, h)
 
         # In case the original is too small by width compared to icon, need to widen;
         # do so by copymakeborder replicate
@@ -418,7 +515,9 @@ class Hvf_Value:
 
         for key in Hvf_Value.less_than_icon_templates:
 
-            match_val = Hvf_Value.resize_and_template_match(plot_element, Hvf_Value.less_than_icon_templates[key])
+            match_val = Hvf_Value.resize_and_template_match(
+                plot_element, Hvf_Value.less_than_icon_templates[key], (Hvf_Value.TEMPLATE_KIND_LESS_THAN, key)
+            )
 
             best_match_val = max(match_val, best_match_val)
 
@@ -438,7 +537,9 @@ class Hvf_Value:
 
         for key in Hvf_Value.minus_icon_templates:
 
-            match_val = Hvf_Value.resize_and_template_match(plot_element, Hvf_Value.minus_icon_templates[key])
+            match_val = Hvf_Value.resize_and_template_match(
+                plot_element, Hvf_Value.minus_icon_templates[key], (Hvf_Value.TEMPLATE_KIND_MINUS, key)
+            )
 
             best_match_val = max(match_val, best_match_val)
 
@@ -467,32 +568,45 @@ class Hvf_Value:
         if not allow_search_zero:
             start_index = 1
 
+        # Upscaled copies of the plot element, by template height (templates in the
+        # same version directory share a height, so this is at most one per directory)
+        upscaled_elements = {}
+
         for ii in range(start_index, len(Hvf_Value.value_icon_templates.keys())):
 
             for dir in Hvf_Value.value_icon_templates[ii]:
 
                 # First, scale our template value:
                 val_icon = Hvf_Value.value_icon_templates[ii][dir]
+                val_icon_height = val_icon.shape[0]
 
-                plot_element_temp = plot_element.copy()
+                plot_element_temp = plot_element
 
                 scale_factor = 1
                 # Use the smaller factor to make sure we fit into the element icon
-                if height < np.size(val_icon, 0):
+                if height < val_icon_height:
                     # Need to upscale plot_element
-                    scale_factor = np.size(val_icon, 0) / height
-                    plot_element_temp = cv2.resize(plot_element_temp, (0, 0), fx=scale_factor, fy=scale_factor)
+                    scale_factor = val_icon_height / height
+
+                    if val_icon_height not in upscaled_elements:
+                        upscaled_elements[val_icon_height] = cv2.resize(
+                            plot_element, (0, 0), fx=scale_factor, fy=scale_factor
+                        )
+
+                    plot_element_temp = upscaled_elements[val_icon_height]
 
                 else:
-                    # Need to upscale val_icon
-                    scale_factor = height / (np.size(val_icon, 0))
-                    val_icon = cv2.resize(val_icon, (0, 0), fx=scale_factor, fy=scale_factor)
+                    # Need to upscale val_icon (looked up in template bank)
+                    scale_factor = height / val_icon_height
+                    val_icon = Hvf_Value.get_resized_template(
+                        (Hvf_Value.TEMPLATE_KIND_VALUE, ii, dir), val_icon, height
+                    )
 
                 # In case the original is too small by width compared to value_icon, need
                 # to widen - do so by copymakeborder replicate
 
-                if np.size(plot_element_temp, 1) < np.size(val_icon, 1):
-                    border = np.size(val_icon, 1) - np.size(plot_element_temp, 1)
+                if plot_element_temp.shape[1] < val_icon.shape[1]:
+                    border = val_icon.shape[1] - plot_element_temp.shape[1]
                     # plot_element_temp = cv2.copyMakeBorder(plot_element_temp,0,0,0,border,cv2.BORDER_CONSTANT,0);
 
                 # Apply template matching:
@@ -572,11 +686,19 @@ class Hvf_Value:
     ###############################################################################
 
     ###############################################################################
-    # Get the corresponding value element/number from the plot element:
+    # Given a plot element, cleans it up, splits it into characters and detects
+    # special (non-digit) characters. Returns tuple of (return_val, is_minus,
+    # list_of_chars, list_of_chars_backup):
+    # return_val is VALUE_NO_VALUE/VALUE_BELOW_THRESHOLD if already determined,
+    # otherwise 0, in which case list_of_chars holds the digits left to identify
+    # and is_minus is the sign multiplier (1 or -1)
     @staticmethod
-    def get_value_plot_element(plot_element, plot_element_backup, plot_type):
-        # Declare return value
+    def segment_value_plot_element(plot_element, plot_element_backup, plot_type):
+        # Declare return values
         return_val = 0
+        is_minus = 1
+        list_of_chars = []
+        list_of_chars_backup = []
 
         # CV2 just slices images and returns the native image. We mess with the pixels so
         # for cleanliness, just copy it over:
@@ -677,51 +799,68 @@ class Hvf_Value:
                         list_of_chars.pop(0)
                         list_of_chars_backup.pop(0)
 
-                # Now, look for digits, and calculate running value
+        return return_val, is_minus, list_of_chars, list_of_chars_backup
 
-                running_value = 0
+    ###############################################################################
+    # Given position of a digit within a number (index jj of num_chars digits) and
+    # the sign multiplier, returns whether the digit may be a 0 (it is the trailing
+    # 0 of a multi-digit number, or a lone digit and not a minus)
+    @staticmethod
+    def is_zero_allowed(jj, num_chars, is_minus):
 
-                for jj in range(len(list_of_chars)):
+        return ((jj == num_chars - 1) and (num_chars > 1)) or ((num_chars == 1) and (is_minus == 1))
 
-                    # Pull out our digit to detect, and clean it
-                    digit = Hvf_Value.clean_slice(list_of_chars[jj])
+    ###############################################################################
+    # Get the corresponding value element/number from the plot element:
+    @staticmethod
+    def get_value_plot_element(plot_element, plot_element_backup, plot_type):
 
-                    show_element_func = lambda: cv2.imshow("Sub element " + str(Hvf_Value.i) + "_" + str(jj), digit)
-                    Logger.get_logger().log_function(Logger.DEBUG_FLAG_DEBUG, show_element_func)
+        return_val, is_minus, list_of_chars, list_of_chars_backup = Hvf_Value.segment_value_plot_element(
+            plot_element, plot_element_backup, plot_type
+        )
 
-                    Hvf_Value.j = Hvf_Value.j + 1
+        # Check if the value still needs to be detected:
+        if return_val == 0:
 
-                    # Search for 0 if it is the trailing 0 of a multi-digit number, or if lone digit and not a minus
-                    allow_search_zero = ((jj == len(list_of_chars) - 1) and (len(list_of_chars) > 1)) or (
-                        (len(list_of_chars) == 1) and (is_minus == 1)
-                    )
+            # Now, look for digits, and calculate running value
 
-                    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "Allow 0 search: " + str(allow_search_zero))
-                    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "jj: " + str(jj))
-                    Logger.get_logger().log_msg(
-                        Logger.DEBUG_FLAG_DEBUG, "list_of_chars length: " + str(len(list_of_chars))
-                    )
+            running_value = 0
 
-                    best_value, best_loc, best_scale_factor, best_match = Hvf_Value.identify_digit(
-                        digit, allow_search_zero
-                    )
+            for jj in range(len(list_of_chars)):
 
-                    # If not a good match, recheck with alternatively processed image -> may increase yield
-                    threshold_match_digit = 0.5
+                # Pull out our digit to detect, and clean it
+                digit = Hvf_Value.clean_slice(list_of_chars[jj])
 
-                    if best_match > 0 and best_match < threshold_match_digit:
+                show_element_func = lambda: cv2.imshow("Sub element " + str(Hvf_Value.i) + "_" + str(jj), digit)
+                Logger.get_logger().log_function(Logger.DEBUG_FLAG_DEBUG, show_element_func)
 
-                        digit_backup = Hvf_Value.clean_slice(list_of_chars_backup[jj])
-                        best_value, best_loc, best_scale_factor, best_match = Hvf_Value.identify_digit(
-                            digit_backup, allow_search_zero
-                        )
+                Hvf_Value.j = Hvf_Value.j + 1
 
-                    running_value = (10 * running_value) + best_value
+                # Search for 0 if it is the trailing 0 of a multi-digit number, or if lone digit and not a minus
+                allow_search_zero = Hvf_Value.is_zero_allowed(jj, len(list_of_chars), is_minus)
 
-                Hvf_Value.i = Hvf_Value.i + 1
-                Hvf_Value.j = 0
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "Allow 0 search: " + str(allow_search_zero))
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "jj: " + str(jj))
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "list_of_chars length: " + str(len(list_of_chars)))
 
-                return_val = running_value * is_minus
+                best_value, best_loc, best_scale_factor, best_match = Hvf_Value.identify_digit(digit, allow_search_zero)
+
+                # If not a good match, recheck with alternatively processed image -> may increase yield
+                threshold_match_digit = 0.5
+
+                if best_match > 0 and best_match < threshold_match_digit:
+
+                    digit_backup = Hvf_Value.clean_slice(list_of_chars_backup[jj])
+                    best_value, best_loc, best_scale_factor, best_match = Hvf_Value.identify_digit(
+                        digit_backup, allow_search_zero
+                    )
+
+                running_value = (10 * running_value) + best_value
+
+            Hvf_Value.i = Hvf_Value.i + 1
+            Hvf_Value.j = 0
+
+            return_val = running_value * is_minus
 
         # Debug info string for the best matched value:
         debug_best_match_string = "Best matched value: " + Hvf_Value.get_string_from_value(return_val)
@@ -729,5 +868,68 @@ class Hvf_Value:
 
         return return_val
 
+    ###############################################################################
+    # Batched (k-NN) version of get_value_plot_element: given lists of plot elements
+    # and backup plot elements, returns list of corresponding values
+    # Each element is segmented as in get_value_plot_element, then the digits of all
+    # elements are classified in a single call to Hvf_Digit_Classifier. Errors
+    # segmenting an element are raised, as with template matching
+    @staticmethod
+    def get_value_plot_elements_batched(list_of_plot_elements, list_of_plot_element_backups, plot_type):
+
+        if not Hvf_Digit_Classifier.is_initialized:
+            Hvf_Digit_Classifier.initialize_class_vars(Hvf_Value.value_icon_templates)
+
+        # Per element: (return_val, is_minus, number of digits)
+        list_of_segmentations = []
+
+        # Digits of all elements, in order:
+        list_of_digits = []
+        list_of_allow_zero = []
+
+        for plot_element, plot_element_backup in zip(list_of_plot_elements, list_of_plot_element_backups):
+
+            try:
+                return_val, is_minus, list_of_chars, list_of_chars_backup = Hvf_Value.segment_value_plot_element(
+                    plot_element, plot_element_backup, plot_type
+                )
+
+            except Exception:
+                # Fails the plot, as a failed cell does with template matching (see
+                # Hvf_Plot_Array.extract_values_from_plot)
+                Logger.get_logger().log_msg(Logger.DEBUG_FLAG_WARNING, "Value detection failure")
+                raise
+
+            if not (return_val == 0):
+                list_of_chars = []
+
+            for jj in range(len(list_of_chars)):
+                list_of_digits.append(Hvf_Value.clean_slice(list_of_chars[jj]))
+                list_of_allow_zero.append(Hvf_Value.is_zero_allowed(jj, len(list_of_chars), is_minus))
+
+            list_of_segmentations.append((return_val, is_minus, len(list_of_chars)))
+
+        list_of_digit_results = Hvf_Digit_Classifier.classify_glyphs(list_of_digits, list_of_allow_zero)
+
+        # Now assemble digits back into values:
+        list_of_values = []
+        digit_index = 0
+
+        for return_val, is_minus, num_chars in list_of_segmentations:
+
+            if return_val == 0:
+                running_value = 0
+
+                for best_value, best_match in list_of_digit_results[digit_index : digit_index + num_chars]:
+                    running_value = (10 * running_value) + best_value
+
+                digit_index = digit_index + num_chars
+
+                return_val = running_value * is_minus
+
+            list_of_values.append(return_val)
+
+        return list_of_values
+
     i = 0
     j = 0
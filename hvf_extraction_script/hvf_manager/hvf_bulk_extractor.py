@@ -0,0 +1,217 @@
+###############################################################################
+# hvf_bulk_extractor.py
+#
+# Description:
+# 	Functions for extracting HVF objects from many image (or DICOM OPV) files,
+# 	either serially or by fanning files out to a pool of worker processes.
+#
+# 	Results are always yielded in the same order as the input path list,
+# 	regardless of the number of workers, so output generated from a parallel
+# 	run is identical to output from a serial run.
+#
+# 	Worker functions live in this module (rather than in a script) so that
+# 	they can be pickled and imported by spawned worker processes.
+#
+###############################################################################
+
+# Import necessary packages
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Import the HVF_Object class
+from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
+
+# Import general purpose utilities
+from hvf_extraction_script.utilities.file_utils import File_Utils
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Bulk_Extractor:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    IMAGE_FILE_EXTENSIONS = [".bmp", ".jpg", ".jpeg", ".png"]
+
+    DICOM_FILE_EXTENSIONS = [".dcm"]
+
+    # DICOM values larger than this (eg, encapsulated report documents) are not
+    # read, as only tag values are needed for extraction:
+    DICOM_DEFER_SIZE = "1 KB"
+
+    # DICOM files are cheap to extract, so are sent to workers in batches:
+    DICOM_CHUNK_SIZE = 64
+
+    ###############################################################################
+    # WORKER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer for each worker process. Loads icon templates once per process.
+    # Tesseract engines are per-thread and never shared with a forked parent, so
+    # each worker constructs and owns its own on first use. Extraction cache settings are
+    # passed through from the parent process (empty cache_dir disables it).
+    @staticmethod
+    def initialize_worker(logger_level, cache_dir="", cache_max_size=0):
+
+        Logger.set_logger_level(logger_level)
+
+        Hvf_Object.set_extraction_cache(cache_dir, cache_max_size)
+
+        if not Hvf_Object.is_initialized:
+            Hvf_Object.initialize_class_vars()
+
+    ###############################################################################
+    # Given an image path, reads the image and extracts the HVF object from it.
+    # Returns a tuple of (file_name, hvf_obj). Saved images are released so that the
+    # object is cheap to pass back to the parent process.
+    @staticmethod
+    def get_hvf_obj_from_image_path(hvf_img_path):
+
+        path, filename = os.path.split(hvf_img_path)
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF image " + filename)
+        hvf_img = File_Utils.read_image_from_file(hvf_img_path)
+
+        hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_img)
+        hvf_obj.release_saved_image()
+
+        return filename, hvf_obj
+
+    ###############################################################################
+    # Given an image path, reads the image and returns a tuple of
+    # (file_name, serialized JSON string, elapsed time in ms). Serialization string
+    # is None if extraction failed, so one bad file does not end the whole run.
+    @staticmethod
+    def get_serialization_from_image_path(hvf_img_path):
+
+        path, filename = os.path.split(hvf_img_path)
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF image " + filename)
+        Logger.get_logger().log_time("Serialize " + filename, Logger.TIME_START)
+
+        try:
+            hvf_img = File_Utils.read_image_from_file(hvf_img_path)
+            hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_img)
+            hvf_serialized = hvf_obj.serialize_to_json()
+
+        except Exception:
+            hvf_serialized = None
+
+        time_elapsed = Logger.get_logger().log_time("Serialize " + filename, Logger.TIME_END)
+
+        return filename, hvf_serialized, time_elapsed
+
+    ###############################################################################
+    # Given a DICOM path and a save directory, reads the DICOM tag values (without
+    # pixel data or large values), extracts the HVF object and writes its text
+    # serialization into the save directory. Writing is done here, so only a short
+    # result is passed back to the parent process. Returns a tuple of
+    # (file_name, whether successful, elapsed time in ms)
+    @staticmethod
+    def save_serialization_from_dicom_path(hvf_dcm_path, save_dir):
+
+        path, filename = os.path.split(hvf_dcm_path)
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "Reading HVF DICOM " + filename)
+        Logger.get_logger().log_time("Serialize " + filename, Logger.TIME_START)
+
+        try:
+            hvf_dicom_ds = File_Utils.read_dicom_from_file(
+                hvf_dcm_path, stop_before_pixels=True, defer_size=Hvf_Bulk_Extractor.DICOM_DEFER_SIZE
+            )
+            hvf_obj = Hvf_Object.get_hvf_object_from_dicom(hvf_dicom_ds)
+
+            file_path = os.path.join(save_dir, str(filename) + ".txt")
+            File_Utils.write_string_to_file(hvf_obj.serialize_to_json(), file_path)
+
+            is_successful = True
+
+        except Exception:
+            is_successful = False
+
+        time_elapsed = Logger.get_logger().log_time("Serialize " + filename, Logger.TIME_END)
+
+        return filename, is_successful, time_elapsed
+
+    ###############################################################################
+    # BULK PROCESSING METHODS #####################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a function taking a single path and a list of paths, yields the result
+    # of the function for each path, in the order of the path list.
+    # With num_workers <= 1 runs serially in this process; otherwise fans paths out
+    # to a pool of num_workers processes, chunk_size paths at a time.
+    @staticmethod
+    def map_paths(func, list_of_paths, num_workers=1, chunk_size=1):
+
+        if num_workers <= 1:
+            for file_path in list_of_paths:
+                yield func(file_path)
+
+            return
+
+        # Workers share the parent's extraction cache directory, if any
+        cache_dir = ""
+        cache_max_size = 0
+        if Hvf_Object.extraction_cache is not None:
+            cache_dir = Hvf_Object.extraction_cache.cache_dir
+            cache_max_size = Hvf_Object.extraction_cache.max_size
+
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=Hvf_Bulk_Extractor.initialize_worker,
+            initargs=(Logger.get_logger_level(), cache_dir, cache_max_size),
+        ) as executor:
+
+            # Executor map yields results in submission order, so output is
+            # deterministic regardless of which worker finishes first
+            yield from executor.map(func, list_of_paths, chunksize=chunk_size)
+
+    ###############################################################################
+    # Given a directory of images, yields (file_name, hvf_obj) tuples in directory
+    # listing order
+    @staticmethod
+    def get_hvf_objs_from_image_dir(directory, num_workers=1):
+
+        list_of_img_paths = File_Utils.get_files_within_dir(directory, Hvf_Bulk_Extractor.IMAGE_FILE_EXTENSIONS)
+
+        yield from Hvf_Bulk_Extractor.map_paths(
+            Hvf_Bulk_Extractor.get_hvf_obj_from_image_path, list_of_img_paths, num_workers
+        )
+
+    ###############################################################################
+    # Given a list of image paths, yields (file_name, serialization, elapsed_ms)
+    # tuples in list order. Serialization is None on failure
+    @staticmethod
+    def get_serializations_from_image_paths(list_of_img_paths, num_workers=1):
+
+        yield from Hvf_Bulk_Extractor.map_paths(
+            Hvf_Bulk_Extractor.get_serialization_from_image_path, list_of_img_paths, num_workers
+        )
+
+    ###############################################################################
+    # Given a directory of images, yields (file_name, serialization, elapsed_ms)
+    # tuples in directory listing order. Serialization is None on failure
+    @staticmethod
+    def get_serializations_from_image_dir(directory, num_workers=1):
+
+        list_of_img_paths = File_Utils.get_files_within_dir(directory, Hvf_Bulk_Extractor.IMAGE_FILE_EXTENSIONS)
+
+        yield from Hvf_Bulk_Extractor.get_serializations_from_image_paths(list_of_img_paths, num_workers)
+
+    ###############################################################################
+    # Given a directory of DICOM files and a save directory, serializes each DICOM
+    # into the save directory, and yields (file_name, is_successful, elapsed_ms)
+    # tuples in directory listing order
+    @staticmethod
+    def save_serializations_from_dicom_dir(directory, save_dir, num_workers=1):
+
+        list_of_dcm_paths = File_Utils.get_files_within_dir(directory, Hvf_Bulk_Extractor.DICOM_FILE_EXTENSIONS)
+
+        yield from Hvf_Bulk_Extractor.map_paths(
+            functools.partial(Hvf_Bulk_Extractor.save_serialization_from_dicom_path, save_dir=save_dir),
+            list_of_dcm_paths,
+            num_workers,
+            Hvf_Bulk_Extractor.DICOM_CHUNK_SIZE,
+        )
@@ -0,0 +1,246 @@
+###############################################################################
+# hvf_bulk_loader.py
+#
+# Description:
+# 	Functions for loading many HVF JSON text serializations (eg, a
+# 	serialized_hvfs directory) quickly.
+#
+# 	Files are read by a pool of threads (reading is I/O bound). Each plot's row
+# 	strings are parsed straight into a numeric grid (see
+# 	Hvf_Plot_Array.get_numeric_grid) through a lookup table of display tokens,
+# 	rather than into 100 cell objects. Each file is loaded as a record of
+# 	(file_name, metadata, plot_grids), with plot_grids an array of shape
+# 	(5, 10, 10) laid out as in Hvf_Corpus. Hvf_Object instances are only
+# 	constructed when asked for (see get_hvf_object), and their plots keep the
+# 	compact numeric storage.
+#
+# 	Results are always yielded in directory listing order, regardless of the
+# 	number of threads.
+#
+# 	Usage:
+# 		for file_name, metadata, plot_grids in Hvf_Bulk_Loader.get_records_from_text_dir(directory):
+# 			...
+#
+# 		for file_name, hvf_obj in Hvf_Bulk_Loader.get_hvf_objs_from_text_dir(directory):
+# 			...
+#
+###############################################################################
+
+# Import necessary packages
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Import the HVF_Object and plot classes
+from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
+from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
+from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
+from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
+
+# Import corpus class for the plot grid layout
+from hvf_extraction_script.hvf_manager.hvf_corpus import Hvf_Corpus
+
+# Import general purpose utilities
+from hvf_extraction_script.utilities.file_utils import File_Utils
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Bulk_Loader:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    TEXT_FILE_EXTENSIONS = [".txt"]
+
+    DEFAULT_NUM_THREADS = 8
+
+    # Number of files read ahead of the consumer, per thread:
+    READ_AHEAD_PER_THREAD = 16
+
+    # JSON key for each plot, in Hvf_Corpus.PLOT_LAYOUT order:
+    PLOT_KEYLABELS = [
+        Hvf_Object.KEYLABEL_RAW_VAL_PLOT,
+        Hvf_Object.KEYLABEL_ABS_VAL_PLOT,
+        Hvf_Object.KEYLABEL_ABS_PERC_PLOT,
+        Hvf_Object.KEYLABEL_PAT_VAL_PLOT,
+        Hvf_Object.KEYLABEL_PAT_PERC_PLOT,
+    ]
+
+    # Lookup tables of display token -> numeric grid code.
+    # Value tokens (white space stripped, as in get_value_plot_from_row_strings);
+    # numbers not in the table are converted and added on first use
+    VALUE_TOKEN_LUT = {
+        "": Hvf_Value.VALUE_NO_VALUE,
+        Hvf_Value.VALUE_FAILURE_CHAR: Hvf_Value.VALUE_FAILURE,
+        Hvf_Value.VALUE_BELOW_THRESHOLD_CHAR: Hvf_Value.VALUE_BELOW_THRESHOLD,
+    }
+    VALUE_TOKEN_LUT.update({str(value): value for value in range(-60, 61)})
+
+    # Percentile tokens (not stripped - a space is the no value icon); unknown
+    # tokens are failures
+    PERC_TOKEN_LUT = {char: perc_enum for perc_enum, char in Hvf_Perc_Icon.perc_disp_char_dict.items()}
+
+    ###############################################################################
+    # PARSING METHODS #############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a value token (white space stripped), returns its numeric code
+    @staticmethod
+    def get_value_code(token):
+
+        code = Hvf_Bulk_Loader.VALUE_TOKEN_LUT.get(token)
+
+        if code is None:
+            code = Hvf_Value.get_value_from_display_string(token).get_value()
+            Hvf_Bulk_Loader.VALUE_TOKEN_LUT[token] = code
+
+        return code
+
+    ###############################################################################
+    # Given a list of row strings for a plot and its icon type, returns the numeric
+    # grid (indexed [x, y], as in Hvf_Plot_Array.get_numeric_grid). Equivalent to
+    # Hvf_Object.get_value_plot_from_row_strings/get_perc_plot_from_row_strings
+    @staticmethod
+    def get_numeric_grid_from_row_strings(plot_by_row, icon_type):
+
+        num_cols = Hvf_Plot_Array.NUM_OF_PLOT_COLS
+        num_rows = Hvf_Plot_Array.NUM_OF_PLOT_ROWS
+
+        # Split all rows at once; a full plot gives exactly one token per cell
+        list_of_tokens = Hvf_Object.SERIALIZATION_DELIMITER_CHAR.join(plot_by_row).split(
+            Hvf_Object.SERIALIZATION_DELIMITER_CHAR
+        )
+
+        if icon_type == Hvf_Plot_Array.PLOT_PERC:
+            perc_lut = Hvf_Bulk_Loader.PERC_TOKEN_LUT
+            list_of_codes = [perc_lut.get(token, Hvf_Perc_Icon.PERC_FAILURE) for token in list_of_tokens]
+            empty_code = Hvf_Perc_Icon.PERC_NO_VALUE
+        else:
+            value_lut = Hvf_Bulk_Loader.VALUE_TOKEN_LUT
+            list_of_codes = [value_lut.get(token.replace(" ", "")) for token in list_of_tokens]
+
+            if None in list_of_codes:
+                list_of_codes = [Hvf_Bulk_Loader.get_value_code(token.replace(" ", "")) for token in list_of_tokens]
+
+            empty_code = Hvf_Value.VALUE_NO_VALUE
+
+        # Rows are y, tokens within each row are x:
+        if len(plot_by_row) == num_rows and len(list_of_codes) == num_cols * num_rows:
+            return np.array(list_of_codes, dtype=Hvf_Corpus.PLOT_DTYPE).reshape(num_rows, num_cols).T
+
+        # Irregular plot (short rows or fewer rows) - fill row by row, leaving
+        # missing cells empty:
+        numeric_grid = np.full((num_cols, num_rows), empty_code, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+        token_index = 0
+        for y in range(len(plot_by_row)):
+            num_tokens = plot_by_row[y].count(Hvf_Object.SERIALIZATION_DELIMITER_CHAR) + 1
+
+            numeric_grid[0:num_tokens, y] = list_of_codes[token_index : token_index + num_tokens]
+            token_index = token_index + num_tokens
+
+        return numeric_grid
+
+    ###############################################################################
+    # Given an HVF JSON text serialization, returns (metadata, plot_grids), with
+    # plot_grids an array of shape (5, 10, 10) in Hvf_Corpus.PLOT_LAYOUT order.
+    # Pattern plots not generated are filled with Hvf_Corpus.PLOT_NOT_GENERATED
+    @staticmethod
+    def get_record_from_text(hvf_text):
+
+        hvf_dict = json.loads(hvf_text)
+
+        plot_grids = np.empty(Hvf_Corpus.PLOT_SHAPE, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+        for plot_index, keylabel in enumerate(Hvf_Bulk_Loader.PLOT_KEYLABELS):
+
+            plot_by_row = hvf_dict.pop(keylabel)
+            plot_type, icon_type, attribute = Hvf_Corpus.PLOT_LAYOUT[plot_index]
+
+            if plot_by_row == Hvf_Object.NO_PATTERN_DETECT:
+                plot_grids[plot_index] = Hvf_Corpus.PLOT_NOT_GENERATED
+            else:
+                plot_grids[plot_index] = Hvf_Bulk_Loader.get_numeric_grid_from_row_strings(plot_by_row, icon_type)
+
+        # Remaining items in dictionary are metadata
+        return hvf_dict, plot_grids
+
+    ###############################################################################
+    # Given a text file path, reads and parses it. Returns a tuple of
+    # (file_name, metadata, plot_grids)
+    @staticmethod
+    def get_record_from_text_path(hvf_txt_path):
+
+        path, filename = os.path.split(hvf_txt_path)
+
+        metadata, plot_grids = Hvf_Bulk_Loader.get_record_from_text(File_Utils.read_text_from_file(hvf_txt_path))
+
+        return filename, metadata, plot_grids
+
+    ###############################################################################
+    # Given metadata and plot grids (as in a record), constructs the Hvf_Object
+    @staticmethod
+    def get_hvf_object(metadata, plot_grids):
+
+        return Hvf_Corpus.get_hvf_object_from_plot_grids(metadata, plot_grids)
+
+    ###############################################################################
+    # BULK LOADING METHODS ########################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a list of text file paths, yields (file_name, metadata, plot_grids)
+    # records in list order. Files are read by a pool of num_threads threads, a
+    # bounded number ahead of the consumer; num_threads <= 1 reads serially
+    @staticmethod
+    def get_records_from_text_paths(list_of_txt_paths, num_threads=DEFAULT_NUM_THREADS):
+
+        if num_threads <= 1:
+            for hvf_txt_path in list_of_txt_paths:
+                yield Hvf_Bulk_Loader.get_record_from_text_path(hvf_txt_path)
+
+            return
+
+        chunk_size = num_threads * Hvf_Bulk_Loader.READ_AHEAD_PER_THREAD
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+
+            # Submit in chunks, so a very large directory is not read into memory
+            # all at once; the next chunk is read while this one is consumed
+            next_records = executor.map(Hvf_Bulk_Loader.get_record_from_text_path, list_of_txt_paths[0:chunk_size])
+
+            for chunk_start in range(0, len(list_of_txt_paths), chunk_size):
+
+                records = next_records
+
+                next_chunk = list_of_txt_paths[chunk_start + chunk_size : chunk_start + 2 * chunk_size]
+                next_records = executor.map(Hvf_Bulk_Loader.get_record_from_text_path, next_chunk)
+
+                yield from records
+
+    ###############################################################################
+    # Given a directory of text files, yields (file_name, metadata, plot_grids)
+    # records in directory listing order
+    @staticmethod
+    def get_records_from_text_dir(directory, num_threads=DEFAULT_NUM_THREADS):
+
+        list_of_txt_paths = File_Utils.get_files_within_dir(directory, Hvf_Bulk_Loader.TEXT_FILE_EXTENSIONS)
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM, f"Loading {len(list_of_txt_paths)} HVF text files from {directory}"
+        )
+
+        yield from Hvf_Bulk_Loader.get_records_from_text_paths(list_of_txt_paths, num_threads)
+
+    ###############################################################################
+    # Given a directory of text files, yields (file_name, hvf_obj) pairs in
+    # directory listing order. Each object is constructed as it is yielded
+    @staticmethod
+    def get_hvf_objs_from_text_dir(directory, num_threads=DEFAULT_NUM_THREADS):
+
+        for filename, metadata, plot_grids in Hvf_Bulk_Loader.get_records_from_text_dir(directory, num_threads):
+            yield filename, Hvf_Bulk_Loader.get_hvf_object(metadata, plot_grids)
@@ -0,0 +1,271 @@
+###############################################################################
+# hvf_corpus.py
+#
+# Description:
+# 	Class definition for an HVF corpus - a columnar on-disk format for many
+# 	HVF exams, for cohort-wide analysis without parsing per-exam JSON. A corpus
+# 	is a directory holding:
+#
+# 		corpus.json    - corpus info (number of exams, plot order, version).
+# 		                 Written last, so an incomplete corpus is not opened
+# 		metadata.jsonl - one line per exam: {"file_name": ..., "metadata": {...}}
+# 		plots.int16    - raw int16 array of shape (num_exams, 5, 10, 10), one
+# 		                 numeric grid per plot (see Hvf_Plot_Array.get_numeric_grid)
+# 		                 in PLOT_LAYOUT order, opened with np.memmap
+#
+# 	Plots that are absent are filled with a sentinel (PLOT_NOT_GENERATED for
+# 	pattern plots not shown, PLOT_MISSING for plots that failed to extract).
+#
+# 	Hvf_Object instances are only constructed when an exam is accessed;
+# 	analysis over the whole corpus can work on get_plot_tensor() directly.
+#
+# 	Usage:
+# 		Hvf_Corpus.write_corpus(corpus_dir, <iterable of (file_name, hvf_obj)>)
+#
+# 		hvf_corpus = Hvf_Corpus(corpus_dir)
+# 		plot_tensor = hvf_corpus.get_plot_tensor()
+# 		hvf_obj = hvf_corpus[index]
+#
+###############################################################################
+
+# Import necessary packages
+import json
+import os
+
+import numpy as np
+
+# Import the HVF_Object and plot classes
+from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
+from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
+
+# Import general purpose utilities
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Corpus:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    INFO_FILE_NAME = "corpus.json"
+    METADATA_FILE_NAME = "metadata.jsonl"
+    PLOTS_FILE_NAME = "plots.int16"
+
+    CORPUS_VERSION = 1
+
+    # Info field labels
+    KEYLABEL_VERSION = "version"
+    KEYLABEL_NUM_EXAMS = "num_exams"
+    KEYLABEL_PLOT_ORDER = "plot_order"
+
+    # Metadata row field labels
+    KEYLABEL_FILE_NAME = "file_name"
+    KEYLABEL_METADATA = "metadata"
+
+    PLOT_DTYPE = np.int16
+
+    # Plot indices within each exam's plot tensor:
+    PLOT_RAW = 0
+    PLOT_TDV = 1
+    PLOT_TDP = 2
+    PLOT_PDV = 3
+    PLOT_PDP = 4
+
+    # Plot type, icon type and Hvf_Object attribute for each plot index:
+    PLOT_LAYOUT = [
+        (Hvf_Plot_Array.PLOT_RAW, Hvf_Plot_Array.PLOT_VALUE, "raw_value_array"),
+        (Hvf_Plot_Array.PLOT_TOTAL_DEV, Hvf_Plot_Array.PLOT_VALUE, "abs_dev_value_array"),
+        (Hvf_Plot_Array.PLOT_TOTAL_DEV, Hvf_Plot_Array.PLOT_PERC, "abs_dev_percentile_array"),
+        (Hvf_Plot_Array.PLOT_PATTERN_DEV, Hvf_Plot_Array.PLOT_VALUE, "pat_dev_value_array"),
+        (Hvf_Plot_Array.PLOT_PATTERN_DEV, Hvf_Plot_Array.PLOT_PERC, "pat_dev_percentile_array"),
+    ]
+
+    PLOT_SHAPE = (len(PLOT_LAYOUT), Hvf_Plot_Array.NUM_OF_PLOT_COLS, Hvf_Plot_Array.NUM_OF_PLOT_ROWS)
+
+    # Fill values for absent plots:
+    # Pattern plot not generated (field too depressed)
+    PLOT_NOT_GENERATED = -96
+
+    # Plot missing (eg, failed extraction)
+    PLOT_MISSING = -95
+
+    ###############################################################################
+    # CONSTRUCTOR AND FACTORY METHODS #############################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer method
+    # Given a corpus directory (see write_corpus), opens it. Metadata is read into
+    # memory; plots are memory mapped (read only)
+    def __init__(self, corpus_dir):
+
+        self.corpus_dir = corpus_dir
+
+        info_path = os.path.join(corpus_dir, Hvf_Corpus.INFO_FILE_NAME)
+
+        if not os.path.isfile(info_path):
+            raise FileNotFoundError(f"No corpus info file '{info_path}' (corpus missing or incomplete)")
+
+        with open(info_path) as f:
+            self.info = json.load(f)
+
+        num_exams = self.info[Hvf_Corpus.KEYLABEL_NUM_EXAMS]
+
+        # Metadata rows, one per exam:
+        self.list_of_rows = []
+        with open(os.path.join(corpus_dir, Hvf_Corpus.METADATA_FILE_NAME)) as f:
+            for ii in range(num_exams):
+                self.list_of_rows.append(json.loads(f.readline()))
+
+        # np.memmap cannot map an empty file
+        if num_exams == 0:
+            self.plot_tensor = np.zeros((0,) + Hvf_Corpus.PLOT_SHAPE, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+        else:
+            self.plot_tensor = np.memmap(
+                os.path.join(corpus_dir, Hvf_Corpus.PLOTS_FILE_NAME),
+                dtype=Hvf_Corpus.PLOT_DTYPE,
+                mode="r",
+                shape=(num_exams,) + Hvf_Corpus.PLOT_SHAPE,
+            )
+
+    ###############################################################################
+    # OBJECT METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Number of exams in corpus
+    def __len__(self):
+        return len(self.list_of_rows)
+
+    ###############################################################################
+    # Indexing returns the Hvf_Object for that exam (constructed on access)
+    def __getitem__(self, index):
+        return self.get_hvf_object(index)
+
+    ###############################################################################
+    # Yields (file_name, hvf_obj) pairs one at a time, in corpus order
+    def __iter__(self):
+        for ii in range(len(self)):
+            yield self.get_file_name(ii), self.get_hvf_object(ii)
+
+    ###############################################################################
+    # Simple accessor for file name of exam at index
+    def get_file_name(self, index):
+        return self.list_of_rows[index][Hvf_Corpus.KEYLABEL_FILE_NAME]
+
+    ###############################################################################
+    # Simple accessor for metadata dictionary of exam at index (a copy)
+    def get_metadata(self, index):
+        return dict(self.list_of_rows[index][Hvf_Corpus.KEYLABEL_METADATA])
+
+    ###############################################################################
+    # Simple accessor for the plot tensor - array of shape (num_exams, 5, 10, 10),
+    # indexed [exam, plot (see PLOT_*), x, y]. Memory mapped; read only
+    def get_plot_tensor(self):
+        return self.plot_tensor
+
+    ###############################################################################
+    # Constructs the Hvf_Object for exam at index
+    def get_hvf_object(self, index):
+
+        return Hvf_Corpus.get_hvf_object_from_plot_grids(self.get_metadata(index), self.plot_tensor[index])
+
+    ###############################################################################
+    # HELPER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a metadata dictionary and plot grids (array of shape (5, 10, 10), as in
+    # get_plot_grids), constructs the Hvf_Object
+    @staticmethod
+    def get_hvf_object_from_plot_grids(metadata, plot_grids):
+
+        list_of_plots = []
+
+        for plot_index, (plot_type, icon_type, attribute) in enumerate(Hvf_Corpus.PLOT_LAYOUT):
+
+            numeric_grid = np.asarray(plot_grids[plot_index])
+
+            if np.all(numeric_grid == Hvf_Corpus.PLOT_NOT_GENERATED):
+                plot = Hvf_Plot_Array.get_plot_from_array(plot_type, icon_type, Hvf_Plot_Array.NO_PATTERN_DETECT)
+
+            elif np.all(numeric_grid == Hvf_Corpus.PLOT_MISSING):
+                plot = Hvf_Plot_Array.get_plot_from_array(plot_type, icon_type, None)
+
+            else:
+                plot = Hvf_Plot_Array.get_plot_from_numeric_grid(plot_type, icon_type, numeric_grid)
+
+            list_of_plots.append(plot)
+
+        raw_plot, tdv_plot, tdp_plot, pdv_plot, pdp_plot = list_of_plots
+
+        return Hvf_Object(metadata, raw_plot, tdv_plot, pdv_plot, tdp_plot, pdp_plot, None)
+
+    ###############################################################################
+    # Given an Hvf_Object, returns its plots as one array of shape (5, 10, 10)
+    @staticmethod
+    def get_plot_grids(hvf_obj):
+
+        plot_grids = np.zeros(Hvf_Corpus.PLOT_SHAPE, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+        for plot_index, (plot_type, icon_type, attribute) in enumerate(Hvf_Corpus.PLOT_LAYOUT):
+
+            plot = getattr(hvf_obj, attribute, None)
+
+            if plot is not None and plot.is_pattern_not_generated():
+                plot_grids[plot_index] = Hvf_Corpus.PLOT_NOT_GENERATED
+
+            elif plot is None or plot.get_numeric_grid() is None:
+                plot_grids[plot_index] = Hvf_Corpus.PLOT_MISSING
+
+            else:
+                plot_grids[plot_index] = plot.get_numeric_grid()
+
+        return plot_grids
+
+    ###############################################################################
+    # Given a corpus directory and an iterable of (file_name, hvf_obj) pairs,
+    # writes the corpus (replacing any existing corpus in the directory). Exams are
+    # written as they are yielded, so the iterable can be a generator over a very
+    # large collection. Returns the number of exams written
+    @staticmethod
+    def write_corpus(corpus_dir, hvf_obj_iterable):
+
+        if not os.path.isdir(corpus_dir):
+            os.makedirs(corpus_dir)
+
+        info_path = os.path.join(corpus_dir, Hvf_Corpus.INFO_FILE_NAME)
+
+        # Remove old info first, so a partially rewritten corpus is never opened
+        if os.path.isfile(info_path):
+            os.remove(info_path)
+
+        num_exams = 0
+
+        with open(os.path.join(corpus_dir, Hvf_Corpus.METADATA_FILE_NAME), "w") as metadata_fh, open(
+            os.path.join(corpus_dir, Hvf_Corpus.PLOTS_FILE_NAME), "wb"
+        ) as plots_fh:
+
+            for file_name, hvf_obj in hvf_obj_iterable:
+
+                row = {Hvf_Corpus.KEYLABEL_FILE_NAME: file_name, Hvf_Corpus.KEYLABEL_METADATA: hvf_obj.metadata}
+
+                metadata_fh.write(json.dumps(row) + "\n")
+                plots_fh.write(Hvf_Corpus.get_plot_grids(hvf_obj).tobytes())
+
+                num_exams = num_exams + 1
+
+        info = {
+            Hvf_Corpus.KEYLABEL_VERSION: Hvf_Corpus.CORPUS_VERSION,
+            Hvf_Corpus.KEYLABEL_NUM_EXAMS: num_exams,
+            Hvf_Corpus.KEYLABEL_PLOT_ORDER: [attribute for plot_type, icon_type, attribute in Hvf_Corpus.PLOT_LAYOUT],
+        }
+
+        with open(info_path, "w") as f:
+            json.dump(info, f, indent=4)
+
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Wrote corpus of {num_exams} exams to {corpus_dir}")
+
+        return num_exams
@@ -14,9 +14,14 @@ import numpy as np
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
 from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
 from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
-from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
+
+# Import bulk loader and corpus classes, for decoding plots into numeric grids:
+from hvf_extraction_script.hvf_manager.hvf_bulk_loader import Hvf_Bulk_Loader
+from hvf_extraction_script.hvf_manager.hvf_corpus import Hvf_Corpus
 
 # General purpose file functions:
+from hvf_extraction_script.utilities.file_utils import File_Utils
+
 # Import logger class to handle any messages:
 from hvf_extraction_script.utilities.logger import Logger
 
@@ -30,6 +35,16 @@ class Hvf_Export:
     ###############################################################################
     CELL_DELIMITER = "\t"
 
+    FILE_NAME_COLUMN = "file_name"
+
+    # Plot column name prefixes (eg, raw0..raw99), in Hvf_Corpus.PLOT_LAYOUT order:
+    PLOT_COLUMN_PREFIXES = ["raw", "tdv", "tdp", "pdv", "pdp"]
+
+    PLOT_SIZE = 100
+
+    # Number of rows decoded together when importing a spreadsheet:
+    IMPORT_CHUNK_SIZE = 1024
+
     ###############################################################################
     # HELPER FUNCTIONS ############################################################
     ###############################################################################
@@ -127,11 +142,9 @@ class Hvf_Export:
     ###############################################################################
 
     ###############################################################################
-    # Given a dict of file_name->hvf objects, creates a delimited string containing
-    # all the data (for export to a spreadsheet file). Delimiter specified in the
-    # class code.
+    # Generates the list of column headers for the exported spreadsheet
 
-    def export_hvf_list_to_spreadsheet(dict_of_hvf):
+    def get_spreadsheet_header_list():
 
         # First, generate headers. Major categories of data:
         # 1. Filename source
@@ -161,15 +174,22 @@ class Hvf_Export:
         # Construct our header list
         headers_list = ["file_name"] + metadata_header_list + raw_val_list + tdv_list + tdp_list + pdv_list + pdp_list
 
-        # And construct our return array:
-        string_list = []
-        string_list.append(Hvf_Export.CELL_DELIMITER.join(headers_list))
+        return headers_list
 
-        # Now, iterate for each HVF object and pull the data:
-        for file_name in dict_of_hvf:
+    ###############################################################################
+    # Given an iterable of (file_name, hvf_obj) pairs, generates the lines of the
+    # exported spreadsheet one at a time (header line first). Lines do not include
+    # the newline character. Only one HVF object needs to be alive at a time, so
+    # memory stays flat regardless of the number of objects.
+
+    def generate_spreadsheet_lines(iterable_of_hvf):
+
+        metadata_header_list = Hvf_Object.METADATA_KEY_LIST.copy()
+
+        yield Hvf_Export.CELL_DELIMITER.join(Hvf_Export.get_spreadsheet_header_list())
 
-            # Grab hvf_obj:
-            hvf_obj = dict_of_hvf[file_name]
+        # Now, iterate for each HVF object and pull the data:
+        for file_name, hvf_obj in iterable_of_hvf:
 
             Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Converting File {file_name}")
 
@@ -184,151 +204,209 @@ class Hvf_Export:
 
             # hvf_obj_line = Regex_Utils.clean_nonascii(hvf_obj_line)
 
-            # And add line to the running list:
-            string_list.append(hvf_obj_line)
+            yield hvf_obj_line
+
+    ###############################################################################
+    # Given an iterable of (file_name, hvf_obj) pairs and an open file handle, writes
+    # each spreadsheet line to the file handle as soon as it is generated. Flushes
+    # after every line so partial output survives a crash partway through.
+    # Output is byte-identical to export_hvf_list_to_spreadsheet.
+
+    def export_hvf_list_to_file_handle(iterable_of_hvf, fh):
+
+        line_separator = ""
+
+        for line in Hvf_Export.generate_spreadsheet_lines(iterable_of_hvf):
+
+            File_Utils.write_fh_line(fh, line_separator + line)
+            fh.flush()
+
+            line_separator = "\n"
+
+    ###############################################################################
+    # Given a dict of file_name->hvf objects, creates a delimited string containing
+    # all the data (for export to a spreadsheet file). Delimiter specified in the
+    # class code.
+
+    def export_hvf_list_to_spreadsheet(dict_of_hvf):
 
         # Finally, return joined string:
-        return "\n".join(string_list)
+        return "\n".join(Hvf_Export.generate_spreadsheet_lines(dict_of_hvf.items()))
 
     ###############################################################################
     # SPREADSHEET IMPORTING TO HVF OBJECT DICTIONARY ##############################
     ###############################################################################
 
-    ############################################################################
-    # Given a data string, slurp in file into a list of rows (which are dicts
-    # themselves)
-    def slurp_string_to_dict_list(data_string):
+    ###############################################################################
+    # Given the spreadsheet header list, returns the column layout for importing:
+    # (file_name column index, list of (metadata key, column index), plot column
+    # indices). Plot column indices are an array of shape (5, 100) - one row per
+    # plot in Hvf_Corpus.PLOT_LAYOUT order, one column per cell (cell i is at
+    # x = i % 10, y = i / 10)
 
-        return_list = []
+    def get_import_column_layout(header_list):
 
-        string_list = data_string.strip("\n").split("\n")
+        column_indices = {header: index for index, header in enumerate(header_list)}
 
-        header_list = string_list.pop(0).split(Hvf_Export.CELL_DELIMITER)
+        plot_columns = np.array(
+            [
+                [column_indices[prefix + str(i)] for i in range(Hvf_Export.PLOT_SIZE)]
+                for prefix in Hvf_Export.PLOT_COLUMN_PREFIXES
+            ]
+        )
 
-        for line in string_list:
+        plot_column_set = set(plot_columns.flatten().tolist())
+        file_name_index = column_indices[Hvf_Export.FILE_NAME_COLUMN]
 
-            line_data = line.split(Hvf_Export.CELL_DELIMITER)
+        # All other columns are metadata:
+        metadata_columns = [
+            (header, index)
+            for index, header in enumerate(header_list)
+            if index not in plot_column_set and index != file_name_index
+        ]
 
-            line_dict = dict(zip(header_list, line_data))
+        return file_name_index, metadata_columns, plot_columns
 
-            return_list.append(line_dict)
+    ###############################################################################
+    # Given an array of plot cell tokens (any shape) and the icon type, returns an
+    # array of numeric codes (as in Hvf_Plot_Array.get_numeric_grid) and an array
+    # of whether each token is blank, both of the same shape. Each distinct token
+    # is only decoded once
 
-        return return_list
+    def decode_plot_tokens(token_array, icon_type):
 
-    ###############################################################################
-    # Given a line, generate the HVF object from the data
+        # Fixed width strings sort much faster than Python string objects:
+        unique_tokens, token_inverse = np.unique(np.asarray(token_array).astype(str), return_inverse=True)
+        token_inverse = token_inverse.reshape(token_array.shape)
 
-    def get_hvf_object_from_line(line):
+        # White space is only for readability:
+        unique_tokens = [str(token).replace(" ", "") for token in unique_tokens]
 
-        line, raw_plot = Hvf_Export.get_hvf_plot_from_line(line, Hvf_Plot_Array.PLOT_RAW, Hvf_Plot_Array.PLOT_VALUE)
-        line, tdv_plot = Hvf_Export.get_hvf_plot_from_line(
-            line, Hvf_Plot_Array.PLOT_TOTAL_DEV, Hvf_Plot_Array.PLOT_VALUE
-        )
-        line, tdp_plot = Hvf_Export.get_hvf_plot_from_line(
-            line, Hvf_Plot_Array.PLOT_TOTAL_DEV, Hvf_Plot_Array.PLOT_PERC
-        )
-        line, pdv_plot = Hvf_Export.get_hvf_plot_from_line(
-            line, Hvf_Plot_Array.PLOT_PATTERN_DEV, Hvf_Plot_Array.PLOT_VALUE
-        )
-        line, pdp_plot = Hvf_Export.get_hvf_plot_from_line(
-            line, Hvf_Plot_Array.PLOT_PATTERN_DEV, Hvf_Plot_Array.PLOT_PERC
-        )
+        if icon_type == Hvf_Plot_Array.PLOT_PERC:
+            unique_codes = [
+                Hvf_Bulk_Loader.PERC_TOKEN_LUT.get(
+                    token or Hvf_Perc_Icon.PERC_NO_VALUE_CHAR, Hvf_Perc_Icon.PERC_FAILURE
+                )
+                for token in unique_tokens
+            ]
+        else:
+            unique_codes = [Hvf_Bulk_Loader.get_value_code(token) for token in unique_tokens]
 
-        # Clean up metadata:
-        for key in line.keys():
-            line[key] = line.get(key).replace('"', "").strip()
+        unique_codes = np.array(unique_codes, dtype=Hvf_Corpus.PLOT_DTYPE)
+        unique_blanks = np.array([token == "" for token in unique_tokens], dtype=bool)
 
-        hvf_obj = Hvf_Object(line, raw_plot, tdv_plot, pdv_plot, tdp_plot, pdp_plot, None)
+        return unique_codes[token_inverse], unique_blanks[token_inverse]
 
-        return hvf_obj
+    ###############################################################################
+    # Given a list of spreadsheet rows (each a list of cells) and the column layout
+    # (see get_import_column_layout), returns list of (file_name, hvf_obj) pairs.
+    # All plots of all rows are decoded together
 
-    def get_hvf_plot_from_line(line, plot_type, icon_type):
+    def get_hvf_objs_from_rows(list_of_rows, column_layout):
 
-        plot_name = ""
-        plot_values_array = 0
+        file_name_index, metadata_columns, plot_columns = column_layout
 
-        if plot_type == Hvf_Plot_Array.PLOT_RAW:
-            plot_name = "raw"
-            plot_array = np.zeros((10, 10), dtype=Hvf_Value)
+        # Pad short rows, so rows can be stacked into one array:
+        num_columns = 1 + max(file_name_index, int(plot_columns.max()), *[index for key, index in metadata_columns])
+        list_of_rows = [row + [""] * (num_columns - len(row)) for row in list_of_rows]
 
-        if plot_type == Hvf_Plot_Array.PLOT_TOTAL_DEV:
-            if icon_type == Hvf_Plot_Array.PLOT_VALUE:
-                plot_name = "tdv"
-                plot_array = np.zeros((10, 10), dtype=Hvf_Value)
+        # Tokens of shape (rows, 5, 100):
+        plot_tokens = np.array(list_of_rows, dtype=object)[:, plot_columns]
 
-            if icon_type == Hvf_Plot_Array.PLOT_PERC:
-                plot_name = "tdp"
-                plot_array = np.zeros((10, 10), dtype=Hvf_Perc_Icon)
+        plot_codes = np.zeros(plot_tokens.shape, dtype=Hvf_Corpus.PLOT_DTYPE)
+        plot_blanks = np.zeros(plot_tokens.shape, dtype=bool)
 
-        if plot_type == Hvf_Plot_Array.PLOT_PATTERN_DEV:
-            if icon_type == Hvf_Plot_Array.PLOT_VALUE:
-                plot_name = "pdv"
-                plot_array = np.zeros((10, 10), dtype=Hvf_Value)
+        for icon_type in [Hvf_Plot_Array.PLOT_VALUE, Hvf_Plot_Array.PLOT_PERC]:
+            plot_indices = [
+                plot_index
+                for plot_index, (plot_type, plot_icon_type, attribute) in enumerate(Hvf_Corpus.PLOT_LAYOUT)
+                if plot_icon_type == icon_type
+            ]
 
-            if icon_type == Hvf_Plot_Array.PLOT_PERC:
-                plot_name = "pdp"
-                plot_array = np.zeros((10, 10), dtype=Hvf_Perc_Icon)
+            codes, blanks = Hvf_Export.decode_plot_tokens(plot_tokens[:, plot_indices], icon_type)
 
-        is_blank = True
-        for i in range(0, 100):
-            header_name = plot_name + str(i)
+            plot_codes[:, plot_indices] = codes
+            plot_blanks[:, plot_indices] = blanks
 
-            data_point = line.pop(header_name).replace(" ", "")
+        # Cells are ordered by row (y) then column (x); grids are indexed [x, y]:
+        plot_grids = plot_codes.reshape(
+            (
+                len(list_of_rows),
+                len(Hvf_Corpus.PLOT_LAYOUT),
+                Hvf_Plot_Array.NUM_OF_PLOT_ROWS,
+                Hvf_Plot_Array.NUM_OF_PLOT_COLS,
+            )
+        ).transpose(0, 1, 3, 2)
 
-            if data_point == "":
-                # Empty strings cause issues - replace with space
-                data_point = " "
-            else:
-                is_blank = False
+        # Blank pattern plots were not generated:
+        is_plot_blank = np.all(plot_blanks, axis=2)
 
-            if icon_type == Hvf_Plot_Array.PLOT_VALUE:
-                cell_object = Hvf_Value.get_value_from_display_string(data_point)
+        for plot_index in [Hvf_Corpus.PLOT_PDV, Hvf_Corpus.PLOT_PDP]:
+            plot_grids[is_plot_blank[:, plot_index], plot_index] = Hvf_Corpus.PLOT_NOT_GENERATED
 
-            if icon_type == Hvf_Plot_Array.PLOT_PERC:
-                cell_object = Hvf_Perc_Icon.get_perc_icon_from_char(data_point)
+        list_of_hvf_objs = []
 
-            x = int(i % 10)
-            y = int(i / 10)
+        for row, row_plot_grids in zip(list_of_rows, plot_grids):
 
-            plot_array[x, y] = cell_object
+            file_name = row[file_name_index]
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Reading data for {file_name}")
 
-        if is_blank and plot_type == Hvf_Plot_Array.PLOT_PATTERN_DEV:
-            plot_array = Hvf_Plot_Array.NO_PATTERN_DETECT
+            # Clean up metadata:
+            metadata = {key: row[index].replace('"', "").strip() for key, index in metadata_columns}
 
-        plot_array_obj = Hvf_Plot_Array(plot_type, icon_type, plot_array, None)
+            list_of_hvf_objs.append((file_name, Hvf_Corpus.get_hvf_object_from_plot_grids(metadata, row_plot_grids)))
 
-        return line, plot_array_obj
+        return list_of_hvf_objs
 
     ###############################################################################
-    # Given a dict of file_name->hvf objects, creates a delimited string containing
-    # all the data (for export to a spreadsheet file). Delimiter specified in the
-    # class code.
+    # Given an iterable of spreadsheet lines (header line first), yields
+    # (file_name, hvf_obj) pairs in line order. Lines are decoded in chunks of
+    # IMPORT_CHUNK_SIZE, so only one chunk needs to be in memory at a time. Blank
+    # lines are skipped
 
-    # Given an exported spreadsheet (delimited string), creates a dict of
-    # file_name->hvf objects. Inverse function of export.
+    def import_hvf_list_from_lines(iterable_of_lines):
 
-    def import_hvf_list_from_spreadsheet(delimited_string):
+        column_layout = None
+        list_of_rows = []
 
-        return_dict = {}
+        for line in iterable_of_lines:
 
-        # We will assume the spreadsheet is of correct format - no error checking
-        # This means: columns are of correct names (corresponding to metadata, etc)
+            line = line.rstrip("\n")
 
-        # We assume first line is column header, followed by lines of data
-        # First, slurp in entire string into a list of dictionaries to we can
-        # process each one by one
+            if not line:
+                continue
 
-        list_of_lines = Hvf_Export.slurp_string_to_dict_list(delimited_string)
+            row = line.split(Hvf_Export.CELL_DELIMITER)
 
-        # Now, process each one by one:
+            # We assume first line is column header, followed by lines of data
+            if column_layout is None:
+                column_layout = Hvf_Export.get_import_column_layout(row)
+                continue
 
-        for line in list_of_lines:
+            list_of_rows.append(row)
 
-            file_name = line.pop("file_name")
-            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Reading data for {file_name}")
+            if len(list_of_rows) == Hvf_Export.IMPORT_CHUNK_SIZE:
+                yield from Hvf_Export.get_hvf_objs_from_rows(list_of_rows, column_layout)
+                list_of_rows = []
+
+        if list_of_rows:
+            yield from Hvf_Export.get_hvf_objs_from_rows(list_of_rows, column_layout)
+
+    ###############################################################################
+    # Given an open file handle of an exported spreadsheet, yields
+    # (file_name, hvf_obj) pairs in row order, reading the file line by line (so
+    # memory stays bounded regardless of the file size)
 
-            hvf_obj = Hvf_Export.get_hvf_object_from_line(line)
+    def import_hvf_list_from_file_handle(fh):
 
-            return_dict[file_name] = hvf_obj
+        yield from Hvf_Export.import_hvf_list_from_lines(fh)
 
-        return return_dict
+    ###############################################################################
+    # Given an exported spreadsheet (delimited string), creates a dict of
+    # file_name->hvf objects. Inverse function of export.
+
+    def import_hvf_list_from_spreadsheet(delimited_string):
+
+        # We will assume the spreadsheet is of correct format - no error checking
+        # This means: columns are of correct names (corresponding to metadata, etc)
+        return dict(Hvf_Export.import_hvf_list_from_lines(delimited_string.split("\n")))
@@ -0,0 +1,157 @@
+###############################################################################
+# hvf_manifest.py
+#
+# Description:
+# 	Class definition for a processing manifest, used to make bulk serialization
+# 	runs resumable. The manifest is an append-only JSONL file kept in the output
+# 	directory; each line records one processed input file:
+#
+# 		{"path": ..., "size": ..., "mtime": ..., "hash": ..., "status": ...,
+# 		 "elapsed_ms": ...}
+#
+# 	Later lines for the same path supersede earlier ones. Since the file is only
+# 	ever appended to (and flushed per line), an interrupted run loses at most
+# 	the line being written.
+#
+# 	Input files are only re-hashed if their size or mtime differ from their
+# 	latest record, so a rerun over unchanged inputs does not read them.
+#
+# 	Usage:
+# 		manifest = Hvf_Manifest(save_dir)
+# 		file_record = manifest.get_file_record(input_path)
+# 		if not manifest.is_completed(file_record, output_path):
+# 			< process file >
+# 			manifest.add_record(file_record, Hvf_Manifest.STATUS_SUCCESS, elapsed_ms)
+#
+###############################################################################
+
+# Import necessary packages
+import json
+import os
+
+# Import general purpose utilities
+from hvf_extraction_script.utilities.file_utils import File_Utils
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Hvf_Manifest:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    MANIFEST_FILE_NAME = "manifest.jsonl"
+
+    # Record field labels
+    KEYLABEL_PATH = "path"
+    KEYLABEL_SIZE = "size"
+    KEYLABEL_MTIME = "mtime"
+    KEYLABEL_HASH = "hash"
+    KEYLABEL_STATUS = "status"
+    KEYLABEL_ELAPSED = "elapsed_ms"
+
+    # Record statuses
+    STATUS_SUCCESS = "success"
+    STATUS_FAILURE = "failure"
+
+    ###############################################################################
+    # CONSTRUCTOR AND FACTORY METHODS #############################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer method
+    # Given the output directory, loads any existing manifest within it
+    def __init__(self, save_dir):
+
+        self.manifest_path = os.path.join(save_dir, Hvf_Manifest.MANIFEST_FILE_NAME)
+
+        # Latest record per input path
+        self.records = {}
+
+        if os.path.isfile(self.manifest_path):
+            self.load_manifest()
+
+    ###############################################################################
+    # Reads existing manifest file into memory. Skips unparseable lines (eg, a
+    # partially written last line from an interrupted run)
+    def load_manifest(self):
+
+        with open(self.manifest_path) as f:
+            for line in f:
+
+                try:
+                    record = json.loads(line)
+                    self.records[record[Hvf_Manifest.KEYLABEL_PATH]] = record
+
+                except (ValueError, KeyError):
+                    Logger.get_logger().log_msg(Logger.DEBUG_FLAG_WARNING, "Skipping malformed manifest line")
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM, f"Loaded manifest with {len(self.records)} records: {self.manifest_path}"
+        )
+
+    ###############################################################################
+    # MANIFEST METHODS ############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given an input file path, returns a record dict describing its current state
+    # (path, size, mtime, content hash). The content hash is taken from the latest
+    # record for the path if its size and mtime are unchanged, otherwise the file
+    # is hashed
+    def get_file_record(self, file_path):
+
+        file_stat = os.stat(file_path)
+
+        file_record = {
+            Hvf_Manifest.KEYLABEL_PATH: os.path.abspath(file_path),
+            Hvf_Manifest.KEYLABEL_SIZE: file_stat.st_size,
+            Hvf_Manifest.KEYLABEL_MTIME: file_stat.st_mtime,
+        }
+
+        prev_record = self.records.get(file_record[Hvf_Manifest.KEYLABEL_PATH], {})
+
+        if (
+            prev_record.get(Hvf_Manifest.KEYLABEL_SIZE) == file_record[Hvf_Manifest.KEYLABEL_SIZE]
+            and prev_record.get(Hvf_Manifest.KEYLABEL_MTIME) == file_record[Hvf_Manifest.KEYLABEL_MTIME]
+            and prev_record.get(Hvf_Manifest.KEYLABEL_HASH) is not None
+        ):
+            file_record[Hvf_Manifest.KEYLABEL_HASH] = prev_record[Hvf_Manifest.KEYLABEL_HASH]
+        else:
+            file_record[Hvf_Manifest.KEYLABEL_HASH] = File_Utils.get_file_hash(file_path)
+
+        return file_record
+
+    ###############################################################################
+    # Given a file record (from get_file_record) and the expected output path,
+    # returns True if the file was successfully processed before, the input content
+    # hash is unchanged, and the output is still present
+    def is_completed(self, file_record, output_path):
+
+        prev_record = self.records.get(file_record[Hvf_Manifest.KEYLABEL_PATH])
+
+        if prev_record is None:
+            return False
+
+        if not (prev_record.get(Hvf_Manifest.KEYLABEL_STATUS) == Hvf_Manifest.STATUS_SUCCESS):
+            return False
+
+        if not (prev_record.get(Hvf_Manifest.KEYLABEL_HASH) == file_record[Hvf_Manifest.KEYLABEL_HASH]):
+            return False
+
+        return os.path.isfile(output_path)
+
+    ###############################################################################
+    # Given a file record, status and elapsed time, appends a line to the manifest
+    # file. Flushed immediately so the record survives an interruption
+    def add_record(self, file_record, status, elapsed_ms):
+
+        record = dict(file_record)
+        record[Hvf_Manifest.KEYLABEL_STATUS] = status
+        record[Hvf_Manifest.KEYLABEL_ELAPSED] = elapsed_ms
+
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+        self.records[record[Hvf_Manifest.KEYLABEL_PATH]] = record
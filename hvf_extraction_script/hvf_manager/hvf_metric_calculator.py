@@ -9,6 +9,11 @@
 # 	converted (masked) into 24-2. This function will produce erroneous metrics
 # 	for 10-2.
 #
+# 	Batch metric functions compute all metrics for a stack of exams (plot tensor
+# 	of shape (N, 5, 10, 10), as in Hvf_Corpus) with array operations, and return
+# 	a metrics table (see get_metrics_table). Single exam regional/VFI/AGIS
+# 	functions are computed through these.
+#
 ###############################################################################
 
 # Import necessary packages
@@ -19,9 +24,11 @@ import numpy as np
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
 from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
 from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
+from hvf_extraction_script.hvf_data.hvf_plot_cells import Hvf_Plot_Cells
 from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
 
 # Import HVF data managers:
+from hvf_extraction_script.hvf_manager.hvf_corpus import Hvf_Corpus
 from hvf_extraction_script.hvf_manager.hvf_editor import Hvf_Editor
 
 # Import logger class to handle any messages:
@@ -80,27 +87,126 @@ class Hvf_Metric_Calculator:
         Hvf_Perc_Icon.PERC_HALF_PERCENTILE: 4,
     }
 
+    CIGTS_MAX_DEPTH = 4
+
+    # Lookup table of percentile icon enum -> CIGTS depth score (0 for normal and
+    # for non-icons, eg no value/failure):
+    CIGTS_DEPTH_LUT = np.zeros(Hvf_Perc_Icon.PERC_FAILURE + 1, dtype=np.int8)
+    CIGTS_DEPTH_LUT[list(CIGTS_ICON_SCORE.keys())] = list(CIGTS_ICON_SCORE.values())
+
+    # Neighbours are only counted within the same hemifield - rows (y) before this
+    # are superior, from this on are inferior:
+    CIGTS_MERIDIAN_ROW = 5
+
+    # Normalization for global CIGTS scores:
+    CIGTS_NORMALIZATION = 10.4
+
+    ###############################################################################
+    # BATCH METRIC CONSTANTS:
+
+    # Region of each point, as a grid indexed [x, y] (right eye format, as in
+    # REGION_NUMERICAL_MASK); -1 for points not in any region:
+    REGION_GRID = np.array([[-1 if region == "x" else region for region in row] for row in REGION_NUMERICAL_MASK]).T
+
+    # 24-2 test points (blind spot excluded), as a grid indexed [x, y] (right eye
+    # format):
+    MASK_24_2_GRID = np.array(Hvf_Plot_Array.BOOLEAN_MASK_24_2, dtype=bool).T
+
+    # Superior hemifield points, as a grid indexed [x, y]:
+    SUPERIOR_GRID = np.broadcast_to(np.arange(10)[np.newaxis, :] < CIGTS_MERIDIAN_ROW, (10, 10))
+
+    # Eccentricity (degrees) of each point - 24-2/30-2 points are 6 degrees apart,
+    # starting at -27:
+    ECCENTRICITY_GRID = np.hypot(np.arange(-27, 28, 6)[:, np.newaxis], np.arange(-27, 28, 6)[np.newaxis, :])
+
+    # Eccentricity ring of each point (ring 0 within 6 degrees, ring 4 beyond 24):
+    NUMBER_RINGS = 5
+    RING_GRID = np.minimum(ECCENTRICITY_GRID // 6, NUMBER_RINGS - 1).astype(int)
+
+    # VFI (Bengtsson and Heijl, 2008) - weight of points in each eccentricity ring:
+    VFI_RING_WEIGHTS = np.array([3.29, 1.28, 0.79, 0.57, 0.45])
+
+    # MD (dB) below which total deviation probabilities are used instead of
+    # pattern deviation probabilities:
+    VFI_MD_THRESHOLD = -20
+
+    # AGIS (simplified - scored from the total deviation value plot, with nasal
+    # points taken as the nasal regions):
+    # Depression (dB) at which a point is defective, by eccentricity ring:
+    AGIS_DEFECT_DB_BY_RING = np.array([5, 6, 7, 8, 9])
+
+    AGIS_NASAL_REGIONS = [8, 9]
+
+    # Nasal defect: defective points needed in one nasal region (1 point), then
+    # number of nasal points needed at depression AGIS_NASAL_DEEP_DB (1 more point)
+    AGIS_NASAL_MIN_DEFECTS = 3
+    AGIS_NASAL_MIN_DEEP = 4
+    AGIS_NASAL_DEEP_DB = 12
+
+    # Hemifield defect (other points) - clustered defective points (ie, with a
+    # defective neighbour) needed for 1-4 points:
+    AGIS_CLUSTER_SIZE_BINS = [3, 6, 13, 21]
+
+    # Depressions (dB) reached by at least half of the clustered points for 1-5
+    # more points:
+    AGIS_CLUSTER_DEPTH_DB = [12, 16, 20, 24, 28]
+
+    # Numeric grid codes for values that are not measurements:
+    NON_VALUE_CODES = [
+        Hvf_Value.VALUE_NO_VALUE,
+        Hvf_Value.VALUE_FAILURE,
+        Hvf_Value.VALUE_BELOW_THRESHOLD,
+        Hvf_Corpus.PLOT_NOT_GENERATED,
+        Hvf_Corpus.PLOT_MISSING,
+    ]
+
+    # Metrics table columns:
+    METRIC_VFI = "vfi"
+    METRIC_CIGTS_TDP = "cigts_tdp"
+    METRIC_CIGTS_PDP = "cigts_pdp"
+    METRIC_AGIS = "agis"
+    METRIC_AGIS_NASAL = "agis_nasal"
+    METRIC_AGIS_SUPERIOR = "agis_superior"
+    METRIC_AGIS_INFERIOR = "agis_inferior"
+
+    # Regional metric column prefixes (followed by region number):
+    METRIC_REGION_TD = "td_region_"
+    METRIC_REGION_PD = "pd_region_"
+    METRIC_REGION_CIGTS_TDP = "cigts_tdp_region_"
+    METRIC_REGION_CIGTS_PDP = "cigts_pdp_region_"
+
+    # Number of exams processed at a time by get_metrics_table:
+    METRICS_CHUNK_SIZE = 4096
+
     ###############################################################################
     # SIMPLE METRIC FUNCTIONS #####################################################
     ###############################################################################
 
     ###############################################################################
-    # Calculates VFI score
+    # Calculates VFI score (percentage; NaN if no points could be scored)
     def get_vfi_score(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return float(exam_metrics[Hvf_Metric_Calculator.METRIC_VFI])
 
     ###############################################################################
-    # Calculates regional total deviation score
+    # Calculates regional total deviation score - array of mean total deviation in
+    # each region (see REGION_NUMERICAL_MASK)
     def get_regional_total_deviation(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return Hvf_Metric_Calculator.get_regional_metric(exam_metrics, Hvf_Metric_Calculator.METRIC_REGION_TD)
 
     ###############################################################################
-    # Calculates regional pattern deviation score
+    # Calculates regional pattern deviation score - array of mean pattern deviation
+    # in each region (NaN if pattern deviation not generated)
     def get_regional_pattern_deviation(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return Hvf_Metric_Calculator.get_regional_metric(exam_metrics, Hvf_Metric_Calculator.METRIC_REGION_PD)
 
     ###############################################################################
     # CIGTS METRIC FUNCTIONS ######################################################
@@ -131,7 +237,7 @@ class Hvf_Metric_Calculator:
 
         cigts_score_array = Hvf_Metric_Calculator.calculate_cigts_score_array(perc_array)
 
-        return int(np.sum(cigts_score_array) / 10.4)
+        return int(np.sum(cigts_score_array) / Hvf_Metric_Calculator.CIGTS_NORMALIZATION)
 
     ###############################################################################
     # Calculates global CIGTS PDP score
@@ -154,132 +260,489 @@ class Hvf_Metric_Calculator:
 
         cigts_score_array = Hvf_Metric_Calculator.calculate_cigts_score_array(perc_array)
 
-        return int(np.sum(cigts_score_array) / 10.4)
+        return int(np.sum(cigts_score_array) / Hvf_Metric_Calculator.CIGTS_NORMALIZATION)
 
     ###############################################################################
-    # Calculates regional CIGTS TDP score
+    # Calculates regional CIGTS TDP score - array of summed CIGTS scores in each
+    # region
     def get_regional_cigts_tdp_score(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return Hvf_Metric_Calculator.get_regional_metric(exam_metrics, Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP)
 
     ###############################################################################
-    # Calculates regional CIGTS PDP score
+    # Calculates regional CIGTS PDP score - array of summed CIGTS scores in each
+    # region (NaN if pattern deviation not generated)
     def get_regional_cigts_pdp_score(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return Hvf_Metric_Calculator.get_regional_metric(exam_metrics, Hvf_Metric_Calculator.METRIC_REGION_CIGTS_PDP)
 
     ###############################################################################
-    # Helper function - calculates CIGTS score for input percentile array
+    # Helper function - calculates CIGTS score for input percentile array (array of
+    # percentile icons, or plot cells)
     # NOTE: calculates raw scores in array layout (10x10), to be summed by
     # calling function
     def calculate_cigts_score_array(perc_array):
 
-        cigts_score = 0
-        cigts_score_array = np.zeros(np.shape(perc_array))
+        perc_grid = Hvf_Metric_Calculator.get_perc_enum_grid(perc_array)
 
-        # Iterate through entire array:
-        for y in range(0, np.size(perc_array, 0)):
-            for x in range(0, np.size(perc_array, 1)):
+        return Hvf_Metric_Calculator.calculate_cigts_score_arrays(perc_grid[np.newaxis])[0]
 
-                # Grab the icon:
-                element = perc_array[x, y].get_enum()
-
-                # Move on if element is not a true icon, or if its normal
-                if (element == Hvf_Perc_Icon.PERC_NORMAL) or element not in Hvf_Metric_Calculator.CIGTS_ICON_SCORE.keys():
-                    continue
-
-                # Initialize counts of surrounding icons:
-                icon_counter_dict = {
-                    Hvf_Perc_Icon.PERC_NORMAL: 0,
-                    Hvf_Perc_Icon.PERC_5_PERCENTILE: 0,
-                    Hvf_Perc_Icon.PERC_2_PERCENTILE: 0,
-                    Hvf_Perc_Icon.PERC_1_PERCENTILE: 0,
-                    Hvf_Perc_Icon.PERC_HALF_PERCENTILE: 0,
-                }
-
-                # Iterate through all surrounding icons
-                # We'll also iterate through icon itself, as its easier (delete it later)
-                for jj in range(y - 1, y + 2):
-                    for ii in range(x - 1, x + 2):
-
-                        # Move on if out of bounds:
-                        if (jj < 0 or jj >= np.size(perc_array, 0)) or (ii < 0 or ii >= np.size(perc_array, 1)):
-                            continue
-
-                        # Get adjacent element enum:
-                        adj_element_enum = perc_array[ii, jj].get_enum()
-
-                        # Move on if adjacent icon is not a true icon:
-                        if adj_element_enum not in Hvf_Metric_Calculator.CIGTS_ICON_SCORE.keys():
-                            continue
-
-                        # Skip if not in same vertical hemisphere:
-                        if ((y == 4) and (jj == 5)) or ((y == 5) and (jj == 4)):
-                            continue
-
-                        # Add icon count:
-                        icon_counter_dict[adj_element_enum] = icon_counter_dict[adj_element_enum] + 1
-
-                # Lastly, loop above counted cell of interest, so need to remove:
-                icon_counter_dict[element] = icon_counter_dict[element] - 1
-
-                # Determine max adjacent depth (with count 2+):
-                max_adjacent_depth = Hvf_Perc_Icon.PERC_NORMAL
-
-                for icon in icon_counter_dict.keys():
-                    if (icon_counter_dict[icon] >= 2) and (
-                        Hvf_Metric_Calculator.CIGTS_ICON_SCORE[icon]
-                        > Hvf_Metric_Calculator.CIGTS_ICON_SCORE[max_adjacent_depth]
-                    ):
-                        max_adjacent_depth = icon
-
-                # Now, taken the minimum between the adjacent icon score and the element score:
-                element_cigts_score = min(
-                    Hvf_Metric_Calculator.CIGTS_ICON_SCORE[element],
-                    Hvf_Metric_Calculator.CIGTS_ICON_SCORE[max_adjacent_depth],
-                )
-                cigts_score = cigts_score + element_cigts_score
-                cigts_score_array[x, y] = element_cigts_score
-
-        # Now, normalize the score:
-        cigts_score = int(cigts_score / 10.4)
-
-        # for y in range(0, np.size(cigts_score_array, 0)):
-        # 	line_string = "";
-        # 	for x in range(0, np.size(cigts_score_array, 1)):
-        #
-        # 		element = int(cigts_score_array[x, y])
-        #
-        # 		if (element == 0):
-        # 			element = "  ";
-        # 		elif (element == -1):
-        # 			element = str(element);
-        # 		else:
-        # 			element = " "+str(element)
-        #
-        # 		line_string = line_string + element + "|"
-        #
-        # 	print(line_string);
-
-        # Return array (calling function will sum up as needed)
-        return cigts_score_array
+    ###############################################################################
+    # Batch version of calculate_cigts_score_array - given a stack of percentile
+    # enum grids (array of shape (N, 10, 10), indexed [exam, x, y]), returns the
+    # stack of CIGTS score arrays
+    #
+    # Each abnormal point scores the lesser of its own depth and the deepest depth
+    # shared by at least 2 of its neighbours (within the same hemifield)
+    def calculate_cigts_score_arrays(perc_grids):
+
+        depth_grids = Hvf_Metric_Calculator.CIGTS_DEPTH_LUT[np.asarray(perc_grids)]
+
+        # Deepest neighbouring depth with count 2+ (0 if none):
+        max_adjacent_depth = np.zeros(depth_grids.shape, dtype=np.int8)
+
+        for depth in range(1, Hvf_Metric_Calculator.CIGTS_MAX_DEPTH + 1):
+            neighbour_counts = Hvf_Metric_Calculator.count_hemifield_neighbours(depth_grids == depth)
+            max_adjacent_depth[neighbour_counts >= 2] = depth
+
+        return np.minimum(depth_grids, max_adjacent_depth)
+
+    ###############################################################################
+    # Given a stack of CIGTS score arrays (see calculate_cigts_score_arrays),
+    # returns the global CIGTS scores
+    def get_global_cigts_scores(cigts_score_arrays):
+
+        cigts_score_sums = np.sum(cigts_score_arrays, axis=(-2, -1))
+
+        return (cigts_score_sums / Hvf_Metric_Calculator.CIGTS_NORMALIZATION).astype(int)
+
+    ###############################################################################
+    # Helper function - given a boolean mask stack (shape (N, 10, 10), indexed
+    # [exam, x, y]), returns the count of set neighbours (of the 8 surrounding
+    # points) for each point. Points across the horizontal meridian are not
+    # neighbours
+    def count_hemifield_neighbours(mask):
+
+        mask = np.asarray(mask, dtype=np.int8)
+        neighbour_counts = np.zeros(mask.shape, dtype=np.int8)
+
+        meridian = Hvf_Metric_Calculator.CIGTS_MERIDIAN_ROW
+
+        for hemifield in [slice(0, meridian), slice(meridian, None)]:
+            hemifield_mask = mask[..., hemifield]
+
+            # 3x3 box sum (as separable sums of shifted arrays), less the point itself:
+            padded = np.pad(hemifield_mask, [(0, 0)] * (mask.ndim - 2) + [(1, 1), (1, 1)])
+            row_sums = padded[..., :-2, :] + padded[..., 1:-1, :] + padded[..., 2:, :]
+            box_sums = row_sums[..., :-2] + row_sums[..., 1:-1] + row_sums[..., 2:]
+
+            neighbour_counts[..., hemifield] = box_sums - hemifield_mask
+
+        return neighbour_counts
+
+    ###############################################################################
+    # Helper function - given a percentile array (array of percentile icons, or
+    # plot cells), returns it as a grid of percentile enums
+    def get_perc_enum_grid(perc_array):
+
+        if isinstance(perc_array, Hvf_Plot_Cells):
+            return perc_array.get_numeric_grid()
+
+        perc_array = np.asarray(perc_array)
+        perc_grid = np.zeros(np.shape(perc_array), dtype=np.uint8)
+
+        for x in range(0, np.size(perc_array, 0)):
+            for y in range(0, np.size(perc_array, 1)):
+                perc_grid[x, y] = perc_array[x, y].get_enum()
+
+        return perc_grid
 
     ###############################################################################
     # AGIS METRIC FUNCTIONS #######################################################
     ###############################################################################
 
     ###############################################################################
-    # Calculates global AGIS score
+    # Calculates global AGIS score (0-20; see AGIS constants)
     def get_global_agis_score(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
 
-        ###############################################################################
-        # Calculates regional AGIS score
+        return int(exam_metrics[Hvf_Metric_Calculator.METRIC_AGIS])
 
+    ###############################################################################
+    # Calculates regional AGIS score - array of nasal (0-2), superior hemifield
+    # (0-9) and inferior hemifield (0-9) scores
     def get_regional_agis_score(hvf_obj):
 
-        return 0
+        exam_metrics = Hvf_Metric_Calculator.get_exam_metrics(hvf_obj)
+
+        return np.array(
+            [
+                int(exam_metrics[Hvf_Metric_Calculator.METRIC_AGIS_NASAL]),
+                int(exam_metrics[Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR]),
+                int(exam_metrics[Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR]),
+            ]
+        )
+
+    ###############################################################################
+    # BATCH METRIC FUNCTIONS ######################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a stack of exam plots (array of shape (N, 5, 10, 10), as in
+    # Hvf_Corpus.get_plot_tensor) and list of each exam's metadata, returns the
+    # metrics table - dictionary of column name (see get_metrics_table_header) ->
+    # array of N values. Values are NaN where not applicable (eg, pattern metrics
+    # when pattern plots were not generated)
+    # Exams are processed METRICS_CHUNK_SIZE at a time, so a memory mapped plot
+    # tensor is never read into memory all at once
+    def get_metrics_table(plot_tensor, list_of_metadata):
+
+        header_list = Hvf_Metric_Calculator.get_metrics_table_header()
+        list_of_chunk_tables = []
+
+        for chunk_start in range(0, len(list_of_metadata), Hvf_Metric_Calculator.METRICS_CHUNK_SIZE):
+            chunk_end = chunk_start + Hvf_Metric_Calculator.METRICS_CHUNK_SIZE
+
+            list_of_chunk_tables.append(
+                Hvf_Metric_Calculator.get_chunk_metrics_table(
+                    np.asarray(plot_tensor[chunk_start:chunk_end]), list_of_metadata[chunk_start:chunk_end]
+                )
+            )
+
+        if not list_of_chunk_tables:
+            return {column: np.zeros(0) for column in header_list}
+
+        return {column: np.concatenate([table[column] for table in list_of_chunk_tables]) for column in header_list}
+
+    ###############################################################################
+    # Returns list of metrics table column names
+    def get_metrics_table_header():
+
+        header_list = [
+            Hvf_Metric_Calculator.METRIC_VFI,
+            Hvf_Metric_Calculator.METRIC_CIGTS_TDP,
+            Hvf_Metric_Calculator.METRIC_CIGTS_PDP,
+            Hvf_Metric_Calculator.METRIC_AGIS,
+            Hvf_Metric_Calculator.METRIC_AGIS_NASAL,
+            Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR,
+            Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR,
+        ]
+
+        for prefix in [
+            Hvf_Metric_Calculator.METRIC_REGION_TD,
+            Hvf_Metric_Calculator.METRIC_REGION_PD,
+            Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP,
+            Hvf_Metric_Calculator.METRIC_REGION_CIGTS_PDP,
+        ]:
+            header_list = header_list + [prefix + str(region) for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS)]
+
+        return header_list
+
+    ###############################################################################
+    # Given list of file names and the corresponding metrics table, generates the
+    # lines of a delimited metrics spreadsheet (header line first). NaN values are
+    # left blank
+    def get_metrics_table_lines(list_of_file_names, metrics_table, delimiter):
+
+        header_list = Hvf_Metric_Calculator.get_metrics_table_header()
+
+        yield delimiter.join(["file_name"] + header_list)
+
+        list_of_columns = [metrics_table[column] for column in header_list]
+
+        for ii, file_name in enumerate(list_of_file_names):
+            list_of_cells = [
+                "" if np.isnan(column[ii]) else f"{round(float(column[ii]), 2):g}" for column in list_of_columns
+            ]
+
+            yield delimiter.join([file_name] + list_of_cells)
+
+    ###############################################################################
+    # Given an HVF object, returns dictionary of its metrics (as in a metrics table
+    # row)
+    def get_exam_metrics(hvf_obj):
+
+        metrics_table = Hvf_Metric_Calculator.get_metrics_table(
+            Hvf_Corpus.get_plot_grids(hvf_obj)[np.newaxis], [hvf_obj.metadata]
+        )
+
+        return {column: values[0] for column, values in metrics_table.items()}
+
+    ###############################################################################
+    # Given a metrics table row (see get_exam_metrics) and regional column prefix,
+    # returns array of that metric for each region
+    def get_regional_metric(exam_metrics, prefix):
+
+        return np.array([exam_metrics[prefix + str(region)] for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS)])
+
+    ###############################################################################
+    # Computes the metrics table for a chunk of exams (see get_metrics_table)
+    def get_chunk_metrics_table(plot_grids, list_of_metadata):
+
+        num_exams = len(list_of_metadata)
+
+        is_right = np.array(
+            [metadata.get(Hvf_Object.KEYLABEL_LATERALITY) == Hvf_Object.HVF_OD for metadata in list_of_metadata],
+            dtype=bool,
+        )
+        md = np.array(
+            [
+                Hvf_Metric_Calculator.get_metadata_float(metadata, Hvf_Object.KEYLABEL_MD)
+                for metadata in list_of_metadata
+            ]
+        )
+
+        # Plots that are not generated/missing (before masking):
+        is_plot_present = ~np.all(
+            np.isin(plot_grids, [Hvf_Corpus.PLOT_NOT_GENERATED, Hvf_Corpus.PLOT_MISSING]), axis=(2, 3)
+        )
+
+        plot_grids = Hvf_Metric_Calculator.get_right_eye_24_2_grids(plot_grids, is_right)
+
+        raw_grids = plot_grids[:, Hvf_Corpus.PLOT_RAW]
+        tdv_grids = plot_grids[:, Hvf_Corpus.PLOT_TDV]
+        tdp_grids = plot_grids[:, Hvf_Corpus.PLOT_TDP]
+        pdv_grids = plot_grids[:, Hvf_Corpus.PLOT_PDV]
+        pdp_grids = plot_grids[:, Hvf_Corpus.PLOT_PDP]
+
+        metrics_table = {}
+
+        # VFI - use total deviation probabilities if MD is too low (or pattern
+        # deviation is not available):
+        is_tdp_for_vfi = (md < Hvf_Metric_Calculator.VFI_MD_THRESHOLD) | ~is_plot_present[:, Hvf_Corpus.PLOT_PDP]
+        prob_grids = np.where(is_tdp_for_vfi[:, np.newaxis, np.newaxis], tdp_grids, pdp_grids)
+
+        metrics_table[Hvf_Metric_Calculator.METRIC_VFI] = Hvf_Metric_Calculator.get_vfi_scores(
+            raw_grids, tdv_grids, prob_grids
+        )
+
+        # CIGTS:
+        tdp_cigts_arrays = Hvf_Metric_Calculator.calculate_cigts_score_arrays(tdp_grids)
+        pdp_cigts_arrays = Hvf_Metric_Calculator.calculate_cigts_score_arrays(pdp_grids)
+
+        metrics_table[Hvf_Metric_Calculator.METRIC_CIGTS_TDP] = Hvf_Metric_Calculator.get_global_cigts_scores(
+            tdp_cigts_arrays
+        ).astype(float)
+        metrics_table[Hvf_Metric_Calculator.METRIC_CIGTS_PDP] = Hvf_Metric_Calculator.get_global_cigts_scores(
+            pdp_cigts_arrays
+        ).astype(float)
+
+        # AGIS:
+        nasal_scores, superior_scores, inferior_scores = Hvf_Metric_Calculator.get_agis_scores(tdv_grids)
+
+        agis_scores = nasal_scores + superior_scores + inferior_scores
+
+        metrics_table[Hvf_Metric_Calculator.METRIC_AGIS] = agis_scores.astype(float)
+        metrics_table[Hvf_Metric_Calculator.METRIC_AGIS_NASAL] = nasal_scores.astype(float)
+        metrics_table[Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR] = superior_scores.astype(float)
+        metrics_table[Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR] = inferior_scores.astype(float)
+
+        # Regional metrics:
+        for prefix, regional_values in [
+            (Hvf_Metric_Calculator.METRIC_REGION_TD, Hvf_Metric_Calculator.get_regional_means(tdv_grids)),
+            (Hvf_Metric_Calculator.METRIC_REGION_PD, Hvf_Metric_Calculator.get_regional_means(pdv_grids)),
+            (Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP, Hvf_Metric_Calculator.get_regional_sums(tdp_cigts_arrays)),
+            (Hvf_Metric_Calculator.METRIC_REGION_CIGTS_PDP, Hvf_Metric_Calculator.get_regional_sums(pdp_cigts_arrays)),
+        ]:
+            for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+                metrics_table[prefix + str(region)] = regional_values[:, region]
+
+        # Metrics from absent plots are not applicable:
+        # (regional TD/PD are already NaN, having no values)
+        list_of_region_numbers = [str(region) for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS)]
+
+        for plot_index, list_of_columns in [
+            (
+                Hvf_Corpus.PLOT_TDV,
+                [
+                    Hvf_Metric_Calculator.METRIC_AGIS,
+                    Hvf_Metric_Calculator.METRIC_AGIS_NASAL,
+                    Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR,
+                    Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR,
+                ],
+            ),
+            (
+                Hvf_Corpus.PLOT_TDP,
+                [Hvf_Metric_Calculator.METRIC_CIGTS_TDP]
+                + [Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP + region for region in list_of_region_numbers],
+            ),
+            (
+                Hvf_Corpus.PLOT_PDP,
+                [Hvf_Metric_Calculator.METRIC_CIGTS_PDP]
+                + [Hvf_Metric_Calculator.METRIC_REGION_CIGTS_PDP + region for region in list_of_region_numbers],
+            ),
+        ]:
+            for column in list_of_columns:
+                metrics_table[column][~is_plot_present[:, plot_index]] = np.nan
+
+        return metrics_table
+
+    ###############################################################################
+    # Given a stack of exam plots (array of shape (N, 5, 10, 10)) and array of
+    # whether each is a right eye, returns copy of the plots in right eye format
+    # (left eyes mirrored), with points outside the 24-2 field (and absent plots)
+    # set to no value
+    def get_right_eye_24_2_grids(plot_grids, is_right):
+
+        plot_grids = plot_grids.copy()
+        plot_grids[~is_right] = plot_grids[~is_right][:, :, ::-1, :]
+
+        is_outside = ~Hvf_Metric_Calculator.MASK_24_2_GRID
+
+        for plot_index, (plot_type, icon_type, attribute) in enumerate(Hvf_Corpus.PLOT_LAYOUT):
+            grids = plot_grids[:, plot_index]
+
+            if icon_type == Hvf_Plot_Array.PLOT_PERC:
+                grids[(grids < 0) | is_outside] = Hvf_Perc_Icon.PERC_NO_VALUE
+            else:
+                grids[np.isin(grids, [Hvf_Corpus.PLOT_NOT_GENERATED, Hvf_Corpus.PLOT_MISSING]) | is_outside] = (
+                    Hvf_Value.VALUE_NO_VALUE
+                )
+
+        return plot_grids
+
+    ###############################################################################
+    # Given stacks of raw value, total deviation value and (total or pattern
+    # deviation) percentile grids, in right eye format, returns array of VFI scores.
+    # Points not significantly depressed score 100%; others score their
+    # sensitivity as a percentage of the age-normal sensitivity (raw value less
+    # total deviation). Scores are weighted by eccentricity
+    def get_vfi_scores(raw_grids, tdv_grids, prob_grids):
+
+        # Below threshold points are scored as 0 dB:
+        raw_values = np.where(raw_grids == Hvf_Value.VALUE_BELOW_THRESHOLD, 0, raw_grids).astype(float)
+        normal_values = raw_values - tdv_grids
+
+        is_scored = (
+            Hvf_Metric_Calculator.MASK_24_2_GRID
+            & (Hvf_Metric_Calculator.get_value_mask(raw_grids) | (raw_grids == Hvf_Value.VALUE_BELOW_THRESHOLD))
+            & Hvf_Metric_Calculator.get_value_mask(tdv_grids)
+            & np.isin(prob_grids, list(Hvf_Metric_Calculator.CIGTS_ICON_SCORE.keys()))
+            & (normal_values > 0)
+        )
+
+        is_depressed = Hvf_Metric_Calculator.CIGTS_DEPTH_LUT[prob_grids] > 0
+
+        point_scores = np.where(
+            is_depressed,
+            np.clip(100 * raw_values / np.where(normal_values > 0, normal_values, 1), 0, 100),
+            100,
+        )
+
+        weights = Hvf_Metric_Calculator.VFI_RING_WEIGHTS[Hvf_Metric_Calculator.RING_GRID] * is_scored
+        weight_sums = np.sum(weights, axis=(1, 2))
+
+        return np.divide(
+            np.sum(weights * point_scores, axis=(1, 2)),
+            weight_sums,
+            out=np.full(len(weight_sums), np.nan),
+            where=weight_sums > 0,
+        )
+
+    ###############################################################################
+    # Given a stack of total deviation value grids in right eye format, returns
+    # arrays of AGIS nasal, superior hemifield and inferior hemifield scores
+    def get_agis_scores(tdv_grids):
+
+        is_value = Hvf_Metric_Calculator.get_value_mask(tdv_grids) & Hvf_Metric_Calculator.MASK_24_2_GRID
+
+        # Depression in dB (positive for points below normal):
+        depression = np.where(is_value, -tdv_grids, 0)
+
+        defect_db = Hvf_Metric_Calculator.AGIS_DEFECT_DB_BY_RING[Hvf_Metric_Calculator.RING_GRID]
+        is_defect = is_value & (depression >= defect_db)
+
+        is_nasal = np.isin(Hvf_Metric_Calculator.REGION_GRID, Hvf_Metric_Calculator.AGIS_NASAL_REGIONS)
+        is_superior = Hvf_Metric_Calculator.SUPERIOR_GRID
+
+        # Nasal defect:
+        nasal_defects = is_defect & is_nasal
+        max_nasal_defects = np.maximum(
+            np.sum(nasal_defects & is_superior, axis=(1, 2)), np.sum(nasal_defects & ~is_superior, axis=(1, 2))
+        )
+        num_deep_nasal = np.sum(nasal_defects & (depression >= Hvf_Metric_Calculator.AGIS_NASAL_DEEP_DB), axis=(1, 2))
+
+        is_nasal_defect = max_nasal_defects >= Hvf_Metric_Calculator.AGIS_NASAL_MIN_DEFECTS
+        nasal_scores = is_nasal_defect.astype(int) + (
+            is_nasal_defect & (num_deep_nasal >= Hvf_Metric_Calculator.AGIS_NASAL_MIN_DEEP)
+        ).astype(int)
+
+        # Hemifield defects - defective points with a defective neighbour:
+        hemifield_defects = is_defect & ~is_nasal
+        is_clustered = hemifield_defects & (Hvf_Metric_Calculator.count_hemifield_neighbours(hemifield_defects) >= 1)
+
+        list_of_hemifield_scores = []
+        for is_hemifield in [is_superior, ~is_superior]:
+            clustered = is_clustered & is_hemifield
+            num_clustered = np.sum(clustered, axis=(1, 2))
+
+            hemifield_scores = np.searchsorted(
+                Hvf_Metric_Calculator.AGIS_CLUSTER_SIZE_BINS, num_clustered, side="right"
+            )
+
+            for depth_db in Hvf_Metric_Calculator.AGIS_CLUSTER_DEPTH_DB:
+                num_deep = np.sum(clustered & (depression >= depth_db), axis=(1, 2))
+                hemifield_scores = hemifield_scores + ((hemifield_scores > 0) & (2 * num_deep >= num_clustered))
+
+            list_of_hemifield_scores.append(hemifield_scores)
+
+        superior_scores, inferior_scores = list_of_hemifield_scores
+
+        return nasal_scores, superior_scores, inferior_scores
+
+    ###############################################################################
+    # Given a stack of value grids (right eye format), returns array of shape
+    # (N, NUMBER_REGIONS) of the mean value in each region (NaN if no values)
+    def get_regional_means(value_grids):
+
+        is_value = Hvf_Metric_Calculator.get_value_mask(value_grids)
+
+        region_means = np.full((len(value_grids), Hvf_Metric_Calculator.NUMBER_REGIONS), np.nan)
+
+        for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+            is_in_region = is_value & (Hvf_Metric_Calculator.REGION_GRID == region)
+
+            region_counts = np.sum(is_in_region, axis=(1, 2))
+            region_sums = np.sum(np.where(is_in_region, value_grids, 0), axis=(1, 2))
+
+            np.divide(region_sums, region_counts, out=region_means[:, region], where=region_counts > 0)
+
+        return region_means
+
+    ###############################################################################
+    # Given a stack of score grids (right eye format), returns array of shape
+    # (N, NUMBER_REGIONS) of the summed score in each region
+    def get_regional_sums(score_grids):
+
+        region_sums = np.zeros((len(score_grids), Hvf_Metric_Calculator.NUMBER_REGIONS))
+
+        for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+            is_in_region = Hvf_Metric_Calculator.REGION_GRID == region
+            region_sums[:, region] = np.sum(np.where(is_in_region, score_grids, 0), axis=(1, 2))
+
+        return region_sums
+
+    ###############################################################################
+    # Given a stack of value grids, returns mask of which points are measured values
+    # (ie, not no value, failure, below threshold or absent)
+    def get_value_mask(value_grids):
+
+        return ~np.isin(value_grids, Hvf_Metric_Calculator.NON_VALUE_CODES)
+
+    ###############################################################################
+    # Given a metadata dictionary and key, returns the value as a float (NaN if
+    # missing or not a number)
+    def get_metadata_float(metadata, key):
+
+        try:
+            return float(metadata.get(key))
+        except (TypeError, ValueError):
+            return np.nan
 
     ###############################################################################
     # HELPER METRIC FUNCTIONS #####################################################
@@ -7,11 +7,31 @@
 # 		Patient
 # 			Laterality
 # 				HVF (ordered by date)
+#
+# 	Each patient/laterality keeps a date index - parallel lists of test dates
+# 	(parsed, in sorted order) and date keys - so date range and latest exam
+# 	queries are binary searches. Unparseable test dates sort first (see
+# 	UNKNOWN_DATE), and are only returned by queries without a start date.
+#
+# 	Usage:
+# 		patient_container = Hvf_Patient_Container()
+# 		patient_container.add_hvfs(<iterable of hvf_objs>)
+#
+# 		patient_container.get_hvfs_between_dates(patient_id, laterality, "01/01/2015", "12/31/2019")
+# 		patient_container.get_latest_hvfs(patient_id, laterality, 5)
+#
+# 		# Loads only corpus exams not already in the container from a previous call:
+# 		patient_container.add_hvfs_from_corpus(hvf_corpus)
+#
 ###############################################################################
 
 # Import necessary packages
+from bisect import bisect_left, bisect_right
+from datetime import datetime
 
 # Import logger class to handle any messages:
+from hvf_extraction_script.utilities.logger import Logger
+from hvf_extraction_script.utilities.regex_utils import Regex_Utils
 
 # Import the HVF_Object class:
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
@@ -23,6 +43,9 @@ class Hvf_Patient_Container:
     # VARIABLE/CONSTANT DECLARATIONS: #############################################
     ###############################################################################
 
+    # Sort date for test dates that cannot be parsed:
+    UNKNOWN_DATE = datetime.min
+
     ###############################################################################
     # INIT/OBJECT FUNCTIONS #######################################################
     ###############################################################################
@@ -32,35 +55,108 @@ class Hvf_Patient_Container:
     def __init__(self):
         self.hvf_obj_dict = {}
 
+        # Date index for each patient/laterality - (sorted list of test dates,
+        # list of corresponding date keys):
+        self.date_index_dict = {}
+
+        # Sets of file names of corpus exams loaded into the container, by (patient
+        # id, laterality, date key) (see add_hvfs_from_corpus). Several corpus
+        # exams can share keys (eg, duplicate scans); the container holds the last
+        # one loaded, and all are counted as loaded:
+        self.corpus_file_name_dict = {}
+
     ###############################################################################
     # Add new patient to list:
     def add_hvf(self, hvf_obj):
 
-        # Construct a few parameters of hvf_obj to help organize/sorting:
-        hvf_obj_patient_id = (
-            hvf_obj.metadata.get(Hvf_Object.KEYLABEL_NAME).lower()
-            + " | "
-            + hvf_obj.metadata.get(Hvf_Object.KEYLABEL_ID)
-        )
+        hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key = Hvf_Patient_Container.get_hvf_obj_keys(hvf_obj)
 
-        hvf_obj_laterality = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_LATERALITY)
+        laterality_dict = self.hvf_obj_dict.setdefault(hvf_obj_patient_id, {}).setdefault(hvf_obj_laterality, {})
 
-        hvf_obj_date_key = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_TEST_DATE)
+        # Only new date keys need indexing (existing ones are replaced in place):
+        if hvf_obj_date_key not in laterality_dict:
+            test_dates, date_keys = self.date_index_dict.setdefault((hvf_obj_patient_id, hvf_obj_laterality), ([], []))
+
+            test_date = Hvf_Patient_Container.get_sort_date(hvf_obj_date_key)
+            index = bisect_right(test_dates, test_date)
+
+            test_dates.insert(index, test_date)
+            date_keys.insert(index, hvf_obj_date_key)
+
+        # Lastly, add in HVF object (replacing any corpus exam with the same keys):
+        laterality_dict[hvf_obj_date_key] = hvf_obj
+        self.corpus_file_name_dict.pop((hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key), None)
 
-        # First, is patient present in this container? If its not, add patient in
-        if hvf_obj_patient_id not in self.hvf_obj_dict:
-            self.hvf_obj_dict[hvf_obj_patient_id] = {}
+        return
+
+    ###############################################################################
+    # Add many HVFs at once - affected date indices are re-sorted once, rather than
+    # inserted into one HVF at a time
+    def add_hvfs(self, hvf_obj_iterable):
 
-        # Now, we know patient is present. Is laterality present? If not, add it in
-        if hvf_obj_laterality not in self.hvf_obj_dict[hvf_obj_patient_id]:
-            self.hvf_obj_dict[hvf_obj_patient_id][hvf_obj_laterality] = {}
+        list_of_keyed_hvfs = [
+            (Hvf_Patient_Container.get_hvf_obj_keys(hvf_obj), hvf_obj) for hvf_obj in hvf_obj_iterable
+        ]
 
-        # Lastly, add in HVF object:
+        self.add_keyed_hvfs(list_of_keyed_hvfs)
 
-        self.hvf_obj_dict[hvf_obj_patient_id][hvf_obj_laterality][hvf_obj_date_key] = hvf_obj
+        # Replaces any corpus exams with the same keys:
+        for hvf_obj_keys, hvf_obj in list_of_keyed_hvfs:
+            self.corpus_file_name_dict.pop(hvf_obj_keys, None)
 
         return
 
+    ###############################################################################
+    # Add many HVFs at once, given as a list of ((patient id, laterality, date key),
+    # hvf_obj) tuples (see add_hvfs). Does not update corpus file names
+    def add_keyed_hvfs(self, list_of_keyed_hvfs):
+
+        touched_index_keys = set()
+
+        for (hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key), hvf_obj in list_of_keyed_hvfs:
+
+            self.hvf_obj_dict.setdefault(hvf_obj_patient_id, {}).setdefault(hvf_obj_laterality, {})[
+                hvf_obj_date_key
+            ] = hvf_obj
+
+            touched_index_keys.add((hvf_obj_patient_id, hvf_obj_laterality))
+
+        for index_key in touched_index_keys:
+            self.rebuild_date_index(*index_key)
+
+        return
+
+    ###############################################################################
+    # Add HVFs from an Hvf_Corpus, skipping exams (by file name) already in the
+    # container from previous calls - so as a corpus is regenerated with new exams,
+    # only the new exams' objects are constructed. Exams removed from the container
+    # since are added again. Corpus exams with the same keys (eg, duplicate scans)
+    # are all counted as loaded, though only the last is kept. Returns number of
+    # exams added
+    def add_hvfs_from_corpus(self, hvf_corpus):
+
+        loaded_file_names = set().union(*self.corpus_file_name_dict.values())
+
+        list_of_new_indices = [
+            index for index in range(len(hvf_corpus)) if hvf_corpus.get_file_name(index) not in loaded_file_names
+        ]
+
+        list_of_keyed_hvfs = []
+        for index in list_of_new_indices:
+            hvf_obj = hvf_corpus.get_hvf_object(index)
+            list_of_keyed_hvfs.append((Hvf_Patient_Container.get_hvf_obj_keys(hvf_obj), hvf_obj))
+
+        self.add_keyed_hvfs(list_of_keyed_hvfs)
+
+        for index, (hvf_obj_keys, hvf_obj) in zip(list_of_new_indices, list_of_keyed_hvfs):
+            self.corpus_file_name_dict.setdefault(hvf_obj_keys, set()).add(hvf_corpus.get_file_name(index))
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM, f"Loaded {len(list_of_new_indices)} new exams from corpus"
+        )
+
+        return len(list_of_new_indices)
+
     ###############################################################################
     # Get list of patients in this container:
     def get_patient_list(self):
@@ -76,23 +172,74 @@ class Hvf_Patient_Container:
     def get_hvf_obj_dict(self, patient_id, laterality):
         return self.hvf_obj_dict.get(patient_id, {}).get(laterality, {})
 
+    ###############################################################################
+    # Get list of hvf_objs for a particular patient/laterality, ordered by date:
+    def get_hvf_obj_list(self, patient_id, laterality):
+        return self.get_hvfs_between_dates(patient_id, laterality)
+
+    ###############################################################################
+    # Get list of hvf_objs for a particular patient/laterality tested between start
+    # and end dates (inclusive; datetime objects or date strings - see
+    # Regex_Utils.parse_date), ordered by date. Either date can be None for no
+    # limit. Dates that cannot be parsed raise ValueError
+    def get_hvfs_between_dates(self, patient_id, laterality, start_date=None, end_date=None):
+
+        test_dates, date_keys = self.date_index_dict.get((patient_id, laterality), ([], []))
+
+        start_index = 0
+        end_index = len(test_dates)
+
+        if start_date is not None:
+            start_index = bisect_left(test_dates, Hvf_Patient_Container.get_query_date(start_date))
+
+        if end_date is not None:
+            end_index = bisect_right(test_dates, Hvf_Patient_Container.get_query_date(end_date))
+
+        laterality_dict = self.get_hvf_obj_dict(patient_id, laterality)
+
+        return [laterality_dict[date_key] for date_key in date_keys[start_index:end_index]]
+
+    ###############################################################################
+    # Get list of the latest num_exams hvf_objs for a particular patient/laterality,
+    # ordered by date
+    def get_latest_hvfs(self, patient_id, laterality, num_exams):
+
+        test_dates, date_keys = self.date_index_dict.get((patient_id, laterality), ([], []))
+
+        laterality_dict = self.get_hvf_obj_dict(patient_id, laterality)
+
+        return [laterality_dict[date_key] for date_key in date_keys[max(len(date_keys) - num_exams, 0) :]]
+
     ###############################################################################
     # Remove an HVF from the container. Must pass in the object to remove
     # Assumes hvf_obj is in container
     def remove_hvf(self, hvf_obj):
 
-        # Construct a few parameters of hvf_obj to help organize/sorting:
-        hvf_obj_patient_id = (
-            hvf_obj.metadata.get(Hvf_Object.KEYLABEL_NAME).lower()
-            + " | "
-            + hvf_obj.metadata.get(Hvf_Object.KEYLABEL_ID)
-        )
+        hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key = Hvf_Patient_Container.get_hvf_obj_keys(hvf_obj)
 
-        hvf_obj_laterality = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_LATERALITY)
+        self.remove_hvf_by_parameter(hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key)
 
-        hvf_obj_date_key = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_TEST_DATE)
+        return
 
-        self.remove_hvf_by_parameter(hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key)
+    ###############################################################################
+    # Remove many HVFs at once - affected date indices are rebuilt once
+    def remove_hvfs(self, hvf_obj_iterable):
+
+        # Get all keys first, so a bad HVF leaves the container unchanged:
+        list_of_hvf_obj_keys = [Hvf_Patient_Container.get_hvf_obj_keys(hvf_obj) for hvf_obj in hvf_obj_iterable]
+
+        touched_index_keys = set()
+
+        for hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key in list_of_hvf_obj_keys:
+
+            self.hvf_obj_dict.get(hvf_obj_patient_id, {}).get(hvf_obj_laterality, {}).pop(hvf_obj_date_key, None)
+            self.corpus_file_name_dict.pop((hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key), None)
+
+            touched_index_keys.add((hvf_obj_patient_id, hvf_obj_laterality))
+
+        for id, laterality in touched_index_keys:
+            self.rebuild_date_index(id, laterality)
+            self.remove_if_empty(id, laterality)
 
         return
 
@@ -102,11 +249,53 @@ class Hvf_Patient_Container:
     def remove_hvf_by_parameter(self, id, laterality, date_key):
 
         # First, pop/remove the hvf
-        self.hvf_obj_dict.get(id, {}).get(laterality, {}).pop(date_key, None)
+        if date_key in self.get_hvf_obj_dict(id, laterality):
+
+            test_dates, date_keys = self.date_index_dict[(id, laterality)]
+
+            # Find the date key amongst those with the same test date:
+            test_date = Hvf_Patient_Container.get_sort_date(date_key)
+            index = date_keys.index(date_key, bisect_left(test_dates, test_date), bisect_right(test_dates, test_date))
+
+            del self.hvf_obj_dict[id][laterality][date_key]
+            self.corpus_file_name_dict.pop((id, laterality, date_key), None)
+
+            del test_dates[index]
+            del date_keys[index]
 
         # Then clean up laterality/id if there are no other elements:
+        self.remove_if_empty(id, laterality)
+
+        return
+
+    ###############################################################################
+    # Rebuilds the date index of a patient/laterality from its HVFs. Sorts by test
+    # date only (date keys may mix strings and None), keeping insertion order for
+    # equal dates as add_hvf does
+    def rebuild_date_index(self, id, laterality):
+
+        sorted_dates = sorted(
+            (
+                (Hvf_Patient_Container.get_sort_date(date_key), date_key)
+                for date_key in self.get_hvf_obj_dict(id, laterality)
+            ),
+            key=lambda pair: pair[0],
+        )
+
+        self.date_index_dict[(id, laterality)] = (
+            [test_date for test_date, date_key in sorted_dates],
+            [date_key for test_date, date_key in sorted_dates],
+        )
+
+        return
+
+    ###############################################################################
+    # Removes laterality/id (and date index) if they have no HVFs left
+    def remove_if_empty(self, id, laterality):
+
         if not (self.hvf_obj_dict.get(id, {}).get(laterality, {})):
             self.hvf_obj_dict.get(id, {}).pop(laterality, None)
+            self.date_index_dict.pop((id, laterality), None)
 
         if not (self.hvf_obj_dict.get(id, {})):
             self.hvf_obj_dict.pop(id, None)
@@ -117,16 +306,64 @@ class Hvf_Patient_Container:
     # NON-EDITING HELPER FUNCTIONS ################################################
     ###############################################################################
 
+    ###############################################################################
+    # Given an hvf_obj, returns its (patient id, laterality, date key) in the
+    # container
+    @staticmethod
+    def get_hvf_obj_keys(hvf_obj):
+
+        # Construct a few parameters of hvf_obj to help organize/sorting:
+        hvf_obj_patient_id = (
+            hvf_obj.metadata.get(Hvf_Object.KEYLABEL_NAME).lower()
+            + " | "
+            + hvf_obj.metadata.get(Hvf_Object.KEYLABEL_ID)
+        )
+
+        hvf_obj_laterality = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_LATERALITY)
+
+        hvf_obj_date_key = hvf_obj.metadata.get(Hvf_Object.KEYLABEL_TEST_DATE)
+
+        return hvf_obj_patient_id, hvf_obj_laterality, hvf_obj_date_key
+
+    ###############################################################################
+    # Given a date key, returns the date to sort it by (UNKNOWN_DATE if it cannot
+    # be parsed)
+    @staticmethod
+    def get_sort_date(date_key):
+
+        test_date = Regex_Utils.parse_date(date_key)
+
+        if test_date is None:
+            return Hvf_Patient_Container.UNKNOWN_DATE
+
+        return test_date
+
+    ###############################################################################
+    # Given a query date (datetime object or date string), returns the datetime
+    # object
+    @staticmethod
+    def get_query_date(query_date):
+
+        if isinstance(query_date, datetime):
+            return query_date
+
+        test_date = Regex_Utils.parse_date(query_date)
+
+        if test_date is None:
+            raise ValueError(f"Cannot parse query date '{query_date}'")
+
+        return test_date
+
     @staticmethod
     def is_same_patient(hvf_obj1, hvf_obj2):
 
         name_bool = (
-            hvf_obj1.metadata.get(HVF_Object.KEYLABEL_NAME).lower()
-            == hvf_obj2.metadata.get(HVF_Object.KEYLABEL_NAME).lower()
+            hvf_obj1.metadata.get(Hvf_Object.KEYLABEL_NAME).lower()
+            == hvf_obj2.metadata.get(Hvf_Object.KEYLABEL_NAME).lower()
         )
 
-        id_bool = hvf_obj1.metadata.get(HVF_Object.KEYLABEL_ID) == hvf_obj2.metadata.get(HVF_Object.KEYLABEL_ID)
+        id_bool = hvf_obj1.metadata.get(Hvf_Object.KEYLABEL_ID) == hvf_obj2.metadata.get(Hvf_Object.KEYLABEL_ID)
 
-        dob_bool = hvf_obj1.metadata.get(HVF_Object.KEYLABEL_DOB) == hvf_obj2.metadata.get(HVF_Object.KEYLABEL_DOB)
+        dob_bool = hvf_obj1.metadata.get(Hvf_Object.KEYLABEL_DOB) == hvf_obj2.metadata.get(Hvf_Object.KEYLABEL_DOB)
 
         return name_bool and id_bool and dob_bool
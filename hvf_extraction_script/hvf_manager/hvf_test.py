@@ -16,21 +16,39 @@
 # 		  is generated from the current version of the hvf_object, so this
 # 		  should only be used when the current version is functional/working.
 #
+# 		run_benchmark
+# 		- Times a specific hot-path function on generated inputs (see BENCHMARK_*)
+#
 #
 ###############################################################################
 
+import json
 import os
-from datetime import datetime
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from shutil import copyfile
 
 import cv2
+import numpy as np
 
+from hvf_extraction_script.hvf_data.hvf_digit_classifier import Hvf_Digit_Classifier
+from hvf_extraction_script.hvf_data.hvf_layout_classifier import Hvf_Layout_Classifier
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
 from hvf_extraction_script.hvf_data.hvf_perc_icon import Hvf_Perc_Icon
+from hvf_extraction_script.hvf_data.hvf_plot_array import Hvf_Plot_Array
+from hvf_extraction_script.hvf_data.hvf_plot_cells import Hvf_Plot_Cells
 from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
+from hvf_extraction_script.hvf_manager.hvf_bulk_loader import Hvf_Bulk_Loader
+from hvf_extraction_script.hvf_manager.hvf_corpus import Hvf_Corpus
 from hvf_extraction_script.hvf_manager.hvf_metric_calculator import Hvf_Metric_Calculator
 from hvf_extraction_script.utilities.file_utils import File_Utils
+from hvf_extraction_script.utilities.image_context import Image_Context
+from hvf_extraction_script.utilities.image_utils import Image_Utils
 from hvf_extraction_script.utilities.logger import Logger
+from hvf_extraction_script.utilities.ocr_utils import Ocr_Utils
+from hvf_extraction_script.utilities.regex_utils import Regex_Utils
 
 
 class Hvf_Test:
@@ -49,6 +67,30 @@ class Hvf_Test:
     UNIT_TEST_IMAGE_DIR = "image_plots"
     UNIT_TEST_SERIALIZATION_DIR = "serialized_plots"
 
+    # Benchmark names:
+    BENCHMARK_CROP_WHITE_BORDER = "crop_white_border"
+    BENCHMARK_IDENTIFY_DIGIT = "identify_digit"
+    BENCHMARK_DIGIT_CLASSIFIER = "digit_classifier"
+    BENCHMARK_BULK_JSON = "bulk_json"
+    BENCHMARK_BATCH_METRICS = "batch_metrics"
+    BENCHMARK_LAYOUT_CLASSIFIER = "layout_classifier"
+    BENCHMARK_REKOGNITION = "rekognition"
+    BENCHMARK_ROI_UPSCALE = "roi_upscale"
+
+    # Number of iterations (eg, plot cells) to time per benchmark:
+    BENCHMARK_DEFAULT_ITERATIONS = 5000
+
+    # Rekognition load test - maximum number of pages, header crops per page, and
+    # simulated request latency (seconds) of the local stand-in endpoint used when
+    # no endpoint is configured (see Ocr_Utils.REKOGNITION_ENDPOINT_ENV)
+    BENCHMARK_REKOGNITION_MAX_PAGES = 50
+    BENCHMARK_REKOGNITION_CROPS_PER_PAGE = 4
+    BENCHMARK_REKOGNITION_STUB_LATENCY = 0.05
+
+    # Layout classifier evaluation - number of folds images are split into (each
+    # fold is classified by a classifier trained on the other folds)
+    LAYOUT_CLASSIFIER_FOLDS = 5
+
     ###############################################################################
     # FILE MANAGEMENT HELPER FUNCTIONS  ###########################################
     ###############################################################################
@@ -330,38 +372,13 @@ class Hvf_Test:
 
     def get_datetime_obj(date_string):
 
-        # Date options:
-        # MM-DD-YYYY
-        # MM/DD/YYYY
-        # MM/DD/YY
-        # Mon DD, YYYY
-        # YYYY-MM-DD
-
-        date_parse_string_list = [
-            "%m-%d-%Y",
-            "%-m-%-d-%Y",
-            "%d-%b-%y",
-            "%m/%d/%Y",
-            "%m/%d/%y",
-            "%-m/%-d/%Y",
-            "%b %d, %Y",
-            "%Y-%m-%d",
-        ]
+        datetime_obj = Regex_Utils.parse_date(date_string)
 
-        for parse_string in date_parse_string_list:
-            try:
-                datetime_obj = datetime.strptime(date_string, parse_string)
-
-                # If only 2 digit year, it will extrapolate to 20xx, which is likely
-                # not what we want. If year is in future, correct to 1900s.
-                if datetime.today() <= datetime_obj:
-                    datetime_obj = datetime_obj.replace(year=datetime_obj.year - 100)
-
-                return datetime_obj
-            except Exception:
-                continue
+        # Unparseable dates are compared as strings
+        if datetime_obj is None:
+            return date_string
 
-        return date_string
+        return datetime_obj
 
     def get_rx_array(rx_data):
 
@@ -724,7 +741,15 @@ class Hvf_Test:
     # SINGLE IMAGE TESTING ########################################################
     ###############################################################################
     @staticmethod
-    def test_single_image(hvf_image, rekognition):
+    def test_single_image(
+        hvf_image,
+        rekognition,
+        num_threads=1,
+        roi_upscale=False,
+        line_ocr=False,
+        single_pass_ocr=False,
+        composite_ocr=False,
+    ):
         # Load image
 
         # Set up the logger module:
@@ -734,7 +759,15 @@ class Hvf_Test:
 
         # Instantiate hvf object:
         Logger.get_logger().log_time("Single HVF image extraction time", Logger.TIME_START)
-        hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image, rekognition=rekognition)
+        hvf_obj = Hvf_Object.get_hvf_object_from_image(
+            hvf_image,
+            rekognition=rekognition,
+            num_threads=num_threads,
+            roi_upscale=roi_upscale,
+            line_ocr=line_ocr,
+            single_pass_ocr=single_pass_ocr,
+            composite_ocr=composite_ocr,
+        )
 
         debug_level = Logger.DEBUG_FLAG_TIME
         Logger.get_logger().set_logger_level(debug_level)
@@ -797,13 +830,82 @@ class Hvf_Test:
 
         return ""
 
+    ###############################################################################
+    # PLOT CELL TESTING ###########################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Checks that plot cells (Hvf_Plot_Cells) index like the object arrays plots
+    # used to be stored as: single cells and chained ([x][y]) indexing read and
+    # assign cells, and assignments to slices (copies) raise rather than being
+    # lost. Logs each check, and returns the number failed
+    @staticmethod
+    def test_plot_cells():
+
+        value_cells = Hvf_Plot_Cells(Hvf_Plot_Cells.ICON_VALUE)
+        perc_cells = Hvf_Plot_Cells(Hvf_Plot_Cells.ICON_PERC)
+
+        # Chained assignment:
+        value_cells[1][2] = Hvf_Value.get_value_from_display_string("12")
+        value_cells[3][-1] = Hvf_Value.get_value_from_display_string("<0")
+        perc_cells[4][5] = Hvf_Perc_Icon.get_perc_icon_from_char(Hvf_Perc_Icon.PERC_5_PERCENTILE_CHAR)
+
+        list_of_checks = [
+            ("chained value assignment", value_cells[1, 2].get_value() == 12),
+            ("chained value assignment, numeric grid", value_cells.get_numeric_grid()[1, 2] == 12),
+            ("chained negative index assignment", value_cells[3, 9].get_value() == Hvf_Value.VALUE_BELOW_THRESHOLD),
+            ("chained percentile assignment", perc_cells[4, 5].get_enum() == Hvf_Perc_Icon.PERC_5_PERCENTILE),
+            ("chained read", value_cells[1][2].get_value() == value_cells[1, 2].get_value()),
+            ("column iteration", [cell.get_value() for cell in value_cells[1]][2] == 12),
+            ("plot iteration", [column[2].get_value() for column in value_cells][1] == 12),
+            ("column as array", np.asarray(value_cells[1])[2].get_value() == 12),
+        ]
+
+        # Slices are copies - assigning to them must raise:
+        for check_name, assign_function in [
+            ("slice assignment raises", lambda: value_cells[1:3].__setitem__((0, 0), None)),
+            ("column slice assignment raises", lambda: value_cells[1][2:4].__setitem__(0, None)),
+            ("plot slice assignment raises", lambda: value_cells.__setitem__(slice(1, 3), None)),
+        ]:
+            try:
+                assign_function()
+                is_passed = False
+            except (ValueError, IndexError):
+                is_passed = True
+
+            list_of_checks.append((check_name, is_passed))
+
+        num_failed = 0
+        for check_name, is_passed in list_of_checks:
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM, f"Plot cells {check_name}: {'PASSED' if is_passed else 'FAILED'}"
+            )
+
+            if not is_passed:
+                num_failed = num_failed + 1
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Plot cell checks passed: {len(list_of_checks) - num_failed} of {len(list_of_checks)}",
+        )
+
+        return num_failed
+
     ###############################################################################
     # BULK UNIT TESTING ###########################################################
     ###############################################################################
 
     # Do unit tests of a specific directory
+    # With roi_upscale, images are extracted using ROI-only upscaling (to check its
+    # accuracy against the same references as full page upscaling)
+    # With line_ocr, header text is OCRed line by line (likewise)
+    # With single_pass_ocr, header text is OCRed in a single pass (likewise)
+    # With composite_ocr, text slices are read as one composite Rekognition image
+    # (likewise)
     @staticmethod
-    def test_unit_tests(sub_dir, test_type, rekognition):
+    def test_unit_tests(
+        sub_dir, test_type, rekognition, roi_upscale=False, line_ocr=False, single_pass_ocr=False, composite_ocr=False
+    ):
 
         # Set up the logger module:
         debug_level = Logger.DEBUG_FLAG_ERROR
@@ -841,6 +943,13 @@ class Hvf_Test:
         Logger.get_logger().log_msg(debug_level, "Starting HVF Unit Testing")
         Logger.get_logger().log_msg(debug_level, f"Test Type: {test_type}")
         Logger.get_logger().log_msg(debug_level, f"Unit Test Name: {sub_dir}")
+        Logger.get_logger().log_msg(debug_level, f"Upscaling: {'ROI only' if roi_upscale else 'Full page'}")
+        if rekognition and composite_ocr:
+            Logger.get_logger().log_msg(debug_level, "Header OCR: Composite image")
+        elif single_pass_ocr:
+            Logger.get_logger().log_msg(debug_level, "Header OCR: Single pass")
+        else:
+            Logger.get_logger().log_msg(debug_level, f"Header OCR: {'Text lines' if line_ocr else 'Whole slices'}")
 
         # Declare variable to keep track of times, errors, etc
         # Will be a list of raw data --> we will calculate metrics at the end
@@ -867,7 +976,14 @@ class Hvf_Test:
                 hvf_image = File_Utils.read_image_from_file(hvf_image_path)
 
                 Logger.get_logger().log_time("Test " + filename_root, Logger.TIME_START)
-                test_hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image, rekognition=rekognition)
+                test_hvf_obj = Hvf_Object.get_hvf_object_from_image(
+                    hvf_image,
+                    rekognition=rekognition,
+                    roi_upscale=roi_upscale,
+                    line_ocr=line_ocr,
+                    single_pass_ocr=single_pass_ocr,
+                    composite_ocr=composite_ocr,
+                )
                 time_elapsed = Logger.get_logger().log_time("Test " + filename_root, Logger.TIME_END)
 
                 serialization_path = os.path.join(reference_data_path, filename_root + ".txt")
@@ -880,7 +996,14 @@ class Hvf_Test:
                 hvf_image = File_Utils.read_image_from_file(hvf_image_path)
 
                 Logger.get_logger().log_time("Test " + filename_root, Logger.TIME_START)
-                test_hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image, rekognition=rekognition)
+                test_hvf_obj = Hvf_Object.get_hvf_object_from_image(
+                    hvf_image,
+                    rekognition=rekognition,
+                    roi_upscale=roi_upscale,
+                    line_ocr=line_ocr,
+                    single_pass_ocr=single_pass_ocr,
+                    composite_ocr=composite_ocr,
+                )
                 time_elapsed = Logger.get_logger().log_time("Test " + filename_root, Logger.TIME_END)
 
                 dicom_file_path = os.path.join(reference_data_path, filename_root + ".dcm")
@@ -1035,3 +1158,1219 @@ class Hvf_Test:
         )
 
         return ""
+
+    ###############################################################################
+    # BENCHMARKING ################################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Runs the named benchmark (see BENCHMARK_* names)
+    @staticmethod
+    def run_benchmark(benchmark_name, num_iterations=BENCHMARK_DEFAULT_ITERATIONS):
+
+        Logger.get_logger().set_logger_level(Logger.DEBUG_FLAG_SYSTEM)
+
+        if not Hvf_Object.is_initialized:
+            Hvf_Object.initialize_class_vars()
+
+        if benchmark_name == Hvf_Test.BENCHMARK_CROP_WHITE_BORDER:
+            Hvf_Test.benchmark_crop_white_border(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_IDENTIFY_DIGIT:
+            Hvf_Test.benchmark_identify_digit(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_DIGIT_CLASSIFIER:
+            Hvf_Test.benchmark_digit_classifier(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_BULK_JSON:
+            Hvf_Test.benchmark_bulk_json(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_BATCH_METRICS:
+            Hvf_Test.benchmark_batch_metrics(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_LAYOUT_CLASSIFIER:
+            Hvf_Test.benchmark_layout_classifier(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_REKOGNITION:
+            Hvf_Test.benchmark_rekognition(num_iterations)
+
+        elif benchmark_name == Hvf_Test.BENCHMARK_ROI_UPSCALE:
+            Hvf_Test.benchmark_roi_upscale(num_iterations)
+
+        else:
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_ERROR, f"Unrecognized benchmark '{benchmark_name}'")
+
+        return ""
+
+    ###############################################################################
+    # Helper for benchmarks - given list of inputs and function taking one input,
+    # calls function on each input (cycling through list) num_iterations times, and
+    # returns average time per call in microseconds
+    @staticmethod
+    def time_per_call(func, list_of_inputs, num_iterations):
+
+        time_start = time.perf_counter()
+
+        for ii in range(num_iterations):
+            func(list_of_inputs[ii % len(list_of_inputs)])
+
+        return (time.perf_counter() - time_start) / num_iterations * 1000000
+
+    ###############################################################################
+    # Times Image_Utils.crop_white_border on plot cell sized images, generated by
+    # padding the value icon templates with white borders
+    @staticmethod
+    def benchmark_crop_white_border(num_iterations):
+
+        list_of_cells = []
+        for ii, icons in sorted(Hvf_Value.value_icon_templates.items()):
+            for dir in sorted(icons):
+                icon = cv2.threshold(icons[dir], 127, 255, cv2.THRESH_BINARY)[1]
+                pad_y = np.size(icon, 0) // 2
+                pad_x = np.size(icon, 1) // 2
+                list_of_cells.append(
+                    cv2.copyMakeBorder(icon, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_CONSTANT, value=255)
+                )
+
+        time_per_cell = Hvf_Test.time_per_call(Image_Utils.crop_white_border, list_of_cells, num_iterations)
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"crop_white_border: {num_iterations} cells, {time_per_cell:.1f} us/cell",
+        )
+
+        return ""
+
+    ###############################################################################
+    # Helper for benchmarks - returns lists of binarized digit images and their
+    # digit labels, generated by resizing the value icon templates to a range of
+    # heights
+    @staticmethod
+    def get_benchmark_digit_images():
+
+        list_of_digits = []
+        list_of_labels = []
+        for ii, icons in sorted(Hvf_Value.value_icon_templates.items()):
+            for dir in sorted(icons):
+                for height in [16, 21, 24, 32, 48, 76]:
+                    icon = icons[dir]
+                    width = max(round(np.size(icon, 1) * height / np.size(icon, 0)), 1)
+                    digit = cv2.resize(icon, (width, height))
+                    list_of_digits.append(cv2.threshold(digit, 127, 255, cv2.THRESH_BINARY)[1])
+                    list_of_labels.append(ii)
+
+        return list_of_digits, list_of_labels
+
+    ###############################################################################
+    # Times Hvf_Value.identify_digit on digit images of a range of heights
+    @staticmethod
+    def benchmark_identify_digit(num_iterations):
+
+        list_of_digits, list_of_labels = Hvf_Test.get_benchmark_digit_images()
+
+        time_per_digit = Hvf_Test.time_per_call(
+            (lambda digit: Hvf_Value.identify_digit(digit, True)), list_of_digits, num_iterations
+        )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"identify_digit: {num_iterations} digits, {time_per_digit:.1f} us/digit",
+        )
+
+        return ""
+
+    ###############################################################################
+    # Helper for benchmarks - given a plot extracted from an image and the
+    # corresponding reference plot, returns lists of digit images and their digit
+    # labels, for all cells that split into as many digits as the reference value
+    @staticmethod
+    def get_labelled_digit_images(test_plot, reference_plot):
+
+        list_of_digits = []
+        list_of_labels = []
+
+        special_values = [Hvf_Value.VALUE_NO_VALUE, Hvf_Value.VALUE_FAILURE, Hvf_Value.VALUE_BELOW_THRESHOLD]
+
+        for x in range(np.size(test_plot.plot_array, 0)):
+            for y in range(np.size(test_plot.plot_array, 1)):
+
+                cell_slice = test_plot.plot_array[x, y].get_source_image()
+                reference_value = reference_plot.plot_array[x, y].get_value()
+
+                if cell_slice is None or reference_value in special_values:
+                    continue
+
+                return_val, is_minus, list_of_chars, list_of_chars_backup = Hvf_Value.segment_value_plot_element(
+                    cell_slice, cell_slice, test_plot.plot_type
+                )
+
+                reference_digits = str(abs(reference_value))
+
+                if return_val == 0 and len(list_of_chars) == len(reference_digits):
+                    for char, reference_digit in zip(list_of_chars, reference_digits):
+                        list_of_digits.append(Hvf_Value.clean_slice(char))
+                        list_of_labels.append(int(reference_digit))
+
+        return list_of_digits, list_of_labels
+
+    ###############################################################################
+    # Helper for benchmarks - returns list of (name, image, reference hvf_obj) for
+    # the image vs serialization unit tests (all sub directories; empty if there
+    # are no such unit tests)
+    @staticmethod
+    def get_unit_test_references():
+
+        list_of_references = []
+
+        test_type_path = os.path.join(Hvf_Test.UNIT_TEST_MASTER_PATH, Hvf_Test.UNIT_TEST_IMAGE_VS_SERIALIZATION)
+
+        if not os.path.isdir(test_type_path):
+            return list_of_references
+
+        for sub_dir in sorted(os.listdir(test_type_path)):
+            test_data_path = os.path.join(test_type_path, sub_dir, Hvf_Test.UNIT_TEST_TEST_DIR)
+            reference_data_path = os.path.join(test_type_path, sub_dir, Hvf_Test.UNIT_TEST_REFERENCE_DIR)
+
+            if not os.path.isdir(test_data_path):
+                continue
+
+            for hvf_file in sorted(os.listdir(test_data_path)):
+
+                # Skip hidden files:
+                if hvf_file.startswith("."):
+                    continue
+
+                filename_root, ext = os.path.splitext(hvf_file)
+                serialization_path = os.path.join(reference_data_path, filename_root + ".txt")
+
+                if not os.path.isfile(serialization_path):
+                    continue
+
+                hvf_image = File_Utils.read_image_from_file(os.path.join(test_data_path, hvf_file))
+
+                serialization = File_Utils.read_text_from_file(serialization_path)
+                reference_hvf_obj = Hvf_Object.get_hvf_object_from_text(serialization)
+
+                list_of_references.append((os.path.join(sub_dir, hvf_file), hvf_image, reference_hvf_obj))
+
+        return list_of_references
+
+    ###############################################################################
+    # Helper for benchmarks - returns list of (test plot, reference plot) for the
+    # value plots of an hvf_obj extracted from an image, and its reference hvf_obj
+    # (skipping plots missing or not generated in either)
+    @staticmethod
+    def get_value_plot_pairs(test_hvf_obj, reference_hvf_obj):
+
+        return [
+            (test_plot, reference_plot)
+            for test_plot, reference_plot in [
+                (test_hvf_obj.raw_value_array, reference_hvf_obj.raw_value_array),
+                (test_hvf_obj.abs_dev_value_array, reference_hvf_obj.abs_dev_value_array),
+                (test_hvf_obj.pat_dev_value_array, reference_hvf_obj.pat_dev_value_array),
+            ]
+            if not (test_plot is None or reference_plot is None or test_plot.plot_array is None)
+            and not (test_plot.is_pattern_not_generated() or reference_plot.is_pattern_not_generated())
+        ]
+
+    ###############################################################################
+    # Harvests labelled digit images from a list of unit tests (see
+    # get_unit_test_references), for training/evaluating the digit classifier.
+    # Digits are segmented from extractions with the current value RECOGNIZER.
+    # Returns lists of digit images and digit labels
+    @staticmethod
+    def get_unit_test_digit_images(list_of_references):
+
+        list_of_digits = []
+        list_of_labels = []
+
+        for name, hvf_image, reference_hvf_obj in list_of_references:
+
+            test_hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image)
+
+            for test_plot, reference_plot in Hvf_Test.get_value_plot_pairs(test_hvf_obj, reference_hvf_obj):
+                digits, labels = Hvf_Test.get_labelled_digit_images(test_plot, reference_plot)
+                list_of_digits.extend(digits)
+                list_of_labels.extend(labels)
+
+        return list_of_digits, list_of_labels
+
+    ###############################################################################
+    # Compares digit recognizers - template matching (Hvf_Value.identify_digit) vs
+    # Hvf_Digit_Classifier:
+    # 	- Speed: glyphs per second of each, on digit images generated from the
+    # 	  templates (up to num_iterations). These are drawn from the classifier's
+    # 	  own training augmentations, so accuracy is not reported for them
+    # 	- Accuracy, on the image vs serialization unit tests (if any). Tests are
+    # 	  split by file: digits harvested from every other file are added to the
+    # 	  classifier's training set, and the remaining files are held out. On the
+    # 	  held out files, reports digit accuracy of each recognizer, and value cell
+    # 	  accuracy of full extraction with each Hvf_Value.RECOGNIZER against the
+    # 	  serialized reference values
+    @staticmethod
+    def benchmark_digit_classifier(num_iterations):
+
+        if not Hvf_Digit_Classifier.is_initialized:
+            Hvf_Digit_Classifier.initialize_class_vars(Hvf_Value.value_icon_templates)
+
+        list_of_digits, list_of_labels = Hvf_Test.get_benchmark_digit_images()
+
+        num_digits = min(num_iterations, len(list_of_digits))
+        list_of_digits = list_of_digits[:num_digits]
+
+        # Template matching, one digit at a time:
+        time_start = time.perf_counter()
+        for digit in list_of_digits:
+            Hvf_Value.identify_digit(digit, True)
+        template_time = time.perf_counter() - time_start
+
+        # Classifier, all digits in one batch:
+        time_start = time.perf_counter()
+        Hvf_Digit_Classifier.classify_glyphs(list_of_digits)
+        classifier_time = time.perf_counter() - time_start
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Speed ({num_digits} generated digits): template {num_digits / template_time:.0f} glyphs/sec, "
+            + f"classifier {num_digits / classifier_time:.0f} glyphs/sec",
+        )
+
+        list_of_references = Hvf_Test.get_unit_test_references()
+
+        if len(list_of_references) < 2:
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM, "Too few image vs serialization unit tests to evaluate accuracy"
+            )
+            return ""
+
+        list_of_train_references = list_of_references[0::2]
+        list_of_test_references = list_of_references[1::2]
+
+        # Digits are harvested from template matching extractions (segmentation does
+        # not depend on the recognizer):
+        saved_recognizer = Hvf_Value.RECOGNIZER
+        Hvf_Value.RECOGNIZER = Hvf_Value.RECOGNIZER_TEMPLATE
+
+        try:
+            train_digits, train_labels = Hvf_Test.get_unit_test_digit_images(list_of_train_references)
+            Hvf_Digit_Classifier.add_training_glyphs(train_digits, train_labels)
+
+            test_digits, test_labels = Hvf_Test.get_unit_test_digit_images(list_of_test_references)
+
+            if test_digits:
+                template_results = [Hvf_Value.identify_digit(digit, True)[0] for digit in test_digits]
+                classifier_results = [digit for digit, score in Hvf_Digit_Classifier.classify_glyphs(test_digits)]
+
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_SYSTEM,
+                    f"Digit accuracy ({len(test_digits)} held out digits, {len(train_digits)} added to training): "
+                    + f"template {np.mean(np.array(template_results) == np.array(test_labels)):.3f}, "
+                    + f"classifier {np.mean(np.array(classifier_results) == np.array(test_labels)):.3f}",
+                )
+
+            # Value cells of full extractions:
+            for recognizer in [Hvf_Value.RECOGNIZER_TEMPLATE, Hvf_Value.RECOGNIZER_KNN]:
+                Hvf_Value.RECOGNIZER = recognizer
+
+                num_cells = 0
+                num_errors = 0
+                for name, hvf_image, reference_hvf_obj in list_of_test_references:
+                    test_hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image)
+
+                    for test_plot, reference_plot in Hvf_Test.get_value_plot_pairs(test_hvf_obj, reference_hvf_obj):
+                        fail_list, fail_string_list = Hvf_Test.compare_plots(name, reference_plot, test_plot)
+
+                        num_cells = num_cells + Hvf_Test.count_val_nonempty_elements(reference_plot)
+                        num_errors = num_errors + len(fail_list)
+
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_SYSTEM,
+                    f"Value cells ({recognizer}, {len(list_of_test_references)} held out files): "
+                    + f"{num_errors} errors in {num_cells} cells ({1 - num_errors / max(num_cells, 1):.3f} accuracy)",
+                )
+
+        finally:
+            Hvf_Value.RECOGNIZER = saved_recognizer
+
+        return ""
+
+    ###############################################################################
+    # Helper for benchmarks - returns list of generated HVF JSON serializations,
+    # with random plot values (including blank, failed and below threshold cells)
+    # and some pattern plots not generated
+    @staticmethod
+    def get_benchmark_serializations(num_serializations):
+
+        rng = np.random.default_rng(0)
+
+        value_choices = list(range(-35, 36)) + [
+            Hvf_Value.VALUE_NO_VALUE,
+            Hvf_Value.VALUE_FAILURE,
+            Hvf_Value.VALUE_BELOW_THRESHOLD,
+        ]
+        perc_choices = list(Hvf_Perc_Icon.perc_disp_char_dict.keys())
+
+        list_of_serializations = []
+        for ii in range(num_serializations):
+
+            plot_grids = np.zeros(Hvf_Corpus.PLOT_SHAPE, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+            for plot_index, (plot_type, icon_type, attribute) in enumerate(Hvf_Corpus.PLOT_LAYOUT):
+                if icon_type == Hvf_Plot_Array.PLOT_PERC:
+                    plot_grids[plot_index] = rng.choice(perc_choices, size=plot_grids[plot_index].shape)
+                else:
+                    plot_grids[plot_index] = rng.choice(value_choices, size=plot_grids[plot_index].shape)
+
+            if ii % 7 == 0:
+                plot_grids[Hvf_Corpus.PLOT_PDV] = Hvf_Corpus.PLOT_NOT_GENERATED
+                plot_grids[Hvf_Corpus.PLOT_PDP] = Hvf_Corpus.PLOT_NOT_GENERATED
+
+            metadata = {"name": f"Benchmark {ii}", "layout_version": Hvf_Object.HVF_LAYOUT_V2}
+
+            hvf_obj = Hvf_Corpus.get_hvf_object_from_plot_grids(metadata, plot_grids)
+            list_of_serializations.append(hvf_obj.serialize_to_json())
+
+        return list_of_serializations
+
+    ###############################################################################
+    # Compares loading a directory of JSON text serializations one file at a time
+    # (Hvf_Object.get_hvf_object_from_text) vs Hvf_Bulk_Loader - as records only,
+    # and with Hvf_Objects constructed - reporting files per second of each, and
+    # checking that both give identical serializations. Writes num_iterations files
+    # to a temporary directory
+    @staticmethod
+    def benchmark_bulk_json(num_iterations):
+
+        list_of_serializations = Hvf_Test.get_benchmark_serializations(min(num_iterations, 100))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            for ii in range(num_iterations):
+                File_Utils.write_string_to_file(
+                    list_of_serializations[ii % len(list_of_serializations)],
+                    os.path.join(temp_dir, f"hvf_{ii:06d}.txt"),
+                )
+
+            list_of_txt_paths = File_Utils.get_files_within_dir(temp_dir, Hvf_Bulk_Loader.TEXT_FILE_EXTENSIONS)
+
+            # Current path, one file at a time:
+            time_start = time.perf_counter()
+            list_of_hvf_objs = [
+                Hvf_Object.get_hvf_object_from_text(File_Utils.read_text_from_file(hvf_txt_path))
+                for hvf_txt_path in list_of_txt_paths
+            ]
+            current_time = time.perf_counter() - time_start
+
+            # Bulk loader, records only:
+            time_start = time.perf_counter()
+            for record in Hvf_Bulk_Loader.get_records_from_text_paths(list_of_txt_paths):
+                pass
+            records_time = time.perf_counter() - time_start
+
+            # Bulk loader, constructing objects:
+            time_start = time.perf_counter()
+            list_of_loader_objs = [
+                Hvf_Bulk_Loader.get_hvf_object(metadata, plot_grids)
+                for filename, metadata, plot_grids in Hvf_Bulk_Loader.get_records_from_text_paths(list_of_txt_paths)
+            ]
+            objects_time = time.perf_counter() - time_start
+
+        num_matching = sum(
+            hvf_obj.serialize_to_json() == loader_obj.serialize_to_json()
+            for hvf_obj, loader_obj in zip(list_of_hvf_objs, list_of_loader_objs)
+        )
+
+        for loader_name, time_elapsed in [
+            ("get_hvf_object_from_text", current_time),
+            ("bulk loader (records)", records_time),
+            ("bulk loader (objects)", objects_time),
+        ]:
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"{loader_name}: {num_iterations} files, {num_iterations / time_elapsed:.0f} files/sec",
+            )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Serializations matching: {num_matching} of {num_iterations}",
+        )
+
+        return ""
+
+    ###############################################################################
+    # Compares computing metrics one exam at a time (Hvf_Metric_Calculator single
+    # exam functions, through get_exam_metrics) vs one metrics table for a stack of
+    # num_iterations exams, reporting exams per second of each, and checking both
+    # give the same metrics. Also checks the metrics table against references that
+    # do not use it - hand computed metrics of fixed plots (see
+    # get_reference_metric_cases), and the original cell by cell CIGTS scoring
+    # (see get_reference_cigts_score) for each benchmark exam
+    @staticmethod
+    def benchmark_batch_metrics(num_iterations):
+
+        list_of_hvf_objs = [
+            Hvf_Object.get_hvf_object_from_text(hvf_serialized)
+            for hvf_serialized in Hvf_Test.get_benchmark_serializations(min(num_iterations, 100))
+        ]
+
+        for ii, hvf_obj in enumerate(list_of_hvf_objs):
+            hvf_obj.metadata[Hvf_Object.KEYLABEL_LATERALITY] = [Hvf_Object.HVF_OD, Hvf_Object.HVF_OS][ii % 2]
+            hvf_obj.metadata[Hvf_Object.KEYLABEL_MD] = str(-ii % 30)
+
+        list_of_metadata = [hvf_obj.metadata for hvf_obj in list_of_hvf_objs]
+        list_of_plot_grids = [Hvf_Corpus.get_plot_grids(hvf_obj) for hvf_obj in list_of_hvf_objs]
+
+        # One exam at a time:
+        time_start = time.perf_counter()
+        list_of_exam_metrics = [
+            Hvf_Metric_Calculator.get_exam_metrics(list_of_hvf_objs[ii % len(list_of_hvf_objs)])
+            for ii in range(num_iterations)
+        ]
+        exam_time = time.perf_counter() - time_start
+
+        # Whole stack at once:
+        plot_tensor = np.stack([list_of_plot_grids[ii % len(list_of_plot_grids)] for ii in range(num_iterations)])
+        list_of_tensor_metadata = [list_of_metadata[ii % len(list_of_metadata)] for ii in range(num_iterations)]
+
+        time_start = time.perf_counter()
+        metrics_table = Hvf_Metric_Calculator.get_metrics_table(plot_tensor, list_of_tensor_metadata)
+        batch_time = time.perf_counter() - time_start
+
+        num_matching = sum(
+            all(
+                np.array_equal(exam_metrics[column], metrics_table[column][ii], equal_nan=True)
+                for column in metrics_table
+            )
+            for ii, exam_metrics in enumerate(list_of_exam_metrics)
+        )
+
+        for method_name, time_elapsed in [("one exam at a time", exam_time), ("metrics table", batch_time)]:
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"{method_name}: {num_iterations} exams, {num_iterations / time_elapsed:.0f} exams/sec",
+            )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Metrics matching: {num_matching} of {num_iterations}",
+        )
+
+        # Independent references:
+        list_of_reference_checks = []
+
+        for case_name, plot_grids, metadata, expected_metrics in Hvf_Test.get_reference_metric_cases():
+            exam_metrics = Hvf_Metric_Calculator.get_metrics_table(plot_grids[np.newaxis], [metadata])
+
+            for column, expected_value in expected_metrics.items():
+                list_of_reference_checks.append(
+                    (f"{case_name} {column}", expected_value, float(exam_metrics[column][0]))
+                )
+
+        for ii, (hvf_obj, plot_grids) in enumerate(zip(list_of_hvf_objs, list_of_plot_grids)):
+            is_right = hvf_obj.metadata[Hvf_Object.KEYLABEL_LATERALITY] == Hvf_Object.HVF_OD
+
+            for column, plot_index in [
+                (Hvf_Metric_Calculator.METRIC_CIGTS_TDP, Hvf_Corpus.PLOT_TDP),
+                (Hvf_Metric_Calculator.METRIC_CIGTS_PDP, Hvf_Corpus.PLOT_PDP),
+            ]:
+                # Absent plots have no CIGTS score:
+                if np.all(plot_grids[plot_index] < 0):
+                    continue
+
+                list_of_reference_checks.append(
+                    (
+                        f"benchmark exam {ii} {column}",
+                        Hvf_Test.get_reference_cigts_score(plot_grids[plot_index], is_right),
+                        float(metrics_table[column][ii]),
+                    )
+                )
+
+        num_reference_matching = 0
+        for check_name, expected_value, value in list_of_reference_checks:
+            if np.isclose(expected_value, value, atol=0.01, equal_nan=True):
+                num_reference_matching = num_reference_matching + 1
+            else:
+                Logger.get_logger().log_msg(
+                    Logger.DEBUG_FLAG_ERROR, f"Reference check {check_name}: expected {expected_value}, got {value}"
+                )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Reference checks matching: {num_reference_matching} of {len(list_of_reference_checks)}",
+        )
+
+        return ""
+
+    ###############################################################################
+    # Helper for batch metrics benchmark - returns exam plots (as in
+    # Hvf_Corpus.get_plot_grids) with the same values at every 24-2 point (right eye
+    # format, mirrored for a left eye), optionally with the pattern deviation plots
+    # not generated
+    @staticmethod
+    def get_uniform_plot_grids(raw_value, td_value, perc_enum, is_right=True, is_pattern_generated=True):
+
+        is_24_2 = np.array(Hvf_Plot_Array.BOOLEAN_MASK_24_2, dtype=bool).T
+        if not is_right:
+            is_24_2 = is_24_2[::-1, :]
+
+        plot_grids = np.zeros(Hvf_Corpus.PLOT_SHAPE, dtype=Hvf_Corpus.PLOT_DTYPE)
+
+        for plot_index, value in [
+            (Hvf_Corpus.PLOT_RAW, raw_value),
+            (Hvf_Corpus.PLOT_TDV, td_value),
+            (Hvf_Corpus.PLOT_PDV, td_value),
+        ]:
+            plot_grids[plot_index] = np.where(is_24_2, value, Hvf_Value.VALUE_NO_VALUE)
+
+        for plot_index in [Hvf_Corpus.PLOT_TDP, Hvf_Corpus.PLOT_PDP]:
+            plot_grids[plot_index] = np.where(is_24_2, perc_enum, Hvf_Perc_Icon.PERC_NO_VALUE)
+
+        if not is_pattern_generated:
+            plot_grids[[Hvf_Corpus.PLOT_PDV, Hvf_Corpus.PLOT_PDP]] = Hvf_Corpus.PLOT_NOT_GENERATED
+
+        return plot_grids
+
+    ###############################################################################
+    # Helper for batch metrics benchmark - returns list of (case name, exam plots,
+    # metadata, dictionary of metrics table column -> expected value), with the
+    # expected values worked out by hand:
+    # 	24-2 points by region (see Hvf_Metric_Calculator.REGION_NUMERICAL_MASK) are
+    # 	3, 3, 4, 4, 6, 6, 4, 4, 5, 5 - 52 points in all (26 per hemifield, 5 of them
+    # 	nasal), and by eccentricity ring are 4, 8, 18, 20, 2
+    @staticmethod
+    def get_reference_metric_cases():
+
+        region_sizes = [3, 3, 4, 4, 6, 6, 4, 4, 5, 5]
+        ring_sizes = [4, 8, 18, 20, 2]
+        ring_weights = [3.29, 1.28, 0.79, 0.57, 0.45]
+
+        list_of_cases = []
+
+        # Normal field - no defects anywhere:
+        expected_metrics = {
+            Hvf_Metric_Calculator.METRIC_VFI: 100,
+            Hvf_Metric_Calculator.METRIC_CIGTS_TDP: 0,
+            Hvf_Metric_Calculator.METRIC_CIGTS_PDP: 0,
+            Hvf_Metric_Calculator.METRIC_AGIS: 0,
+        }
+        for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_TD + str(region)] = 0
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP + str(region)] = 0
+
+        list_of_cases.append(
+            (
+                "normal",
+                Hvf_Test.get_uniform_plot_grids(30, 0, Hvf_Perc_Icon.PERC_NORMAL),
+                {Hvf_Object.KEYLABEL_LATERALITY: Hvf_Object.HVF_OD, Hvf_Object.KEYLABEL_MD: "0.00"},
+                expected_metrics,
+            )
+        )
+
+        # Uniform 10 dB depression (left eye), all points <0.5%:
+        # 	VFI - every point scores 20 / 30 of normal, so 66.67% whatever the weights
+        # 	CIGTS - every point scores 4 (all have 2+ neighbours at 4), 208 / 10.4 = 20
+        # 	AGIS - every point defective; nasal 1 (no points 12 dB deep), and each
+        # 	hemifield has 21 clustered points, 4 (none 12 dB deep): 1 + 4 + 4 = 9
+        expected_metrics = {
+            Hvf_Metric_Calculator.METRIC_VFI: 100 * 20 / 30,
+            Hvf_Metric_Calculator.METRIC_CIGTS_TDP: 20,
+            Hvf_Metric_Calculator.METRIC_CIGTS_PDP: 20,
+            Hvf_Metric_Calculator.METRIC_AGIS: 9,
+            Hvf_Metric_Calculator.METRIC_AGIS_NASAL: 1,
+            Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR: 4,
+            Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR: 4,
+        }
+        for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_TD + str(region)] = -10
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_PD + str(region)] = -10
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_CIGTS_TDP + str(region)] = 4 * region_sizes[region]
+
+        list_of_cases.append(
+            (
+                "uniform 10 dB (left eye)",
+                Hvf_Test.get_uniform_plot_grids(20, -10, Hvf_Perc_Icon.PERC_HALF_PERCENTILE, is_right=False),
+                {Hvf_Object.KEYLABEL_LATERALITY: Hvf_Object.HVF_OS, Hvf_Object.KEYLABEL_MD: "-10.00"},
+                expected_metrics,
+            )
+        )
+
+        # Uniform 30 dB depression, below threshold everywhere:
+        # 	VFI - 0 dB at every point, 0%
+        # 	AGIS - all 10 nasal points deep, nasal 2; each hemifield 4 for cluster
+        # 	size plus 5 for depth (30 dB reaches every depth), 2 + 9 + 9 = 20
+        expected_metrics = {
+            Hvf_Metric_Calculator.METRIC_VFI: 0,
+            Hvf_Metric_Calculator.METRIC_CIGTS_TDP: 20,
+            Hvf_Metric_Calculator.METRIC_AGIS: 20,
+            Hvf_Metric_Calculator.METRIC_AGIS_NASAL: 2,
+            Hvf_Metric_Calculator.METRIC_AGIS_SUPERIOR: 9,
+            Hvf_Metric_Calculator.METRIC_AGIS_INFERIOR: 9,
+        }
+        for region in range(Hvf_Metric_Calculator.NUMBER_REGIONS):
+            expected_metrics[Hvf_Metric_Calculator.METRIC_REGION_TD + str(region)] = -30
+
+        list_of_cases.append(
+            (
+                "uniform 30 dB",
+                Hvf_Test.get_uniform_plot_grids(
+                    Hvf_Value.VALUE_BELOW_THRESHOLD, -30, Hvf_Perc_Icon.PERC_HALF_PERCENTILE
+                ),
+                {Hvf_Object.KEYLABEL_LATERALITY: Hvf_Object.HVF_OD, Hvf_Object.KEYLABEL_MD: "-30.00"},
+                expected_metrics,
+            )
+        )
+
+        # Central 15 dB defect (the 4 ring 0 points) with pattern plots not
+        # generated, so VFI uses total deviation probabilities:
+        # 	VFI - ring 0 points score 50%, others 100%, weighted by ring
+        # 	CIGTS - each central point has only 1 neighbour in its hemifield, 0
+        # 	AGIS - 2 clustered points per hemifield is below the first bin, 0
+        # 	Regional TD - regions 0 and 1 hold 2 of the defective points each
+        plot_grids = Hvf_Test.get_uniform_plot_grids(30, 0, Hvf_Perc_Icon.PERC_NORMAL, is_pattern_generated=False)
+
+        for x, y in [(4, 4), (5, 4), (4, 5), (5, 5)]:
+            plot_grids[Hvf_Corpus.PLOT_RAW, x, y] = 15
+            plot_grids[Hvf_Corpus.PLOT_TDV, x, y] = -15
+            plot_grids[Hvf_Corpus.PLOT_TDP, x, y] = Hvf_Perc_Icon.PERC_HALF_PERCENTILE
+
+        ring_weight_sums = [size * weight for size, weight in zip(ring_sizes, ring_weights)]
+
+        expected_metrics = {
+            Hvf_Metric_Calculator.METRIC_VFI: (50 * ring_weight_sums[0] + 100 * sum(ring_weight_sums[1:]))
+            / sum(ring_weight_sums),
+            Hvf_Metric_Calculator.METRIC_CIGTS_TDP: 0,
+            Hvf_Metric_Calculator.METRIC_CIGTS_PDP: np.nan,
+            Hvf_Metric_Calculator.METRIC_AGIS: 0,
+            Hvf_Metric_Calculator.METRIC_REGION_TD + "0": -10,
+            Hvf_Metric_Calculator.METRIC_REGION_TD + "1": -10,
+            Hvf_Metric_Calculator.METRIC_REGION_TD + "2": 0,
+            Hvf_Metric_Calculator.METRIC_REGION_PD + "0": np.nan,
+        }
+
+        list_of_cases.append(
+            (
+                "central 15 dB",
+                plot_grids,
+                {Hvf_Object.KEYLABEL_LATERALITY: Hvf_Object.HVF_OD, Hvf_Object.KEYLABEL_MD: "-1.00"},
+                expected_metrics,
+            )
+        )
+
+        return list_of_cases
+
+    ###############################################################################
+    # Helper for batch metrics benchmark - given a percentile plot grid (as in
+    # Hvf_Corpus.get_plot_grids, indexed [x, y]) and whether it is a right eye,
+    # returns its global CIGTS score, computed cell by cell as the original
+    # per-exam implementation did: each defective icon scores its depth, capped at
+    # the deepest icon found at 2+ of its neighbours in the same hemifield
+    @staticmethod
+    def get_reference_cigts_score(perc_grid, is_right):
+
+        icon_scores = {
+            Hvf_Perc_Icon.PERC_NORMAL: 0,
+            Hvf_Perc_Icon.PERC_5_PERCENTILE: 1,
+            Hvf_Perc_Icon.PERC_2_PERCENTILE: 2,
+            Hvf_Perc_Icon.PERC_1_PERCENTILE: 3,
+            Hvf_Perc_Icon.PERC_HALF_PERCENTILE: 4,
+        }
+
+        # Right eye format, 24-2 points only:
+        perc_array = np.array(perc_grid)
+        if not is_right:
+            perc_array = perc_array[::-1, :]
+
+        perc_array[~np.array(Hvf_Plot_Array.BOOLEAN_MASK_24_2, dtype=bool).T] = Hvf_Perc_Icon.PERC_NO_VALUE
+
+        cigts_score = 0
+
+        for y in range(0, np.size(perc_array, 1)):
+            for x in range(0, np.size(perc_array, 0)):
+                element = perc_array[x, y]
+
+                if element == Hvf_Perc_Icon.PERC_NORMAL or element not in icon_scores:
+                    continue
+
+                icon_counter_dict = {icon: 0 for icon in icon_scores}
+
+                for jj in range(y - 1, y + 2):
+                    for ii in range(x - 1, x + 2):
+
+                        if (ii, jj) == (x, y):
+                            continue
+
+                        if not (0 <= jj < np.size(perc_array, 1) and 0 <= ii < np.size(perc_array, 0)):
+                            continue
+
+                        # Skip if not in same vertical hemisphere:
+                        if ((y == 4) and (jj == 5)) or ((y == 5) and (jj == 4)):
+                            continue
+
+                        if perc_array[ii, jj] in icon_scores:
+                            icon_counter_dict[perc_array[ii, jj]] = icon_counter_dict[perc_array[ii, jj]] + 1
+
+                max_adjacent_score = max(
+                    [icon_scores[icon] for icon, count in icon_counter_dict.items() if count >= 2], default=0
+                )
+
+                cigts_score = cigts_score + min(icon_scores[element], max_adjacent_score)
+
+        return int(cigts_score / 10.4)
+
+    ###############################################################################
+    # Helper for layout classifier training/benchmark - returns list of (name,
+    # grayscale image, layout version) for the image vs serialization unit test
+    # corpus (layout versions from the reference serializations), up to
+    # max_images images
+    @staticmethod
+    def get_layout_corpus(max_images):
+
+        list_of_layout_cases = []
+        test_type_path = os.path.join(Hvf_Test.UNIT_TEST_MASTER_PATH, Hvf_Test.UNIT_TEST_IMAGE_VS_SERIALIZATION)
+
+        if not os.path.isdir(test_type_path):
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_ERROR, f"Unit test directory '{test_type_path}' does not exist"
+            )
+            return list_of_layout_cases
+
+        for sub_dir in sorted(os.listdir(test_type_path)):
+            test_data_path = os.path.join(test_type_path, sub_dir, Hvf_Test.UNIT_TEST_TEST_DIR)
+            reference_data_path = os.path.join(test_type_path, sub_dir, Hvf_Test.UNIT_TEST_REFERENCE_DIR)
+
+            if not os.path.isdir(test_data_path):
+                continue
+
+            for hvf_file in sorted(os.listdir(test_data_path)):
+
+                # Skip hidden files:
+                if hvf_file.startswith("."):
+                    continue
+
+                if len(list_of_layout_cases) >= max_images:
+                    return list_of_layout_cases
+
+                filename_root, ext = os.path.splitext(hvf_file)
+
+                reference_path = os.path.join(reference_data_path, filename_root + ".txt")
+                serialization = File_Utils.read_text_from_file(reference_path)
+                layout_version = Hvf_Object.get_hvf_object_from_text(serialization).metadata.get(
+                    Hvf_Object.KEYLABEL_LAYOUT
+                )
+
+                hvf_image = File_Utils.read_image_from_file(os.path.join(test_data_path, hvf_file))
+
+                list_of_layout_cases.append(
+                    (os.path.join(sub_dir, hvf_file), cv2.cvtColor(hvf_image, cv2.COLOR_BGR2GRAY), layout_version)
+                )
+
+        return list_of_layout_cases
+
+    ###############################################################################
+    # Trains the layout classifier on the image vs serialization unit test corpus.
+    # First evaluates it by k-fold cross validation (see
+    # evaluate_layout_classifier), reporting accuracy on held-out images and time
+    # per image, then trains on all images and saves the classifier's model file
+    @staticmethod
+    def train_layout_classifier():
+
+        Logger.get_logger().set_logger_level(Logger.DEBUG_FLAG_SYSTEM)
+
+        list_of_layout_cases = Hvf_Test.get_layout_corpus(Hvf_Test.BENCHMARK_DEFAULT_ITERATIONS)
+
+        if len(list_of_layout_cases) == 0:
+            return ""
+
+        Hvf_Test.evaluate_layout_classifier(list_of_layout_cases)
+
+        time_start = time.perf_counter()
+        Hvf_Layout_Classifier.train_from_images(
+            [image for name, image, layout_version in list_of_layout_cases],
+            [layout_version for name, image, layout_version in list_of_layout_cases],
+        )
+        training_time = time.perf_counter() - time_start
+
+        Hvf_Layout_Classifier.save_model()
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Saved layout classifier trained on {len(list_of_layout_cases)} images ({training_time:.1f} s) to "
+            + Hvf_Layout_Classifier.get_model_path(),
+        )
+
+        return ""
+
+    ###############################################################################
+    # Helper for layout classifier training/benchmark - given list of (name,
+    # grayscale image, layout version) (see get_layout_corpus), evaluates the
+    # classifier by k-fold cross validation: images are split into
+    # LAYOUT_CLASSIFIER_FOLDS folds, and each fold is classified by a classifier
+    # trained on the other folds. Reports (and returns) the number of images
+    # classified confidently, the number of those agreeing with the reference
+    # layout version, and total classification time (seconds). Leaves the
+    # classifier trained on the last training split
+    @staticmethod
+    def evaluate_layout_classifier(list_of_layout_cases):
+
+        list_of_layouts = np.array([layout_version for name, image, layout_version in list_of_layout_cases])
+        signature_matrix = np.stack(
+            [Hvf_Layout_Classifier.get_signature(image) for name, image, layout_version in list_of_layout_cases]
+        )
+
+        num_images = len(list_of_layout_cases)
+        num_folds = min(Hvf_Test.LAYOUT_CLASSIFIER_FOLDS, num_images)
+        fold_indices = np.arange(num_images) % num_folds
+
+        num_confident = 0
+        num_agreeing = 0
+        classifier_time = 0.0
+
+        for fold in range(num_folds):
+            is_training = ~(fold_indices == fold)
+
+            # A single image cannot be held out from itself:
+            if not np.any(is_training):
+                is_training = np.ones(num_images, dtype=bool)
+
+            Hvf_Layout_Classifier.train_from_signatures(signature_matrix[is_training], list_of_layouts[is_training])
+
+            for ii in np.flatnonzero(fold_indices == fold):
+                name, image, layout_version = list_of_layout_cases[ii]
+
+                time_start = time.perf_counter()
+                classified_layout = Hvf_Object.get_classified_layout_version(image, np.size(image, 1))
+                classifier_time = classifier_time + time.perf_counter() - time_start
+
+                if classified_layout is None:
+                    continue
+
+                num_confident = num_confident + 1
+
+                if classified_layout == layout_version:
+                    num_agreeing = num_agreeing + 1
+                else:
+                    Logger.get_logger().log_msg(
+                        Logger.DEBUG_FLAG_SYSTEM, f"{name}: classified {classified_layout}, reference {layout_version}"
+                    )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Layout classifier ({num_folds}-fold, held-out images): {num_images} images, {num_confident} confident "
+            + f"({num_images - num_confident} OCR fallbacks), {num_agreeing} of {num_confident} agreeing with "
+            + f"reference ({num_agreeing / max(num_images, 1) * 100:.1f}% of all images), "
+            + f"{classifier_time / num_images * 1000:.1f} ms/image",
+        )
+
+        return num_confident, num_agreeing, classifier_time
+
+    ###############################################################################
+    # Evaluates the layout classifier on the image vs serialization unit test corpus
+    # (up to num_iterations images) by k-fold cross validation (see
+    # evaluate_layout_classifier), and compares time per image of classification
+    # vs OCR layout detection (OCR timed only if tesserocr is available). Does not
+    # change the saved model
+    @staticmethod
+    def benchmark_layout_classifier(num_iterations):
+
+        list_of_layout_cases = Hvf_Test.get_layout_corpus(num_iterations)
+
+        if len(list_of_layout_cases) == 0:
+            return ""
+
+        num_images = len(list_of_layout_cases)
+        num_confident, num_agreeing, classifier_time = Hvf_Test.evaluate_layout_classifier(list_of_layout_cases)
+
+        # OCR layout detection, for comparison (classifier untrained, so always used):
+        Hvf_Layout_Classifier.set_centroids(None, [])
+
+        try:
+            Hvf_Object.debug_dir = ""
+            Hvf_Object.rekognition = False
+
+            time_start = time.perf_counter()
+            num_ocr_agreeing = sum(
+                Hvf_Object.find_image_layout_version(Hvf_Object, Image_Context(image), np.size(image, 1))
+                == layout_version
+                for name, image, layout_version in list_of_layout_cases
+            )
+            ocr_time = time.perf_counter() - time_start
+
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"OCR layout detection: {num_ocr_agreeing} of {num_images} agreeing with reference, "
+                + f"{ocr_time / num_images * 1000:.1f} ms/image; classifier saves "
+                + f"{(ocr_time / num_images * num_confident - classifier_time) / num_images * 1000:.1f} ms/image",
+            )
+
+        except ImportError:
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "OCR layout detection not timed (no tesserocr)")
+
+        # Restore the saved model:
+        Hvf_Layout_Classifier.initialize_class_vars()
+
+        return ""
+
+    ###############################################################################
+    # Compares full page upscaling vs ROI-only upscaling (see
+    # Hvf_Object.get_hvf_object_from_image) on the image vs serialization unit tests
+    # (up to num_iterations images). Extracts each image both ways (with the
+    # extraction cache off), and reports time per image of each, errors of each
+    # against the serialized references, and the metadata fields and plot values
+    # where ROI-only upscaling differs from full page upscaling (only low
+    # resolution images are upscaled, so only those can differ)
+    @staticmethod
+    def benchmark_roi_upscale(num_iterations):
+
+        list_of_references = Hvf_Test.get_unit_test_references()[:num_iterations]
+
+        if len(list_of_references) == 0:
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, "No image vs serialization unit tests to compare")
+            return ""
+
+        extraction_cache = Hvf_Object.extraction_cache
+        Hvf_Object.extraction_cache = None
+
+        list_of_results = []
+
+        try:
+            for name, hvf_image, reference_hvf_obj in list_of_references:
+                list_of_hvf_objs = []
+
+                for roi_upscale in [False, True]:
+                    time_start = time.perf_counter()
+                    hvf_obj = Hvf_Object.get_hvf_object_from_image(hvf_image, roi_upscale=roi_upscale)
+                    time_elapsed = time.perf_counter() - time_start
+
+                    testing_data_dict, testing_msgs = Hvf_Test.test_hvf_obj(name, reference_hvf_obj, hvf_obj, 0)
+                    testing_data_dict["time"] = time_elapsed
+
+                    list_of_hvf_objs.append(hvf_obj)
+                    list_of_results.append((roi_upscale, testing_data_dict))
+
+                # Differences of ROI-only vs full page upscaling:
+                full_hvf_obj, roi_hvf_obj = list_of_hvf_objs
+                difference_dict, testing_msgs = Hvf_Test.test_hvf_obj(name, full_hvf_obj, roi_hvf_obj, 0)
+                list_of_results.append((None, difference_dict))
+
+                # Log where they differ:
+                if not full_hvf_obj.equals(roi_hvf_obj):
+                    for msg in testing_msgs[1:]:
+                        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, msg)
+
+        finally:
+            Hvf_Object.extraction_cache = extraction_cache
+
+        num_images = len(list_of_references)
+
+        for roi_upscale, method_name in [(False, "Full page"), (True, "ROI only"), (None, "ROI only vs full page")]:
+            list_of_data_dicts = [data_dict for result_type, data_dict in list_of_results if result_type is roi_upscale]
+
+            counts = {
+                key: sum(len(data_dict[key]) for data_dict in list_of_data_dicts)
+                for key in ["metadata_errors", "value_plot_errors", "perc_plot_errors"]
+            }
+            num_identical = sum(all(len(data_dict[key]) == 0 for key in counts) for data_dict in list_of_data_dicts)
+
+            if roi_upscale is None:
+                summary = f"{num_identical} of {num_images} images identical"
+            else:
+                total_time = sum(data_dict["time"] for data_dict in list_of_data_dicts)
+                summary = (
+                    f"{total_time / num_images * 1000:.0f} ms/image, {num_identical} of {num_images} matching reference"
+                )
+
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"{method_name}: {summary}; differences - {counts['metadata_errors']} metadata fields, "
+                + f"{counts['value_plot_errors']} value plot cells, {counts['perc_plot_errors']} percentile plot cells",
+            )
+
+        return ""
+
+    ###############################################################################
+    # Helper for Rekognition benchmark - starts a local stand-in Rekognition
+    # endpoint on a background thread, answering every DetectText request with the
+    # same text detections after the given latency (seconds). Returns the server;
+    # its endpoint is http://127.0.0.1:<server.server_port>, and server.num_requests
+    # counts requests served. Call server.shutdown() when done
+    @staticmethod
+    def start_rekognition_stub_server(latency):
+
+        response_body = json.dumps(
+            {
+                "TextDetections": [
+                    {
+                        "DetectedText": "Stimulus: III, White",
+                        "Type": "LINE",
+                        "Id": 0,
+                        "Confidence": 99.0,
+                        "Geometry": {"BoundingBox": {"Width": 0.5, "Height": 0.05, "Left": 0.1, "Top": 0.1}},
+                    }
+                ]
+                + [
+                    {
+                        "DetectedText": word,
+                        "Type": "WORD",
+                        "Id": ii + 1,
+                        "ParentId": 0,
+                        "Confidence": 99.0,
+                        "Geometry": {"BoundingBox": {"Width": 0.15, "Height": 0.05, "Left": left, "Top": 0.1}},
+                    }
+                    for ii, (word, left) in enumerate([("Stimulus:", 0.1), ("III,", 0.27), ("White", 0.44)])
+                ]
+            }
+        ).encode()
+
+        class Rekognition_Stub_Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(latency)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+                with server_lock:
+                    server.num_requests = server.num_requests + 1
+
+            def log_message(self, format, *args):
+                pass
+
+        server_lock = threading.Lock()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Rekognition_Stub_Handler)
+        server.daemon_threads = True
+        server.num_requests = 0
+
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return server
+
+    ###############################################################################
+    # Load tests the Rekognition backend: OCRs the header crops of up to
+    # BENCHMARK_REKOGNITION_MAX_PAGES generated pages one request after another (as
+    # before batching), then batched per page, then all pages as one batch, then as
+    # one composite image per page (see Ocr_Utils.perform_composite_word_ocr),
+    # reporting pages per second of each and checking batches give identical texts.
+    # Uses the endpoint in Ocr_Utils.REKOGNITION_ENDPOINT_ENV if set (this makes
+    # real, billed requests against AWS if it is not a stand-in); otherwise starts a
+    # local stand-in endpoint (see start_rekognition_stub_server) with placeholder
+    # credentials, so the load test runs offline
+    @staticmethod
+    def benchmark_rekognition(num_iterations):
+
+        num_pages = min(num_iterations, Hvf_Test.BENCHMARK_REKOGNITION_MAX_PAGES)
+
+        # Header-sized crops of binarized text (black marks on white):
+        rng = np.random.default_rng(0)
+        list_of_pages = []
+        for ii in range(num_pages):
+            list_of_crops = []
+            for jj in range(Hvf_Test.BENCHMARK_REKOGNITION_CROPS_PER_PAGE):
+                crop = np.full((675, 800), 255, dtype=np.uint8)
+                for y in range(40, 640, 60):
+                    x_end = int(rng.integers(200, 760))
+                    crop[y : y + 24, 40:x_end] = 0
+
+                list_of_crops.append(crop)
+
+            list_of_pages.append(list_of_crops)
+
+        server = None
+
+        # Environment variables set for the benchmark, and their previous values
+        # (None if unset) to restore afterwards:
+        saved_environ = {}
+
+        if not os.environ.get(Ocr_Utils.REKOGNITION_ENDPOINT_ENV):
+            server = Hvf_Test.start_rekognition_stub_server(Hvf_Test.BENCHMARK_REKOGNITION_STUB_LATENCY)
+
+            environ_settings = {Ocr_Utils.REKOGNITION_ENDPOINT_ENV: f"http://127.0.0.1:{server.server_port}"}
+            for key, value in [
+                ("AWS_ACCESS_KEY_ID", "benchmark"),
+                ("AWS_SECRET_ACCESS_KEY", "benchmark"),
+                ("AWS_DEFAULT_REGION", "us-east-1"),
+            ]:
+                if key not in os.environ:
+                    environ_settings[key] = value
+
+            saved_environ = {key: os.environ.get(key) for key in environ_settings}
+            os.environ.update(environ_settings)
+
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"Using local stand-in endpoint {os.environ[Ocr_Utils.REKOGNITION_ENDPOINT_ENV]} "
+                + f"({Hvf_Test.BENCHMARK_REKOGNITION_STUB_LATENCY * 1000:.0f} ms/request)",
+            )
+
+        try:
+            # One request after another:
+            time_start = time.perf_counter()
+            list_of_serial_texts = [
+                [Ocr_Utils.perform_ocr(crop, rekognition=True) for crop in list_of_crops]
+                for list_of_crops in list_of_pages
+            ]
+            serial_time = time.perf_counter() - time_start
+
+            # Batched per page:
+            time_start = time.perf_counter()
+            list_of_page_texts = [
+                Ocr_Utils.perform_ocr_batch(list_of_crops, rekognition=True) for list_of_crops in list_of_pages
+            ]
+            page_time = time.perf_counter() - time_start
+
+            # All pages in one batch:
+            time_start = time.perf_counter()
+            list_of_all_texts = Ocr_Utils.perform_ocr_batch(
+                [crop for list_of_crops in list_of_pages for crop in list_of_crops], rekognition=True
+            )
+            all_time = time.perf_counter() - time_start
+
+            # One composite image per page (stand-in answers do not depend on the
+            # image, so composite texts are not compared):
+            num_requests_start = 0 if server is None else server.num_requests
+
+            time_start = time.perf_counter()
+            for list_of_crops in list_of_pages:
+                Ocr_Utils.perform_composite_word_ocr(list_of_crops)
+            composite_time = time.perf_counter() - time_start
+
+            num_composite_requests = None if server is None else server.num_requests - num_requests_start
+
+        finally:
+            for key, value in saved_environ.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        num_requests = num_pages * Hvf_Test.BENCHMARK_REKOGNITION_CROPS_PER_PAGE
+        is_identical = (list_of_serial_texts == list_of_page_texts) and (
+            [text for list_of_texts in list_of_serial_texts for text in list_of_texts] == list_of_all_texts
+        )
+
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM,
+            f"Rekognition: {num_pages} pages, {num_requests} requests per run, "
+            + f"at most {Ocr_Utils.REKOGNITION_MAX_IN_FLIGHT} in flight",
+        )
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"One at a time: {num_pages / serial_time:.1f} pages/s")
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Batched per page: {num_pages / page_time:.1f} pages/s")
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Batched all pages: {num_pages / all_time:.1f} pages/s")
+        Logger.get_logger().log_msg(
+            Logger.DEBUG_FLAG_SYSTEM, f"Composite per page: {num_pages / composite_time:.1f} pages/s"
+        )
+        Logger.get_logger().log_msg(Logger.DEBUG_FLAG_SYSTEM, f"Texts identical: {is_identical}")
+
+        if server is not None:
+            Logger.get_logger().log_msg(
+                Logger.DEBUG_FLAG_SYSTEM,
+                f"Stand-in requests served: {server.num_requests} ({num_composite_requests} for composites)",
+            )
+
+        return ""
@@ -0,0 +1,248 @@
+###############################################################################
+# disk_cache.py
+#
+# Description:
+# 	Class definition for a simple content-addressed, size-capped on-disk cache
+# 	of strings. Each entry is one file in the cache directory, named by its key.
+# 	When the total size of entries exceeds the cap, least recently used entries
+# 	(by file modification time, which is refreshed on every hit) are evicted.
+#
+# 	Writes are atomic (write to temp file then rename), so several processes can
+# 	share the same cache directory; an entry evicted by another process simply
+# 	becomes a cache miss.
+#
+# 	The size cap applies to the directory as a whole, across all processes
+# 	sharing it: the total size of entries is kept in a lock file in the cache
+# 	directory, and updated under an exclusive file lock on every write. When the
+# 	total goes over the cap, the directory is re-indexed and the least recently
+# 	used entries of any process are evicted. File locking needs fcntl (not
+# 	available on Windows); without it, updates of the total may race, so the cap
+# 	is only approximate when several processes write at once.
+#
+# 	Usage:
+# 		cache = Disk_Cache(cache_dir, max_size_bytes)
+# 		key = Disk_Cache.get_hash_key([b"some", b"content"])
+# 		value = cache.get(key)
+# 		if value is None:
+# 			value = < compute >
+# 			cache.put(key, value)
+#
+###############################################################################
+
+# Import necessary packages
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Import logger class to handle any messages:
+from hvf_extraction_script.utilities.logger import Logger
+
+
+class Disk_Cache:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    CACHE_FILE_EXTENSION = ".cache"
+
+    # Lock file in the cache directory, holding the total size of entries (bytes)
+    LOCK_FILE_NAME = "cache.lock"
+
+    # Default size cap (bytes)
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    ###############################################################################
+    # CONSTRUCTOR AND FACTORY METHODS #############################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer method
+    # Given cache directory (made if it does not exist) and size cap in bytes,
+    # indexes any existing entries and evicts down to the cap
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Key -> entry size, ordered from least to most recently used (as of the
+        # last index of the directory)
+        self.entry_sizes = OrderedDict()
+        self.total_size = 0
+
+        # Cap may have been lowered since last use
+        with self.lock_directory() as lock_file:
+            self.index_entries()
+            self.evict()
+            Disk_Cache.write_shared_total_size(lock_file, self.total_size)
+
+    ###############################################################################
+    # HELPER METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given a list of bytes-like objects, returns a hex digest key of their content
+    @staticmethod
+    def get_hash_key(list_of_bytes):
+
+        key_hash = hashlib.sha256()
+
+        for content in list_of_bytes:
+            key_hash.update(content)
+
+        return key_hash.hexdigest()
+
+    ###############################################################################
+    # Given key, returns path to the entry file
+    def get_entry_path(self, key):
+
+        return os.path.join(self.cache_dir, key + Disk_Cache.CACHE_FILE_EXTENSION)
+
+    ###############################################################################
+    # Opens the lock file and takes an exclusive lock on it (if fcntl is
+    # available). Returns the open lock file, for use in a with statement - the
+    # lock is released when it is closed
+    def lock_directory(self):
+
+        lock_file = open(os.path.join(self.cache_dir, Disk_Cache.LOCK_FILE_NAME), "a+")
+
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except BaseException:
+                lock_file.close()
+                raise
+
+        return lock_file
+
+    ###############################################################################
+    # Given the open lock file, returns the total size of entries it holds, or
+    # None if it holds none (eg, it was just created)
+    @staticmethod
+    def read_shared_total_size(lock_file):
+
+        lock_file.seek(0)
+
+        try:
+            return int(lock_file.read())
+        except ValueError:
+            return None
+
+    ###############################################################################
+    # Given the open lock file and total size of entries, writes it to the file
+    @staticmethod
+    def write_shared_total_size(lock_file, total_size):
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(total_size))
+        lock_file.flush()
+
+    ###############################################################################
+    # Indexes the entries in the cache directory (written by any process), in
+    # least-to-most recently used order
+    def index_entries(self):
+
+        self.entry_sizes = OrderedDict()
+        self.total_size = 0
+
+        list_of_entries = []
+        for file_name in os.listdir(self.cache_dir):
+
+            key, ext = os.path.splitext(file_name)
+            if not (ext == Disk_Cache.CACHE_FILE_EXTENSION):
+                continue
+
+            try:
+                file_stat = os.stat(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                # Evicted by another process (without fcntl)
+                continue
+
+            list_of_entries.append((file_stat.st_mtime, key, file_stat.st_size))
+
+        for mtime, key, size in sorted(list_of_entries):
+            self.entry_sizes[key] = size
+            self.total_size = self.total_size + size
+
+    ###############################################################################
+    # Evicts least recently used entries until total size is within the cap
+    def evict(self):
+
+        while self.total_size > self.max_size and self.entry_sizes:
+
+            key, size = self.entry_sizes.popitem(last=False)
+            self.total_size = self.total_size - size
+
+            try:
+                os.remove(self.get_entry_path(key))
+            except OSError:
+                pass
+
+            Logger.get_logger().log_msg(Logger.DEBUG_FLAG_DEBUG, "Evicted cache entry " + key)
+
+    ###############################################################################
+    # CACHE METHODS ###############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Given key, returns cached string, or None if not present. Marks entry as most
+    # recently used
+    def get(self, key):
+
+        entry_path = self.get_entry_path(key)
+
+        try:
+            with open(entry_path) as f:
+                content = f.read()
+
+            os.utime(entry_path)
+
+        except OSError:
+            # Not present (or evicted by another process)
+            return None
+
+        return content
+
+    ###############################################################################
+    # Given key and string, stores string in the cache, then evicts least recently
+    # used entries (of any process sharing the directory) if over the size cap
+    def put(self, key, content):
+
+        # Write to temp file then rename, so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+
+        entry_path = self.get_entry_path(key)
+
+        with self.lock_directory() as lock_file:
+            try:
+                replaced_size = os.path.getsize(entry_path)
+            except OSError:
+                replaced_size = 0
+
+            os.replace(temp_path, entry_path)
+
+            total_size = Disk_Cache.read_shared_total_size(lock_file)
+
+            if total_size is None:
+                self.index_entries()
+                total_size = self.total_size
+            else:
+                total_size = total_size + os.path.getsize(entry_path) - replaced_size
+
+            if total_size > self.max_size:
+                self.index_entries()
+                self.evict()
+                total_size = self.total_size
+
+            Disk_Cache.write_shared_total_size(lock_file, total_size)
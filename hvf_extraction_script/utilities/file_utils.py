@@ -7,6 +7,7 @@
 ###############################################################################
 
 # Import necessary packages
+import hashlib
 import os
 
 import cv2
@@ -80,10 +81,14 @@ class File_Utils:
 
     ###############################################################################
     # Given file path, reads DICOM object from file
+    # With stop_before_pixels, pixel data (and anything after it) is not read, and
+    # with defer_size (eg, "1 KB"), values larger than that (eg, encapsulated
+    # documents) are only read from the file if accessed - use these when only tag
+    # values are needed
     @staticmethod
-    def read_dicom_from_file(file_path):
+    def read_dicom_from_file(file_path, stop_before_pixels=False, defer_size=None):
 
-        return pydicom.dcmread(file_path)
+        return pydicom.dcmread(file_path, defer_size=defer_size, stop_before_pixels=stop_before_pixels)
 
     ###############################################################################
     # Given directory path, reads cv2 images from all files within the directory
@@ -105,6 +110,20 @@ class File_Utils:
 
         return return_dict
 
+    ###############################################################################
+    # Given file path, returns SHA-256 hex digest of the file contents. Reads the
+    # file in chunks so large files do not need to fit in memory
+    @staticmethod
+    def get_file_hash(file_path, chunk_size=1 << 20):
+
+        file_hash = hashlib.sha256()
+
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
     ###############################################################################
     # Given file path, reads in content as string and returns it
     @staticmethod
@@ -170,6 +189,14 @@ class File_Utils:
     @staticmethod
     def get_writing_fh(file_path):
         fh = open(file_path, "w+")
+        return fh
+
+    ###############################################################################
+    # Gets a file handle for reading (eg, to read a large file line by line)
+    @staticmethod
+    def get_reading_fh(file_path):
+        fh = open(file_path, "r")
+        return fh
 
     ###############################################################################
     # Writes a line to the file handler
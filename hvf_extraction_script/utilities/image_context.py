@@ -0,0 +1,295 @@
+###############################################################################
+# image_context.py
+#
+# Description:
+# 	Class definition for a per-document image processing context. Wraps the
+# 	grayscale image of a single HVF printout and computes each full-page
+# 	processed variant (eg, binarized for plot detection, binarized for text
+# 	OCR) at most once, on first use. All extractors for the same printout share
+# 	one context, so no full-page operation is repeated per plot.
+#
+# 	A context can also be given a scale factor, in which case it presents the
+# 	image as if it had been upscaled by that factor (all coordinates and sizes
+# 	are those of the upscaled image), but only upscales the regions that are
+# 	actually sliced out. Processed variants of those regions are computed from
+# 	the upscaled region plus a small margin, so they match slices of the
+# 	processed full upscaled page.
+#
+# 	Slices returned are NumPy views into shared images and must be treated as
+# 	read only - copy a slice before drawing on it.
+#
+# 	Full-page variants are computed under a per-variant lock, so a context can be
+# 	shared between extraction threads.
+#
+# 	Usage:
+# 		image_context = Image_Context(hvf_image_gray)
+# 		plot_slice = image_context.get_slice(Image_Context.VARIANT_PREPROCESSED, 0.4, 0.3, 0.0, 0.4)
+#
+###############################################################################
+
+# Import necessary packages
+import threading
+
+import cv2
+import numpy as np
+
+# General purpose image functions:
+from hvf_extraction_script.utilities.image_utils import Image_Utils
+
+
+class Image_Context:
+
+    ###############################################################################
+    # CONSTANTS AND STATIC VARIABLES ##############################################
+    ###############################################################################
+
+    # Image variants:
+    # Grayscale image, as passed in (upscaled, if there is a scale factor)
+    VARIANT_GRAY = "gray"
+
+    # Binarized for plot/bounding box detection (see Image_Utils.preprocess_image)
+    VARIANT_PREPROCESSED = "preprocessed"
+
+    # Binarized for text OCR (see Image_Utils.binarize_text_image)
+    VARIANT_TEXT = "text"
+
+    # Function to compute each variant from the grayscale image
+    VARIANT_FUNCTIONS = {
+        VARIANT_PREPROCESSED: Image_Utils.preprocess_image,
+        VARIANT_TEXT: Image_Utils.binarize_text_image,
+    }
+
+    # Margin (in upscaled pixels) added around a region before processing it, so
+    # neighbourhood operations (adaptive threshold block size 11) see the same
+    # pixels as they would on the full page
+    REGION_MARGIN = 8
+
+    # Margin (in source pixels) added around a region before upscaling it, so
+    # cubic interpolation sees the same neighbouring pixels as on the full page
+    SOURCE_MARGIN = 3
+
+    # Maximum number of extra source pixels to include before a region so its
+    # upscaled pixels line up with the full upscaled page
+    SOURCE_ALIGNMENT_SEARCH = 32
+
+    ###############################################################################
+    # CONSTRUCTOR AND FACTORY METHODS #############################################
+    ###############################################################################
+
+    ###############################################################################
+    # Initializer method
+    # Takes in grayscale image (as NumPy array), and optionally the factor it is
+    # to be upscaled by (upscaling is done per region sliced, with INTER_CUBIC)
+    def __init__(self, image_gray, scale_factor=1.0):
+
+        self.image_gray = image_gray
+        self.scale_factor = scale_factor
+
+        self.variants = {}
+        if scale_factor == 1.0:
+            self.variants[Image_Context.VARIANT_GRAY] = image_gray
+
+        self.variant_locks = {Image_Context.VARIANT_GRAY: threading.Lock()}
+        for variant in Image_Context.VARIANT_FUNCTIONS:
+            self.variant_locks[variant] = threading.Lock()
+
+        # Upscaled regions, by (variant, slice parameters)
+        self.region_slices = {}
+
+    ###############################################################################
+    # Factory method - given either a grayscale image or an existing context,
+    # returns a context for it (existing contexts are returned as is)
+    @staticmethod
+    def get_image_context(image_or_context):
+
+        if isinstance(image_or_context, Image_Context):
+            return image_or_context
+
+        return Image_Context(image_or_context)
+
+    ###############################################################################
+    # OBJECT METHODS ##############################################################
+    ###############################################################################
+
+    ###############################################################################
+    # Simple accessor for height of the (upscaled) image
+    def get_height(self):
+        return int(round(np.size(self.image_gray, 0) * self.scale_factor))
+
+    ###############################################################################
+    # Simple accessor for width of the (upscaled) image
+    def get_width(self):
+        return int(round(np.size(self.image_gray, 1) * self.scale_factor))
+
+    ###############################################################################
+    # Returns True if regions are upscaled on demand (ie, there is a scale factor)
+    def is_region_upscaling(self):
+        return not (self.scale_factor == 1.0)
+
+    ###############################################################################
+    # Given variant name, returns the full-page image for that variant, computing
+    # it first if this is the first request for it. With a scale factor, this
+    # upscales the entire page - use get_slice where possible
+    def get_image(self, variant=VARIANT_GRAY):
+
+        image = self.variants.get(variant)
+
+        if image is None:
+            with self.variant_locks[variant]:
+
+                # Another thread may have computed it while we waited
+                image = self.variants.get(variant)
+
+                if image is None:
+                    if variant == Image_Context.VARIANT_GRAY:
+                        image = cv2.resize(
+                            self.image_gray,
+                            (self.get_width(), self.get_height()),
+                            interpolation=cv2.INTER_CUBIC,
+                        )
+                    else:
+                        image = Image_Context.VARIANT_FUNCTIONS[variant](self.get_image(Image_Context.VARIANT_GRAY))
+
+                    self.variants[variant] = image
+
+        return image
+
+    ###############################################################################
+    # Given variant name and slice parameters (fractions of image size, as in
+    # Image_Utils.slice_image), returns that region of the variant
+    def get_slice(self, variant, y_ratio, y_size, x_ratio, x_size):
+
+        # Already have the full page (always the case without a scale factor):
+        if variant in self.variants or not self.is_region_upscaling():
+            return Image_Utils.slice_image(self.get_image(variant), y_ratio, y_size, x_ratio, x_size)
+
+        region_key = (variant, y_ratio, y_size, x_ratio, x_size)
+        region = self.region_slices.get(region_key)
+
+        # Two threads asking for the same new region at once may both compute it;
+        # results are identical so either may be kept
+        if region is None:
+            region = self.get_region(variant, y_ratio, y_size, x_ratio, x_size)
+            self.region_slices[region_key] = region
+
+        return region
+
+    ###############################################################################
+    # Given slice parameters (as in get_slice), returns the bounds of that slice in
+    # (upscaled) image pixels as (x1, y1, x2, y2), clamped to the page
+    def get_slice_box(self, y_ratio, y_size, x_ratio, x_size):
+
+        height = self.get_height()
+        width = self.get_width()
+
+        # Calculate indices the same way as Image_Utils.slice_image:
+        y1 = min(max(int(height * y_ratio), 0), height)
+        y2 = min(max(int(height * (y_ratio + y_size)), 0), height)
+
+        x1 = min(max(int(width * x_ratio), 0), width)
+        x2 = min(max(int(width * (x_ratio + x_size)), 0), width)
+
+        return x1, y1, x2, y2
+
+    ###############################################################################
+    # Computes a region of the variant, by upscaling just that region (plus a
+    # margin for processed variants)
+    def get_region(self, variant, y_ratio, y_size, x_ratio, x_size):
+
+        height = self.get_height()
+        width = self.get_width()
+
+        # Calculate indices the same way as Image_Utils.slice_image:
+        y1 = int(height * y_ratio)
+        y2 = int(height * (y_ratio + y_size))
+
+        x1 = int(width * x_ratio)
+        x2 = int(width * (x_ratio + x_size))
+
+        if variant == Image_Context.VARIANT_GRAY:
+            return self.upscale_region(y1, y2, x1, x2)
+
+        # Clamp to the page like slicing does, then add margin within page bounds:
+        y1, y2 = min(max(y1, 0), height), min(max(y2, 0), height)
+        x1, x2 = min(max(x1, 0), width), min(max(x2, 0), width)
+
+        margin_y1 = max(y1 - Image_Context.REGION_MARGIN, 0)
+        margin_y2 = min(y2 + Image_Context.REGION_MARGIN, height)
+        margin_x1 = max(x1 - Image_Context.REGION_MARGIN, 0)
+        margin_x2 = min(x2 + Image_Context.REGION_MARGIN, width)
+
+        region = Image_Context.VARIANT_FUNCTIONS[variant](
+            self.upscale_region(margin_y1, margin_y2, margin_x1, margin_x2)
+        )
+
+        return region[(y1 - margin_y1) : (y2 - margin_y1), (x1 - margin_x1) : (x2 - margin_x1)]
+
+    ###############################################################################
+    # Given the starting pixel of a region in the upscaled image, returns the source
+    # pixel to start upscaling from. This is at least SOURCE_MARGIN pixels before the
+    # region, moved back further (up to SOURCE_ALIGNMENT_SEARCH pixels) to where
+    # the source pixel lands closest to a whole upscaled pixel, so that the pixels
+    # of the upscaled region line up with those of the full upscaled page
+    def get_aligned_source_start(self, upscaled_start):
+
+        source_start = max(int(upscaled_start / self.scale_factor) - Image_Context.SOURCE_MARGIN, 0)
+
+        best_start = source_start
+        best_error = 1.0
+        for candidate in range(source_start, max(source_start - Image_Context.SOURCE_ALIGNMENT_SEARCH, -1), -1):
+            upscaled_candidate = candidate * self.scale_factor
+            error = abs(upscaled_candidate - round(upscaled_candidate))
+
+            if error < best_error - 1e-9:
+                best_start = candidate
+                best_error = error
+
+            if best_error < 1e-9:
+                break
+
+        return best_start
+
+    ###############################################################################
+    # Given pixel bounds in the upscaled image, returns that region of the upscaled
+    # grayscale image. Resizes just the corresponding source region (plus enough
+    # source pixels around it for cubic interpolation), then crops to the bounds.
+    # Matches resizing the entire page to within a fraction of an upscaled pixel
+    def upscale_region(self, y1, y2, x1, x2):
+
+        height = self.get_height()
+        width = self.get_width()
+
+        # Clamp to the page like slicing does:
+        y1, y2 = min(max(y1, 0), height), min(max(y2, 0), height)
+        x1, x2 = min(max(x1, 0), width), min(max(x2, 0), width)
+
+        if y2 <= y1 or x2 <= x1:
+            return np.zeros((max(y2 - y1, 0), max(x2 - x1, 0)), self.image_gray.dtype)
+
+        # Bounds in the source image, with margin:
+        source_y1 = self.get_aligned_source_start(y1)
+        source_y2 = min(int(np.ceil(y2 / self.scale_factor)) + Image_Context.SOURCE_MARGIN, np.size(self.image_gray, 0))
+        source_x1 = self.get_aligned_source_start(x1)
+        source_x2 = min(int(np.ceil(x2 / self.scale_factor)) + Image_Context.SOURCE_MARGIN, np.size(self.image_gray, 1))
+
+        region = cv2.resize(
+            self.image_gray[source_y1:source_y2, source_x1:source_x2],
+            None,
+            fx=self.scale_factor,
+            fy=self.scale_factor,
+            interpolation=cv2.INTER_CUBIC,
+        )
+
+        # Offset of the requested bounds within the resized region:
+        offset_y = int(round(y1 - source_y1 * self.scale_factor))
+        offset_x = int(round(x1 - source_x1 * self.scale_factor))
+
+        region = region[offset_y : (offset_y + y2 - y1), offset_x : (offset_x + x2 - x1)]
+
+        # Rounding can leave the region a pixel short at the page edge:
+        missing_h = (y2 - y1) - np.size(region, 0)
+        missing_w = (x2 - x1) - np.size(region, 1)
+        if missing_h > 0 or missing_w > 0:
+            region = cv2.copyMakeBorder(region, 0, max(missing_h, 0), 0, max(missing_w, 0), cv2.BORDER_REPLICATE)
+
+        return region
@@ -6,8 +6,6 @@
 #
 ###############################################################################
 
-from functools import reduce
-
 # Import necessary packages
 import cv2
 
@@ -26,6 +24,15 @@ class Image_Utils:
     # CONSTANTS AND STATIC VARIABLES ##############################################
     ###############################################################################
 
+    # Text line detection (see get_text_line_boxes), as fractions of image height:
+    # Width of horizontal smearing that joins characters/words of a line together
+    TEXT_LINE_JOIN_WIDTH = 0.04
+
+    # Height range of a single text line (shorter marks are specks or rules; taller
+    # ones are graphics or lines run together, eg in skewed photos)
+    TEXT_LINE_MIN_HEIGHT = 0.015
+    TEXT_LINE_MAX_HEIGHT = 0.12
+
     ###############################################################################
     # IMAGE PROCESSING METHODS ####################################################
     ###############################################################################
@@ -57,6 +64,15 @@ class Image_Utils:
 
         return image
 
+    ###############################################################################
+    # Converts grayscale image to black and white, to optimize text detection
+    @staticmethod
+    def binarize_text_image(image):
+
+        return cv2.bitwise_not(
+            cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 5)
+        )
+
     ###############################################################################
     # Given starting coordinates and corresponding slice sizes (all in fractions of
     # the total image size), slices the input image. This uses Numpy slicing
@@ -86,49 +102,161 @@ class Image_Utils:
     ###############################################################################
     # Given an image, returns the coordinates cropping the image (ie, eliminates white
     # border). Returns bounding x's and y's
+    # Each bound is kept 1px into the white border (if any); an all white image
+    # returns the last row/column as start and min(1, last) as end. Empty images
+    # return the full (empty) image bounds
     @staticmethod
     def crop_white_border(image):
 
         # Crop out the borders so we just have the central values - this allows us
         # to standardize size
         # First, crop the white border out of the element to get just the core icon:
-        x0, y0 = 0, 0
-        x1, y1 = np.size(image, 1) - 1, np.size(image, 0) - 1
+        height = np.size(image, 0)
+        width = np.size(image, 1)
+
+        if height == 0 or width == 0:
+            return 0, width - 1, 0, height - 1
 
         element_mask = image > 0
 
-        # Find bounding ys:
-        for row_index in range(0, np.size(image, 0)):
-            if reduce((lambda x, y: x and y), element_mask[row_index, :]):  # All white row
-                y0 = row_index
-                continue
-            else:  # We have at least 1 black pixel - stop
-                break
+        # Find indices of rows/columns with at least 1 black pixel:
+        nonwhite_rows = np.flatnonzero(~np.all(element_mask, axis=1))
+        nonwhite_cols = np.flatnonzero(~np.all(element_mask, axis=0))
 
-        for row_index in range(np.size(image, 0) - 1, 0, -1):
-            if reduce((lambda x, y: x and y), element_mask[row_index, :]):  # All white row
-                y1 = row_index
-                continue
-            else:  # We have at least 1 black pixel - stop
-                break
+        # Find bounding ys and xs:
+        y0, y1 = Image_Utils.get_crop_bounds(nonwhite_rows, height)
+        x0, x1 = Image_Utils.get_crop_bounds(nonwhite_cols, width)
 
-        # Find bounding xs:
-        for col_index in range(0, np.size(image, 1)):
-            if reduce((lambda x, y: x and y), element_mask[:, col_index]):  # All white row
-                x0 = col_index
-                continue
-            else:  # We have at least 1 black pixel - stop
-                break
+        return x0, x1, y0, y1
 
-        for col_index in range(np.size(image, 1) - 1, 0, -1):
-            if reduce((lambda x, y: x and y), element_mask[:, col_index]):  # All white row
-                x1 = col_index
-                continue
-            else:  # We have at least 1 black pixel - stop
-                break
+    ###############################################################################
+    # Helper for crop_white_border - given sorted indices of non-white rows (or
+    # columns) and number of rows, returns start/end bounds
+    @staticmethod
+    def get_crop_bounds(nonwhite_indices, size):
+
+        if len(nonwhite_indices) == 0:  # All white
+            return size - 1, min(1, size - 1)
+
+        start = max(int(nonwhite_indices[0]) - 1, 0)
+        end = min(int(nonwhite_indices[-1]) + 1, size - 1)
+
+        return start, end
+
+    ###############################################################################
+    # Given a list of (grayscale) images, returns them stacked into one array, each
+    # padded with white to the largest height/width, along with arrays of each
+    # image's height and width
+    @staticmethod
+    def stack_images(list_of_images):
+
+        heights = np.array([image.shape[0] for image in list_of_images], dtype=np.int64)
+        widths = np.array([image.shape[1] for image in list_of_images], dtype=np.int64)
+
+        image_stack = np.full(
+            (len(list_of_images), max(heights.max(), 0), max(widths.max(), 0)), 255, dtype=list_of_images[0].dtype
+        )
+
+        for ii, image in enumerate(list_of_images):
+            image_stack[ii, : heights[ii], : widths[ii]] = image
+
+        return image_stack, heights, widths
+
+    ###############################################################################
+    # Batched version of crop_white_border: given a stack of images with their
+    # heights and widths (see stack_images), returns arrays of bounding x's and y's,
+    # each image's bounds being those crop_white_border returns for it
+    @staticmethod
+    def crop_white_borders(image_stack, heights, widths):
+
+        element_mask = image_stack > 0
+
+        # Rows/columns of each image with at least 1 black pixel (white padding has
+        # none):
+        nonwhite_rows = ~np.all(element_mask, axis=2)
+        nonwhite_cols = ~np.all(element_mask, axis=1)
+
+        y0, y1 = Image_Utils.get_crop_bounds_batched(nonwhite_rows, heights)
+        x0, x1 = Image_Utils.get_crop_bounds_batched(nonwhite_cols, widths)
+
+        # Empty images return the full (empty) image bounds:
+        is_empty = (heights == 0) | (widths == 0)
+        x0[is_empty] = 0
+        x1[is_empty] = widths[is_empty] - 1
+        y0[is_empty] = 0
+        y1[is_empty] = heights[is_empty] - 1
 
         return x0, x1, y0, y1
 
+    ###############################################################################
+    # Helper for crop_white_borders - given a boolean array of non-white rows (or
+    # columns), one row per image, and the number of rows of each image, returns
+    # arrays of start/end bounds as get_crop_bounds would
+    @staticmethod
+    def get_crop_bounds_batched(is_nonwhite, sizes):
+
+        num_indices = np.size(is_nonwhite, 1)
+
+        has_nonwhite = np.any(is_nonwhite, axis=1)
+        first_index = np.argmax(is_nonwhite, axis=1)
+        last_index = num_indices - 1 - np.argmax(is_nonwhite[:, ::-1], axis=1)
+
+        start = np.where(has_nonwhite, np.maximum(first_index - 1, 0), sizes - 1)
+        end = np.where(has_nonwhite, np.minimum(last_index + 1, sizes - 1), np.minimum(1, sizes - 1))
+
+        return start, end
+
+    ###############################################################################
+    # Given a binarized text image (black text on white), finds its text lines by
+    # smearing ink horizontally and taking connected components. Returns list of
+    # boxes (x0, y0, x1, y1, is_text_line) in top to bottom order; components on the
+    # same line are merged into one box. Components too tall to be a single line
+    # are returned as separate blocks (is_text_line False) rather than dropped
+    @staticmethod
+    def get_text_line_boxes(image):
+
+        height = np.size(image, 0)
+        width = np.size(image, 1)
+
+        if height == 0 or width == 0:
+            return []
+
+        ink = (image < 128).astype(np.uint8)
+
+        join_width = max(int(height * Image_Utils.TEXT_LINE_JOIN_WIDTH), 1)
+        smeared = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (join_width, 3)))
+
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(smeared, connectivity=8)
+
+        min_height = height * Image_Utils.TEXT_LINE_MIN_HEIGHT
+        max_height = height * Image_Utils.TEXT_LINE_MAX_HEIGHT
+
+        list_of_boxes = []
+        for x, y, w, h, area in stats[1:]:
+
+            if h < min_height:
+                continue
+
+            list_of_boxes.append([int(x), int(y), int(x + w), int(y + h), bool(h <= max_height)])
+
+        list_of_boxes.sort(key=lambda box: box[1])
+
+        # Merge line components whose vertical centre falls within the current line:
+        list_of_lines = []
+        for box in list_of_boxes:
+            x0, y0, x1, y1, is_text_line = box
+
+            if is_text_line and list_of_lines and list_of_lines[-1][4]:
+                line = list_of_lines[-1]
+
+                if line[1] <= (y0 + y1) / 2 <= line[3]:
+                    line[0:4] = [min(line[0], x0), min(line[1], y0), max(line[2], x1), max(line[3], y1)]
+                    continue
+
+            list_of_lines.append(box)
+
+        return [tuple(line) for line in list_of_lines]
+
     ###############################################################################
     # Helper function for bounding box area of a contour
     def contour_bound_box_area(x):
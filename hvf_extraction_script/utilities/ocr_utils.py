@@ -2,11 +2,16 @@
 Use AWS rekognition detect_text engine
 """
 import io
+import os
+import threading
 from cmath import isclose
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from operator import attrgetter
 
 import boto3
+import numpy as np
+from botocore.config import Config
 from PIL import Image
 
 from hvf_extraction_script.utilities.image_utils import Image_Utils
@@ -50,30 +55,456 @@ def columnise(texts, rel_tol=0.02) -> str:
 
 
 class Ocr_Utils:
+
+    # Tesseract engines, one per thread (see get_tesseract_engine). Each thread
+    # keeps a single long-lived engine and switches its page segmentation mode as
+    # needed, so model loading happens once per thread rather than per image
+    TESSERACT_ENGINES = threading.local()
+
+    # Page segmentation modes, by tesserocr PSM name (tesserocr is imported lazily)
+    PSM_SINGLE_COLUMN = "SINGLE_COLUMN"
+    PSM_SPARSE_TEXT_OSD = "SPARSE_TEXT_OSD"
+    PSM_SINGLE_LINE = "SINGLE_LINE"
+    PSM_AUTO = "AUTO"
+
+    # White padding (pixels) added around each crop OCRed by perform_line_ocr
+    LINE_CROP_PADDING = 10
+
+    # Resolution reported to Tesseract for source images
+    TESSERACT_SOURCE_RESOLUTION = 200
+
+    # Rekognition client settings. One client (and connection pool) is shared by
+    # all threads of a process; requests are retried with exponential backoff
+    # (botocore standard retry mode), and at most REKOGNITION_MAX_IN_FLIGHT are
+    # outstanding at once across all threads
+    REKOGNITION_MAX_IN_FLIGHT = 8
+    REKOGNITION_MAX_ATTEMPTS = 5
+    REKOGNITION_CONNECT_TIMEOUT = 10
+    REKOGNITION_READ_TIMEOUT = 30
+
+    # Environment variable to override the Rekognition endpoint URL (eg, a local
+    # stand-in server for offline load testing)
+    REKOGNITION_ENDPOINT_ENV = "HVF_REKOGNITION_ENDPOINT_URL"
+
+    # JPEG quality crops are encoded with for Rekognition
+    REKOGNITION_JPEG_QUALITY = 75
+
+    # Maximum number of words Rekognition detects in one image - a composite image
+    # with this many words may have been cut short (see perform_composite_word_ocr)
+    REKOGNITION_MAX_WORDS = 100
+
+    # White gutter (pixels) between tiles of a composite image
+    COMPOSITE_TILE_GUTTER = 32
+
+    # Shared Rekognition client (with the process it was created in, and the
+    # endpoint it was created for - see get_rekognition_client), its lock and the
+    # in-flight request limit (with the process they were created in - see
+    # get_rekognition_lock), and thread pool for batched requests (with the
+    # process it was created in)
+    REKOGNITION_CLIENT = None
+    REKOGNITION_CLIENT_KEY = None
+    REKOGNITION_CLIENT_LOCK = threading.Lock()
+    REKOGNITION_IN_FLIGHT = threading.BoundedSemaphore(REKOGNITION_MAX_IN_FLIGHT)
+    REKOGNITION_LOCK_PID = os.getpid()
+    REKOGNITION_THREAD_POOL = None
+    REKOGNITION_THREAD_POOL_PID = None
+
+    ###############################################################################
+    # Returns this thread's Tesseract engine, set to the given page segmentation
+    # mode. Engine is constructed on first use in each thread (and again in a forked
+    # child process, which must not share its parent's engine)
+    @staticmethod
+    def get_tesseract_engine(page_seg_mode=PSM_SINGLE_COLUMN):
+        from tesserocr import PSM, PyTessBaseAPI
+
+        psm = getattr(PSM, page_seg_mode)
+        engines = Ocr_Utils.TESSERACT_ENGINES
+
+        if getattr(engines, "engine", None) is None or not (engines.pid == os.getpid()):
+            engines.engine = PyTessBaseAPI(psm=psm)
+            engines.pid = os.getpid()
+
+        elif not (engines.engine.GetPageSegMode() == psm):
+            engines.engine.SetPageSegMode(psm)
+
+        return engines.engine
+
+    ###############################################################################
+    # Clears adaptive state this thread's Tesseract engine has learned from previous
+    # images, so results for each printout do not depend on what was read before
+    # it. Does nothing if this thread has no engine yet
+    @staticmethod
+    def reset_tesseract_engine():
+        engines = Ocr_Utils.TESSERACT_ENGINES
+
+        if getattr(engines, "engine", None) is not None and engines.pid == os.getpid():
+            engines.engine.ClearAdaptiveClassifier()
+
+    ###############################################################################
+    # Releases this thread's Tesseract engine, if any
+    @staticmethod
+    def release_tesseract_engine():
+        engines = Ocr_Utils.TESSERACT_ENGINES
+
+        if getattr(engines, "engine", None) is not None and engines.pid == os.getpid():
+            engines.engine.End()
+
+        engines.engine = None
+
+    ###############################################################################
+    # Returns a string describing the OCR engine and settings in use. Used to tag
+    # cached extraction results, so a change of engine or settings invalidates them
+    @staticmethod
+    def get_ocr_settings_string(rekognition=False):
+
+        if rekognition:
+            return "rekognition"
+
+        try:
+            from tesserocr import tesseract_version
+
+            engine_version = tesseract_version()
+        except ImportError:
+            engine_version = "tesserocr unavailable"
+
+        return f"tesseract:{engine_version}:{Ocr_Utils.TESSERACT_SOURCE_RESOLUTION}"
+
     @staticmethod
     def perform_ocr(
-        img_arr, proc_img: bool = False, column: bool = True, debug_dir: str = "", rekognition=False
+        img_arr,
+        proc_img: bool = False,
+        column: bool = True,
+        debug_dir: str = "",
+        rekognition=False,
+        page_seg_mode=PSM_SINGLE_COLUMN,
     ) -> str:
         if rekognition:
             return Ocr_Utils.do_rekognition(img_arr, column, debug_dir)
         else:
-            return Ocr_Utils.do_tesserocr(proc_img, img_arr, column, debug_dir)
+            return Ocr_Utils.do_tesserocr(proc_img, img_arr, column, debug_dir, page_seg_mode)
 
+    ###############################################################################
+    # Given a list of images, OCRs each (as in perform_ocr) and returns the list of
+    # texts in the same order. With rekognition, requests for all images (eg, all
+    # crops of a page, or of many pages) are sent concurrently, bounded by
+    # REKOGNITION_MAX_IN_FLIGHT; Tesseract reads them one at a time (as does
+    # Rekognition with a debug_dir, so debug output stays in order)
     @staticmethod
-    def do_rekognition(img_arr, column, debug_dir):
+    def perform_ocr_batch(list_of_images, column: bool = True, debug_dir: str = "", rekognition=False) -> list:
+        if not rekognition or len(list_of_images) <= 1 or debug_dir:
+            return [
+                Ocr_Utils.perform_ocr(img_arr, column=column, debug_dir=debug_dir, rekognition=rekognition)
+                for img_arr in list_of_images
+            ]
+
+        thread_pool = Ocr_Utils.get_rekognition_thread_pool()
+
+        list_of_futures = [
+            thread_pool.submit(Ocr_Utils.do_rekognition, img_arr, column, debug_dir) for img_arr in list_of_images
+        ]
+
+        return [future.result() for future in list_of_futures]
+
+    ###############################################################################
+    # Given a list of images, reads each one's words (as in perform_word_ocr) and
+    # returns the list of word lists in the same order. With rekognition, requests
+    # are sent concurrently, as in perform_ocr_batch
+    @staticmethod
+    def perform_word_ocr_batch(list_of_images, debug_dir: str = "", rekognition=False) -> list:
+        if not rekognition or len(list_of_images) <= 1 or debug_dir:
+            return [
+                Ocr_Utils.perform_word_ocr(img_arr, debug_dir=debug_dir, rekognition=rekognition)
+                for img_arr in list_of_images
+            ]
+
+        thread_pool = Ocr_Utils.get_rekognition_thread_pool()
+
+        list_of_futures = [thread_pool.submit(Ocr_Utils.do_rekognition_words, img_arr) for img_arr in list_of_images]
+
+        return [future.result() for future in list_of_futures]
+
+    ###############################################################################
+    # Returns the thread pool for batched Rekognition requests, constructing it on
+    # first use. The pool is kept between calls (a forked child process needs its
+    # own)
+    @staticmethod
+    def get_rekognition_thread_pool():
+        with Ocr_Utils.get_rekognition_lock():
+            if Ocr_Utils.REKOGNITION_THREAD_POOL is None or not (Ocr_Utils.REKOGNITION_THREAD_POOL_PID == os.getpid()):
+                Ocr_Utils.REKOGNITION_THREAD_POOL = ThreadPoolExecutor(max_workers=Ocr_Utils.REKOGNITION_MAX_IN_FLIGHT)
+                Ocr_Utils.REKOGNITION_THREAD_POOL_PID = os.getpid()
+
+            return Ocr_Utils.REKOGNITION_THREAD_POOL
+
+    ###############################################################################
+    # Given a list of images (eg, the text regions of a page), reads their words
+    # with a single Rekognition request: the images are tiled into one composite
+    # image (see get_composite_image), and each detected word is mapped back to the
+    # image containing its center (see get_tile_words). Returns, for each image, its
+    # list of words as perform_word_ocr would. Rekognition detects at most
+    # REKOGNITION_MAX_WORDS words per image, so if the composite reaches that many
+    # (and may have been cut short), the images are read individually instead, as
+    # one concurrent batch - ie, at most 1 + len(list_of_images) requests
+    @staticmethod
+    def perform_composite_word_ocr(list_of_images, debug_dir: str = "") -> list:
+        if len(list_of_images) <= 1:
+            return Ocr_Utils.perform_word_ocr_batch(list_of_images, debug_dir=debug_dir, rekognition=True)
+
+        composite_image, list_of_offsets = Ocr_Utils.get_composite_image(list_of_images)
+
+        list_of_composite_words = Ocr_Utils.do_rekognition_words(composite_image)
+
+        if len(list_of_composite_words) >= Ocr_Utils.REKOGNITION_MAX_WORDS:
+            return Ocr_Utils.perform_word_ocr_batch(list_of_images, debug_dir=debug_dir, rekognition=True)
+
+        if debug_dir:
+            out = Regex_Utils.temp_out(debug_dir=debug_dir)
+            Image.fromarray(composite_image).save(f"{out}.jpg")
+            with open(f"{out}.txt", "w") as f:
+                f.writelines(f"{word} {x0} {y0} {x1} {y1}\n" for word, x0, y0, x1, y1 in list_of_composite_words)
+
+        return Ocr_Utils.get_tile_words(list_of_composite_words, list_of_images, list_of_offsets)
+
+    ###############################################################################
+    # Given a list of (grayscale) images, tiles them into one white composite image,
+    # in a near square grid separated by COMPOSITE_TILE_GUTTER pixels. Returns the
+    # composite image and the list of (x, y) offsets of each image within it
+    @staticmethod
+    def get_composite_image(list_of_images):
+        gutter = Ocr_Utils.COMPOSITE_TILE_GUTTER
+        num_cols = int(np.ceil(np.sqrt(len(list_of_images))))
+
+        # Each grid column is as wide as its widest image, each row as tall as its
+        # tallest image:
+        col_widths = [0] * num_cols
+        row_heights = [0] * int(np.ceil(len(list_of_images) / num_cols))
+        for ii, img_arr in enumerate(list_of_images):
+            col_widths[ii % num_cols] = max(col_widths[ii % num_cols], np.size(img_arr, 1))
+            row_heights[ii // num_cols] = max(row_heights[ii // num_cols], np.size(img_arr, 0))
+
+        col_starts = np.cumsum([gutter] + [width + gutter for width in col_widths])
+        row_starts = np.cumsum([gutter] + [height + gutter for height in row_heights])
+
+        composite_image = np.full((row_starts[-1], col_starts[-1]), 255, dtype=np.uint8)
+
+        list_of_offsets = []
+        for ii, img_arr in enumerate(list_of_images):
+            x = int(col_starts[ii % num_cols])
+            y = int(row_starts[ii // num_cols])
+
+            composite_image[y : y + np.size(img_arr, 0), x : x + np.size(img_arr, 1)] = img_arr
+            list_of_offsets.append((x, y))
+
+        return composite_image, list_of_offsets
+
+    ###############################################################################
+    # Given words detected on a composite image (see get_composite_image), with
+    # boxes in pixels of the composite, and the tiled images and their offsets,
+    # returns for each tiled image the list of words whose center lies within it,
+    # with boxes in pixels of that image
+    @staticmethod
+    def get_tile_words(list_of_words, list_of_images, list_of_offsets):
+        list_of_tile_words = [[] for img_arr in list_of_images]
+
+        for word, x0, y0, x1, y1 in list_of_words:
+            for ii, (tile_x, tile_y) in enumerate(list_of_offsets):
+                tile_height, tile_width = np.size(list_of_images[ii], 0), np.size(list_of_images[ii], 1)
+
+                if (tile_x <= (x0 + x1) / 2 < tile_x + tile_width) and (tile_y <= (y0 + y1) / 2 < tile_y + tile_height):
+                    list_of_tile_words[ii].append((word, x0 - tile_x, y0 - tile_y, x1 - tile_x, y1 - tile_y))
+                    break
+
+        return list_of_tile_words
+
+    ###############################################################################
+    # Given a binarized text image (black text on white), OCRs only its detected
+    # text lines (see Image_Utils.get_text_line_boxes), each as a single line, and
+    # returns them joined by newlines. Tall components that are not single lines are
+    # OCRed as blocks. Rekognition reads whole images in one request, so with
+    # rekognition this is the same as perform_ocr
+    @staticmethod
+    def perform_line_ocr(img_arr, debug_dir: str = "", rekognition=False) -> str:
+        if rekognition:
+            return Ocr_Utils.perform_ocr(img_arr, debug_dir=debug_dir, rekognition=rekognition)
+
+        list_of_texts = []
+        for x0, y0, x1, y1, is_text_line in Image_Utils.get_text_line_boxes(img_arr):
+            crop = np.pad(img_arr[y0:y1, x0:x1], Ocr_Utils.LINE_CROP_PADDING, constant_values=255)
+
+            page_seg_mode = Ocr_Utils.PSM_SINGLE_LINE if is_text_line else Ocr_Utils.PSM_SINGLE_COLUMN
+            text = Ocr_Utils.do_tesserocr(False, crop, True, debug_dir, page_seg_mode).strip()
+
+            if text:
+                list_of_texts.append(text)
+
+        return "\n".join(list_of_texts)
+
+    ###############################################################################
+    # Given a binarized text image, OCRs it in a single pass and returns its words
+    # as a list of (text, x0, y0, x1, y1) tuples, with boxes in pixels of img_arr
+    # (see get_text_from_words to turn words within a region back into text)
+    @staticmethod
+    def perform_word_ocr(img_arr, debug_dir: str = "", rekognition=False, page_seg_mode=PSM_SINGLE_COLUMN) -> list:
+        if rekognition:
+            list_of_words = Ocr_Utils.do_rekognition_words(img_arr)
+        else:
+            list_of_words = Ocr_Utils.do_tesserocr_words(img_arr, page_seg_mode)
+
+        if debug_dir:
+            out = Regex_Utils.temp_out(debug_dir=debug_dir)
+            Image.fromarray(img_arr).save(f"{out}.jpg")
+            with open(f"{out}.txt", "w") as f:
+                f.writelines(f"{word} {x0} {y0} {x1} {y1}\n" for word, x0, y0, x1, y1 in list_of_words)
+
+        return list_of_words
+
+    ###############################################################################
+    # Given a list of words (see perform_word_ocr) and a box (x0, y0, x1, y1; None
+    # for all words), returns the text of the words centered within the box. Words
+    # are grouped into lines by vertical overlap, ordered left to right within each
+    # line, and lines are joined by newlines top to bottom
+    @staticmethod
+    def get_text_from_words(list_of_words, box=None) -> str:
+        if box is not None:
+            box_x0, box_y0, box_x1, box_y1 = box
+            list_of_words = [
+                word
+                for word in list_of_words
+                if (box_x0 <= (word[1] + word[3]) / 2 < box_x1) and (box_y0 <= (word[2] + word[4]) / 2 < box_y1)
+            ]
+
+        # Build lines top to bottom - a word joins the current line if its center
+        # is within the line's vertical extent so far
+        list_of_lines = []
+        for word in sorted(list_of_words, key=lambda word: word[2] + word[4]):
+            if list_of_lines and (word[2] + word[4]) / 2 <= list_of_lines[-1][1]:
+                line_words, line_y1 = list_of_lines[-1]
+                list_of_lines[-1] = (line_words + [word], max(line_y1, word[4]))
+            else:
+                list_of_lines.append(([word], word[4]))
+
+        return "\n".join(
+            " ".join(word[0] for word in sorted(line_words, key=lambda word: word[1]))
+            for line_words, line_y1 in list_of_lines
+        )
+
+    ###############################################################################
+    # Returns the lock guarding the shared Rekognition client and thread pool. A
+    # forked child process gets a new lock and in-flight request limit, as those it
+    # inherited may be held by parent threads that do not exist in the child
+    @staticmethod
+    def get_rekognition_lock():
+        if not (Ocr_Utils.REKOGNITION_LOCK_PID == os.getpid()):
+            Ocr_Utils.REKOGNITION_CLIENT_LOCK = threading.Lock()
+            Ocr_Utils.REKOGNITION_IN_FLIGHT = threading.BoundedSemaphore(Ocr_Utils.REKOGNITION_MAX_IN_FLIGHT)
+            Ocr_Utils.REKOGNITION_LOCK_PID = os.getpid()
+
+        return Ocr_Utils.REKOGNITION_CLIENT_LOCK
+
+    ###############################################################################
+    # Returns the semaphore limiting in-flight Rekognition requests (recreated in a
+    # forked child process, see get_rekognition_lock)
+    @staticmethod
+    def get_rekognition_in_flight():
+        Ocr_Utils.get_rekognition_lock()
+
+        return Ocr_Utils.REKOGNITION_IN_FLIGHT
+
+    ###############################################################################
+    # Returns the shared Rekognition client, constructing it on first use (and again
+    # in a forked child process, or if the endpoint override has changed). The
+    # endpoint is taken from REKOGNITION_ENDPOINT_ENV if set
+    @staticmethod
+    def get_rekognition_client():
+        endpoint_url = os.environ.get(Ocr_Utils.REKOGNITION_ENDPOINT_ENV) or None
+        client_key = (os.getpid(), endpoint_url)
+
+        with Ocr_Utils.get_rekognition_lock():
+            if Ocr_Utils.REKOGNITION_CLIENT is None or not (Ocr_Utils.REKOGNITION_CLIENT_KEY == client_key):
+                config = Config(
+                    max_pool_connections=Ocr_Utils.REKOGNITION_MAX_IN_FLIGHT,
+                    retries={"max_attempts": Ocr_Utils.REKOGNITION_MAX_ATTEMPTS, "mode": "standard"},
+                    connect_timeout=Ocr_Utils.REKOGNITION_CONNECT_TIMEOUT,
+                    read_timeout=Ocr_Utils.REKOGNITION_READ_TIMEOUT,
+                )
+
+                Ocr_Utils.REKOGNITION_CLIENT = boto3.client("rekognition", endpoint_url=endpoint_url, config=config)
+                Ocr_Utils.REKOGNITION_CLIENT_KEY = client_key
+
+            return Ocr_Utils.REKOGNITION_CLIENT
+
+    ###############################################################################
+    # Given an image, returns Rekognition's text detections for it (as
+    # RekognitionText objects)
+    @staticmethod
+    def detect_rekognition_text(img_arr):
         img = Image.fromarray(img_arr)
-        client = boto3.client("rekognition")
+
         buf = io.BytesIO()
-        img.save(buf, format="JPEG")
-        data = buf.getvalue()
-        res = client.detect_text(Image={"Bytes": data})
-        texts = [x for x in [RekognitionText(text) for text in res["TextDetections"]] if x.kind == "LINE"]
+        img.save(buf, format="JPEG", quality=Ocr_Utils.REKOGNITION_JPEG_QUALITY)
+
+        client = Ocr_Utils.get_rekognition_client()
+
+        with Ocr_Utils.get_rekognition_in_flight():
+            res = client.detect_text(Image={"Bytes": buf.getvalue()})
+
+        return [RekognitionText(text) for text in res["TextDetections"]]
+
+    ###############################################################################
+    # Given an image, returns Rekognition's word detections as a list of (text, x0,
+    # y0, x1, y1) tuples (Rekognition geometry is in fractions of image size)
+    @staticmethod
+    def do_rekognition_words(img_arr):
+        height, width = np.size(img_arr, 0), np.size(img_arr, 1)
+
+        list_of_words = []
+        for x in Ocr_Utils.detect_rekognition_text(img_arr):
+            if x.kind == "WORD":
+                bounding_box = x.geometry["BoundingBox"]
+                x0 = int(bounding_box["Left"] * width)
+                y0 = int(bounding_box["Top"] * height)
+                x1 = int((bounding_box["Left"] + bounding_box["Width"]) * width)
+                y1 = int((bounding_box["Top"] + bounding_box["Height"]) * height)
+
+                list_of_words.append((x.text, x0, y0, x1, y1))
+
+        return list_of_words
+
+    ###############################################################################
+    # Given an image, recognizes it with this thread's Tesseract engine and returns
+    # its words (walking the engine's result iterator) as a list of (text, x0, y0,
+    # x1, y1) tuples
+    @staticmethod
+    def do_tesserocr_words(img_arr, page_seg_mode=PSM_SINGLE_COLUMN):
+        from tesserocr import RIL, iterate_level
+
+        ocr_engine = Ocr_Utils.get_tesseract_engine(page_seg_mode)
+
+        ocr_engine.SetImage(Image.fromarray(img_arr))
+        ocr_engine.SetSourceResolution(Ocr_Utils.TESSERACT_SOURCE_RESOLUTION)
+        ocr_engine.Recognize()
+
+        result_iterator = ocr_engine.GetIterator()
+
+        list_of_words = []
+        if result_iterator is not None:
+            for word_iterator in iterate_level(result_iterator, RIL.WORD):
+                text = word_iterator.GetUTF8Text(RIL.WORD)
+                word_box = word_iterator.BoundingBox(RIL.WORD)
+
+                if text and text.strip() and word_box is not None:
+                    list_of_words.append((text.strip(),) + tuple(word_box))
+
+        return list_of_words
+
+    @staticmethod
+    def do_rekognition(img_arr, column, debug_dir):
+        img = Image.fromarray(img_arr)
+        texts = [x for x in Ocr_Utils.detect_rekognition_text(img_arr) if x.kind == "LINE"]
         if column:
             text = columnise(texts)
         else:
-            text = " ".join(
-                [x.text for x in [RekognitionText(text) for text in res["TextDetections"]] if x.kind == "LINE"]
-            )
+            text = " ".join([x.text for x in texts])
 
         if debug_dir:
             out = Regex_Utils.temp_out(debug_dir=debug_dir)
@@ -85,9 +516,7 @@ class Ocr_Utils:
         return text
 
     @staticmethod
-    def do_tesserocr(proc_img, img_arr, column, debug_dir):
-        from tesserocr import PSM, PyTessBaseAPI
-
+    def do_tesserocr(proc_img, img_arr, column, debug_dir, page_seg_mode=PSM_SINGLE_COLUMN):
         if proc_img:
             # First, preprocessor the image:
             img_arr = Image_Utils.preprocess_image(img_arr, debug_dir=debug_dir)
@@ -95,13 +524,11 @@ class Ocr_Utils:
         # Next, convert image to python PIL (because pytesseract using PIL):
         img_pil = Image.fromarray(img_arr)
 
-        if not Ocr_Utils.OCR_API_HANDLE:
-            Ocr_Utils.OCR_API_HANDLE = PyTessBaseAPI(psm=PSM.SINGLE_COLUMN)
-            # Ocr_Utils.OCR_API_HANDLE = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+        ocr_engine = Ocr_Utils.get_tesseract_engine(page_seg_mode)
 
-        Ocr_Utils.OCR_API_HANDLE.SetImage(img_pil)
-        Ocr_Utils.OCR_API_HANDLE.SetSourceResolution(200)
-        text: str = Ocr_Utils.OCR_API_HANDLE.GetUTF8Text()
+        ocr_engine.SetImage(img_pil)
+        ocr_engine.SetSourceResolution(Ocr_Utils.TESSERACT_SOURCE_RESOLUTION)
+        text: str = ocr_engine.GetUTF8Text()
 
         if debug_dir:
             out = Regex_Utils.temp_out(debug_dir=debug_dir)
@@ -10,6 +10,7 @@
 # Import regular expression packages
 import os
 import re
+from datetime import datetime
 from glob import glob
 
 import regex
@@ -24,6 +25,18 @@ class Regex_Utils:
 
     REGEX_FAILURE = "Extraction Failure"
 
+    # Date formats accepted by parse_date, in order tried:
+    # MM-DD-YYYY, DD-Mon-YY, MM/DD/YYYY, MM/DD/YY, Mon DD, YYYY, YYYY-MM-DD
+    # (single digit months/days are accepted by %m/%d)
+    DATE_FORMATS = [
+        "%m-%d-%Y",
+        "%d-%b-%y",
+        "%m/%d/%Y",
+        "%m/%d/%y",
+        "%b %d, %Y",
+        "%Y-%m-%d",
+    ]
+
     ###############################################################################
     # REGEX METHODS ###############################################################
     ###############################################################################
@@ -285,3 +298,25 @@ class Regex_Utils:
         if gg:
             max_val = max(map(int, [x.group(1) for x in gg]))  # type: ignore
         return f"{string2}{max_val+1}"
+
+    ###############################################################################
+    # Given a date string (in one of DATE_FORMATS), returns the datetime object, or
+    # None if it cannot be parsed. 2 digit years in the future are taken as 1900s
+    @staticmethod
+    def parse_date(date_string):
+
+        for parse_string in Regex_Utils.DATE_FORMATS:
+            try:
+                datetime_obj = datetime.strptime(date_string, parse_string)
+
+            except (TypeError, ValueError):
+                continue
+
+            # If only 2 digit year, it will extrapolate to 20xx, which is likely
+            # not what we want. If year is in future, correct to 1900s.
+            if datetime.today() <= datetime_obj:
+                datetime_obj = datetime_obj.replace(year=datetime_obj.year - 100)
+
+            return datetime_obj
+
+        return None
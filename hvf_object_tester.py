@@ -6,21 +6,44 @@
 #
 # 		- Demos result from a specific HVF file. Usage:
 # 		  python hvf_object_tester -i <hvf_image_path>
+# 		  (add -n <num_threads> to extract plots/header concurrently)
+# 		  (add -u to upscale only the regions read, rather than the whole page)
+# 		  (add -l to OCR only the detected header text lines, rather than whole slices)
+# 		  (add -s to OCR the header in a single pass, routing words to slices)
+# 		  (add -c with -r to read all text slices as one composite Rekognition image)
+# 		  (add -k to recognize value digits with the k-NN digit classifier)
 #
 # 		- Runs unit tests of the specified collection. Specify 2 arguments:
 # 			- Test name
 # 			- Test type (image_vs_serialization, image_vs_dicom, etc -- see Hvf_Test)
 # 		  Usage:
 # 		  python hvf_object_tester -t <test_name> <test_type>
+# 		  (add -u to check accuracy of ROI-only upscaling against the same references)
+# 		  (add -l to check accuracy of header text line OCR)
+# 		  (add -s to check accuracy of single pass header OCR)
+# 		  (add -c with -r to check accuracy of composite Rekognition OCR)
+# 		  (add -k to check accuracy of the k-NN digit classifier)
 #
 # 		- Adds a unit test to the specified collection/test type. Takes in 4 arguments,
 # 		  and copies files into the hvf_test_cases folder
 # 		  Usage:
 # 		  python hvf_object_tester -a <test_name> <test_type> <ref_data_path> <test_data_path>
 #
+# 		- Checks indexing of plot cells (see Hvf_Test.test_plot_cells). Usage:
+# 		  python hvf_object_tester --test_plot_cells
+#
+# 		- Runs a micro-benchmark (see Hvf_Test.BENCHMARK_*). Usage:
+# 		  python hvf_object_tester -b <benchmark_name>
+#
+# 		- Evaluates the layout classifier on the image_vs_serialization test cases
+# 		  (k-fold accuracy on held-out images, and time per image), then trains
+# 		  it on all of them and saves its model file. Usage:
+# 		  python hvf_object_tester --train_layout
+#
 ###############################################################################
 
 from hvf_extraction_script.hvf_data.hvf_object import Hvf_Object
+from hvf_extraction_script.hvf_data.hvf_value import Hvf_Value
 from hvf_extraction_script.hvf_manager.hvf_test import Hvf_Test
 from hvf_extraction_script.utilities.file_utils import File_Utils
 from hvf_extraction_script.utilities.logger import Logger
@@ -37,6 +60,15 @@ class MyArgParser(Tap):
     test: str
     add_test_case: str  # adds input hvf image to test cases
     rekognition: bool = False  # use AWS Rekognition rather than tesserOCR
+    threads: int = 1  # number of threads for extracting a single image
+    roi_upscale: bool = False  # upscale only regions read, rather than the whole page
+    line_ocr: bool = False  # OCR only detected header text lines, rather than whole header slices
+    single_pass_ocr: bool = False  # OCR header band once for word boxes, rather than each header slice
+    composite_ocr: bool = False  # with rekognition, read all text slices as one tiled image
+    benchmark: str  # name of micro-benchmark to run
+    knn_digits: bool = False  # recognize value digits with k-NN classifier rather than template matching
+    train_layout: bool = False  # train layout classifier on image_vs_serialization test cases
+    test_plot_cells: bool = False  # check plot cell indexing
 
     def configure(self) -> None:
         self.add_argument("-i", "--image", required=False)
@@ -44,6 +76,13 @@ class MyArgParser(Tap):
         self.add_argument("-t", "--test", nargs=2, required=False)
         self.add_argument("-a", "--add_test_case", nargs=4, required=False)
         self.add_argument("-r", "--rekognition")
+        self.add_argument("-n", "--threads", required=False)
+        self.add_argument("-u", "--roi_upscale")
+        self.add_argument("-l", "--line_ocr")
+        self.add_argument("-s", "--single_pass_ocr")
+        self.add_argument("-c", "--composite_ocr")
+        self.add_argument("-b", "--benchmark", required=False)
+        self.add_argument("-k", "--knn_digits")
 
 
 args = MyArgParser().parse_args()
@@ -55,6 +94,10 @@ debug_level = Logger.DEBUG_FLAG_WARNING
 # debug_level = Logger.DEBUG_FLAG_DEBUG;
 msg_logger = Logger.get_logger().set_logger_level(debug_level)
 
+# Select digit recognizer:
+if args.knn_digits:
+    Hvf_Value.RECOGNIZER = Hvf_Value.RECOGNIZER_KNN
+
 
 ###############################################################################
 # SINGLE IMAGE TESTING ########################################################
@@ -64,7 +107,15 @@ msg_logger = Logger.get_logger().set_logger_level(debug_level)
 if args.image:
 
     hvf_image = File_Utils.read_image_from_file(args.image)
-    Hvf_Test.test_single_image(hvf_image, args.rekognition)
+    Hvf_Test.test_single_image(
+        hvf_image,
+        args.rekognition,
+        args.threads,
+        args.roi_upscale,
+        args.line_ocr,
+        args.single_pass_ocr,
+        args.composite_ocr,
+    )
 
 
 ###############################################################################
@@ -118,4 +169,40 @@ elif args.test:
         dir = args.test[0]
         test_type = args.test[1]
 
-        Hvf_Test.test_unit_tests(dir, test_type, args.rekognition)
+        Hvf_Test.test_unit_tests(
+            dir,
+            test_type,
+            args.rekognition,
+            args.roi_upscale,
+            args.line_ocr,
+            args.single_pass_ocr,
+            args.composite_ocr,
+        )
+
+
+###############################################################################
+# PLOT CELL TESTING ###########################################################
+###############################################################################
+
+if args.test_plot_cells:
+
+    Logger.get_logger().set_logger_level(Logger.DEBUG_FLAG_SYSTEM)
+    Hvf_Test.test_plot_cells()
+
+
+###############################################################################
+# BENCHMARKING ################################################################
+###############################################################################
+
+if args.benchmark:
+
+    Hvf_Test.run_benchmark(args.benchmark)
+
+
+###############################################################################
+# LAYOUT CLASSIFIER TRAINING ##################################################
+###############################################################################
+
+if args.train_layout:
+
+    Hvf_Test.train_layout_classifier()
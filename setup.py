@@ -16,6 +16,7 @@ setuptools.setup(
     package_data={
         "hvf_extraction_script": [
             "hvf_data/other_icons/*.PNG",
+            "hvf_data/other_icons/*.npz",
             "hvf_data/perc_icons/*.JPG",
             "hvf_data/value_icons/v0/*.PNG",
             "hvf_data/value_icons/v1/*.PNG",